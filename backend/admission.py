@@ -0,0 +1,179 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when the wait queue is full and the caller should retry later.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"PyBuddy is busy, retry in {retry_after} s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Limits concurrent LLM calls with a global cap and a per-API-key cap.
+
+    Requests over the caps wait in a bounded queue. Waiters are grouped per user
+    and served round-robin, so one student spamming 💡 cannot starve the rest of
+    the class.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_per_key: int = 2, max_queue: int = 64) -> None:
+        """
+        Initializes the AdmissionController.
+
+        Args:
+            max_concurrent (int): Maximum number of LLM calls running at once
+            max_per_key (int): Maximum number of LLM calls running at once per API key
+            max_queue (int): Maximum number of requests allowed to wait
+        """
+        self.max_concurrent = max_concurrent
+        self.max_per_key = max_per_key
+        self.max_queue = max_queue
+
+        self.running = 0
+        self.running_per_key: dict[str, int] = {}
+        # user -> deque of (api_key, future), iterated round-robin
+        self.waiting: OrderedDict[str, deque] = OrderedDict()
+        self.queue_depth = 0
+
+        self.stats = {"admitted": 0, "rejected": 0, "queued": 0, "wait_time_total": 0.0, "wait_time_max": 0.0}
+        self.service_time_avg = 5.0
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["running"] = self.running
+        stats["queue_depth"] = self.queue_depth
+        stats["waiting_users"] = len(self.waiting)
+        stats["wait_time_avg"] = stats["wait_time_total"] / stats["queued"] if stats["queued"] else 0.0
+        stats["service_time_avg"] = self.service_time_avg
+        return stats
+
+    def spare_slots(self, api_key: str = None) -> int:
+        """
+        Returns how many more LLM calls could start right now without queueing,
+        overall or for one API key.
+        """
+        spare = self.max_concurrent - self.running - self.queue_depth
+        if api_key is not None:
+            spare = min(spare, self.max_per_key - self.running_per_key.get(api_key, 0))
+        return spare
+
+    def retry_after(self) -> int:
+        """
+        Estimates how long until a queued request would be served.
+        """
+        backlog = self.queue_depth + self.running
+        return max(1, math.ceil(backlog * self.service_time_avg / self.max_concurrent))
+
+    @asynccontextmanager
+    async def admit(self, user: str, api_key: str):
+        """
+        Holds an execution slot for the duration of the `async with` block.
+
+        Args:
+            user (str): The requesting user, used for fair queueing
+            api_key (str): The API key the LLM call will be made with
+
+        Raises:
+            AdmissionRejected: If the wait queue is full
+        """
+        api_key = api_key or ""
+        if self._has_capacity(api_key) and not self.queue_depth:
+            self._take(api_key)
+        else:
+            await self._wait(user, api_key)
+
+        self.stats["admitted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self.service_time_avg = 0.8 * self.service_time_avg + 0.2 * elapsed
+            self._release(api_key)
+
+    def _has_capacity(self, api_key: str) -> bool:
+        return self.running < self.max_concurrent and self.running_per_key.get(api_key, 0) < self.max_per_key
+
+    def _take(self, api_key: str) -> None:
+        self.running += 1
+        self.running_per_key[api_key] = self.running_per_key.get(api_key, 0) + 1
+
+    def _release(self, api_key: str) -> None:
+        self.running -= 1
+        self.running_per_key[api_key] -= 1
+        if not self.running_per_key[api_key]:
+            del self.running_per_key[api_key]
+        self._dispatch()
+
+    async def _wait(self, user: str, api_key: str) -> None:
+        if self.queue_depth >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise AdmissionRejected(self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.setdefault(user, deque()).append((api_key, future))
+        self.queue_depth += 1
+        self.stats["queued"] += 1
+        queued_at = time.monotonic()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before the client went away
+                self._release(api_key)
+            else:
+                self._forget(user, api_key, future)
+            raise
+        finally:
+            waited = time.monotonic() - queued_at
+            self.stats["wait_time_total"] += waited
+            self.stats["wait_time_max"] = max(self.stats["wait_time_max"], waited)
+
+    def _forget(self, user: str, api_key: str, future: asyncio.Future) -> None:
+        waiters = self.waiting.get(user)
+        if waiters and (api_key, future) in waiters:
+            waiters.remove((api_key, future))
+            self.queue_depth -= 1
+            if not waiters:
+                del self.waiting[user]
+
+    def _dispatch(self) -> None:
+        """
+        Hands free slots to waiting requests, one user at a time in round-robin order.
+        """
+        progressed = True
+        while progressed and self.waiting and self.running < self.max_concurrent:
+            progressed = False
+            for user in list(self.waiting):
+                waiters = self.waiting[user]
+                # Drop requests cancelled in this loop turn, before their own cleanup ran
+                while waiters and waiters[0][1].done():
+                    waiters.popleft()
+                    self.queue_depth -= 1
+                if not waiters:
+                    del self.waiting[user]
+                    continue
+                api_key, future = waiters[0]
+                if not self._has_capacity(api_key):
+                    continue
+
+                waiters.popleft()
+                self.queue_depth -= 1
+                # Move the user to the back so the next slot goes to someone else
+                del self.waiting[user]
+                if waiters:
+                    self.waiting[user] = waiters
+
+                self._take(api_key)
+                future.set_result(None)
+                progressed = True
+                break
@@ -0,0 +1,104 @@
+"""
+Response encoding benchmark for the course tree.
+
+Builds a large synthetic /get_gcr_data payload and reports, per encoder, the
+response bytes and the CPU time to produce them: FastAPI's default path
+(jsonable_encoder + JSONResponse), orjson, and orjson followed by gzip or
+brotli at a few levels.
+
+Run from the backend directory:
+
+    python -m benchmarks.encoding --courses 20 --assignments 60
+"""
+import argparse
+import random
+import sys
+import time
+import zlib
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.fakes import make_coursework, make_submission
+from compression import brotli
+from google_classroom import GoogleClassroomClient
+from responses import ORJSONResponse
+
+
+WORDS = (
+    "write a function that returns the list string number of each item in input output loop "
+    "value print test case sum count reverse sort dictionary key index first last empty check "
+    "should handle when your program reads from file and prints result for every line using "
+    "recursion class method attribute object create called with two arguments example expected"
+).split()
+
+
+def make_description(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def make_tree(courses: int, assignments: int, description_size: int) -> dict:
+    rng = random.Random(0)
+    tree = []
+    for c in range(courses):
+        course_id = str(1000 + c)
+        records = []
+        for a in range(assignments):
+            work = make_coursework(course_id, a, make_description(rng, description_size))
+            records.append(GoogleClassroomClient.assignment_record(work, make_submission(course_id, work["id"], "RETURNED")))
+        tree.append({"courseId": course_id, "courseName": f"Course {c}", "assignments": records})
+    return {"gcr_data": tree}
+
+
+def timed(fn, repeat: int) -> tuple:
+    """
+    Returns (result, mean seconds per call).
+    """
+    result = fn()
+    started = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return result, (time.process_time() - started) / repeat
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=20)
+    parser.add_argument("--assignments", type=int, default=60)
+    parser.add_argument("--description-size", type=int, default=1500)
+    parser.add_argument("--repeat", type=int, default=10, help="runs to average CPU time over")
+    args = parser.parse_args()
+
+    payload = make_tree(args.courses, args.assignments, args.description_size)
+    stdlib, stdlib_time = timed(lambda: JSONResponse(jsonable_encoder(payload)).body, args.repeat)
+    body, orjson_time = timed(lambda: ORJSONResponse(payload).body, args.repeat)
+
+    rows = [
+        ("jsonable_encoder + json", len(stdlib), stdlib_time),
+        ("orjson", len(body), orjson_time),
+    ]
+    for level in (1, 6, 9):
+        compressed, elapsed = timed(lambda: zlib.compress(body, level, wbits=31), args.repeat)
+        rows.append((f"orjson + gzip {level}", len(compressed), orjson_time + elapsed))
+    if brotli is not None:
+        for quality in (1, 4, 6):
+            compressed, elapsed = timed(lambda: brotli.compress(body, quality=quality), args.repeat)
+            rows.append((f"orjson + brotli {quality}", len(compressed), orjson_time + elapsed))
+    else:
+        print("brotli is not installed; skipping it")
+
+    print(f"payload: {args.courses} courses x {args.assignments} assignments, {args.description_size}-byte descriptions")
+    print(f"{'encoder':<26}{'KB':>10}{'vs json':>9}{'CPU ms':>9}")
+    for name, size, elapsed in rows:
+        print(f"{name:<26}{size / 1024:>10.1f}{size / len(stdlib):>9.1%}{elapsed * 1000:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,488 @@
+"""
+Local stand-ins for the upstreams the backend talks to, so benchmarks never hit
+Google, GitHub or Gemini.
+
+Each fake is a threaded HTTP server with a configurable per-request latency.
+"""
+import datetime
+import ipaddress
+import json
+import os
+import re
+import ssl
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+
+def make_self_signed_cert(directory: str) -> tuple:
+    """
+    Writes a throwaway certificate for 127.0.0.1 and returns (cert_file, key_file).
+    """
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_file = os.path.join(directory, "cert.pem")
+    key_file = os.path.join(directory, "key.pem")
+    with open(cert_file, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_file, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ))
+    return cert_file, key_file
+
+
+class FakeServer:
+    """
+    Runs a route table on a background ThreadingHTTPServer.
+
+    Routes are (method, regex, handler) tuples; a handler receives the regex
+    match and the parsed JSON body (the query parameters for GET requests) and
+    returns (status, payload, headers). A bytes payload is sent as is.
+    """
+
+    def __init__(self, routes: list, latency: float = 0.0, tls: bool = False, field_masks: bool = False) -> None:
+        self.routes = [(method, re.compile(pattern), handler) for method, pattern, handler in routes]
+        self.latency = latency
+        self.field_masks = field_masks
+        self.bytes_sent = 0
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.server.daemon_threads = True
+        self.ca_file = None
+        if tls:
+            self._certs = tempfile.TemporaryDirectory()
+            self.ca_file, key_file = make_self_signed_cert(self._certs.name)
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(self.ca_file, key_file)
+            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        scheme = "https" if self.ca_file else "http"
+        return f"{scheme}://{host}:{port}"
+
+    def start(self) -> "FakeServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _handle(self):
+                fake.requests += 1
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    body = raw
+
+                url = urlparse(self.path)
+                path = url.path
+                query = parse_qs(url.query)
+                if self.command == "GET":
+                    body = {name: values[-1] for name, values in query.items()}
+                for method, pattern, handler in fake.routes:
+                    match = pattern.fullmatch(path)
+                    if method == self.command and match:
+                        if fake.latency:
+                            time.sleep(fake.latency)
+                        status, payload, headers = handler(match, body)
+                        break
+                else:
+                    status, payload, headers = 404, {"error": {"code": 404, "message": path}}, {}
+
+                mask = query.get("fields")
+                if fake.field_masks and mask and status < 400:
+                    payload = apply_field_mask(payload, parse_field_mask(mask[0]))
+
+                if isinstance(payload, bytes):
+                    data = payload
+                else:
+                    data = json.dumps(payload).encode() if payload is not None else b""
+                fake.bytes_sent += len(data)
+                self.send_response(status)
+                if "Content-Type" not in headers:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+        return Handler
+
+
+def parse_field_mask(mask: str) -> dict:
+    """
+    Parses a Google partial-response mask such as "courses(id,name),nextPageToken"
+    into {"courses": {"id": None, "name": None}, "nextPageToken": None}.
+    """
+    def parse(pos):
+        spec = {}
+        name = ""
+        while pos < len(mask):
+            char = mask[pos]
+            if char == "(":
+                spec[name.strip()], pos = parse(pos + 1)
+                name = None
+            elif char == ")":
+                break
+            elif char == ",":
+                if name:
+                    spec[name.strip()] = None
+                name = ""
+            else:
+                name = (name or "") + char
+            pos += 1
+        if name:
+            spec[name.strip()] = None
+        return spec, pos
+
+    return parse(0)[0]
+
+
+def apply_field_mask(value, spec: dict):
+    """
+    Keeps only the fields selected by a parsed mask, the way Google's servers do.
+    """
+    if isinstance(value, list):
+        return [apply_field_mask(item, spec) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {
+        key: value[key] if sub is None else apply_field_mask(value[key], sub)
+        for key, sub in spec.items()
+        if key in value
+    }
+
+
+# Resources shaped like the real Classroom API responses, including the fields
+# PyBuddy never reads, so payload sizes are representative.
+
+def make_course(index: int) -> dict:
+    course_id = str(1000 + index)
+    return {
+        "id": course_id,
+        "name": f"Course {index}",
+        "section": "Fall 2030, Section A",
+        "descriptionHeading": f"Welcome to Course {index}",
+        "room": "Lab 3",
+        "ownerId": "teacher",
+        "creationTime": "2030-01-01T00:00:00.000Z",
+        "updateTime": "2030-01-01T00:00:00.000Z",
+        "enrollmentCode": "abc123x",
+        "courseState": "ACTIVE",
+        "alternateLink": f"https://classroom.google.com/c/{course_id}",
+        "teacherGroupEmail": f"course_{course_id}_teachers@classroom.example.com",
+        "courseGroupEmail": f"course_{course_id}@classroom.example.com",
+        "teacherFolder": {"id": f"folder-{course_id}", "title": f"Course {index}", "alternateLink": f"https://drive.example/{course_id}"},
+        "guardiansEnabled": False,
+        "calendarId": f"classroom{course_id}@group.calendar.example.com",
+        "gradebookSettings": {"calculationType": "TOTAL_POINTS", "displaySetting": "HIDE_OVERALL_GRADE"},
+    }
+
+
+def make_coursework(course_id: str, index: int, description: str) -> dict:
+    work_id = f"{course_id}{index:04d}"
+    return {
+        "courseId": course_id,
+        "id": work_id,
+        "title": f"Assignment {index}",
+        "description": description,
+        "materials": [
+            {"driveFile": {"driveFile": {"id": f"file-{work_id}", "title": "starter.py", "alternateLink": f"https://drive.example/file-{work_id}", "thumbnailUrl": f"https://drive.example/thumb/{work_id}"}, "shareMode": "VIEW"}},
+            {"link": {"url": "https://docs.python.org/3/tutorial/", "title": "The Python Tutorial", "thumbnailUrl": "https://docs.python.org/thumb.png"}},
+        ],
+        "state": "PUBLISHED",
+        "alternateLink": f"https://classroom.google.com/c/{course_id}/a/{work_id}/details",
+        "creationTime": "2030-01-01T00:00:00.000Z",
+        "updateTime": "2030-01-01T00:00:00.000Z",
+        "dueDate": {"year": 2030, "month": 1, "day": 1 + index % 28},
+        "dueTime": {"hours": 23, "minutes": 59},
+        "maxPoints": 100,
+        "workType": "ASSIGNMENT",
+        "submissionModificationMode": "MODIFIABLE_UNTIL_TURNED_IN",
+        "assignment": {"studentWorkFolder": {"id": f"work-{work_id}", "title": f"Assignment {index}", "alternateLink": f"https://drive.example/work-{work_id}"}},
+        "assigneeMode": "ALL_STUDENTS",
+        "creatorUserId": "teacher",
+        "topicId": f"topic-{index % 4}",
+    }
+
+
+def make_submission(course_id: str, work_id: str, state: str = "CREATED") -> dict:
+    history = [
+        {"stateHistory": {"state": "CREATED", "stateTimestamp": "2030-01-01T00:00:00.000Z", "actorUserId": "student"}},
+        {"stateHistory": {"state": "TURNED_IN", "stateTimestamp": "2030-01-02T00:00:00.000Z", "actorUserId": "student"}},
+        {"gradeHistory": {"pointsEarned": 90, "maxPoints": 100, "gradeTimestamp": "2030-01-03T00:00:00.000Z", "actorUserId": "teacher", "gradeChangeType": "DRAFT_GRADE_POINTS_EARNED_CHANGE"}},
+        {"stateHistory": {"state": "RETURNED", "stateTimestamp": "2030-01-04T00:00:00.000Z", "actorUserId": "teacher"}},
+    ]
+    return {
+        "courseId": course_id,
+        "courseWorkId": work_id,
+        "id": f"sub-{work_id}",
+        "userId": "me",
+        "creationTime": "2030-01-01T00:00:00.000Z",
+        "updateTime": "2030-01-01T00:00:00.000Z",
+        "state": state,
+        "alternateLink": f"https://classroom.google.com/c/{course_id}/a/{work_id}/submissions/student",
+        "courseWorkType": "ASSIGNMENT",
+        "assignmentSubmission": {"attachments": [
+            {"driveFile": {"id": f"zip-{work_id}", "title": "submission.zip", "alternateLink": f"https://drive.example/zip-{work_id}", "thumbnailUrl": f"https://drive.example/thumb/zip-{work_id}"}},
+        ]},
+        "submissionHistory": history,
+    }
+
+
+def make_student(course_id: str, index: int) -> dict:
+    user_id = f"student{index}"
+    return {
+        "courseId": course_id,
+        "userId": user_id,
+        "profile": {
+            "id": user_id,
+            "name": {"givenName": "Student", "familyName": str(index), "fullName": f"Student {index}"},
+            "emailAddress": f"{user_id}@example.com",
+            "photoUrl": "https://lh3.example.com/a/default-user",
+        },
+        "studentWorkFolder": {"id": f"folder-{user_id}", "title": "Student work", "alternateLink": f"https://drive.example/folder-{user_id}"},
+    }
+
+
+def make_profile() -> dict:
+    return {
+        "id": "student",
+        "name": {"givenName": "Test", "familyName": "Student", "fullName": "Test Student"},
+        "emailAddress": "student@example.com",
+        "photoUrl": "https://lh3.example.com/a/default-user",
+        "permissions": [{"permission": "CREATE_COURSE"}],
+        "verifiedTeacher": False,
+    }
+
+
+def fake_google(courses: int = 5, assignments: int = 10, description_size: int = 2000, latency: float = 0.02,
+                page_size: int = 20, students: int = 0, submission_size: int = 20_000) -> FakeServer:
+    """
+    Serves the Classroom v1 and Drive v3 paths used by GoogleClassroomClient,
+    with the discovery-doc URL layout so `build(..., client_options=...)` can
+    target it via PYBUDDY_GOOGLE_API_ENDPOINT. Like Google, it honours `fields=`
+    partial-response masks and pages list results (at most `page_size` items,
+    or the request's smaller pageSize, per page).
+
+    With `students`, each course has that many students besides "me", and a
+    teacher's studentSubmissions.list (no userId) returns one turned-in
+    submission per student with a `submission_size`-byte zip on Drive.
+
+    It speaks TLS because googleapiclient keeps the https scheme for media
+    uploads; trust `server.ca_file` through HTTPLIB2_CA_CERTS.
+    """
+    description = ("Q1: Write a function that reverses a string. " * (description_size // 46 + 1))[:description_size]
+    course_list = [make_course(c) for c in range(courses)]
+    # work_id -> (submission state, updateTime of the last change)
+    state = {}
+    # work_id -> attached Drive file ids
+    attachments = {}
+    # Drive file id -> uploaded bytes
+    drive_files = {}
+
+    def coursework(course_id):
+        return [make_coursework(course_id, a, description) for a in range(assignments)]
+
+    def submission(course_id, work_id):
+        value, updated = state.get(work_id, ("CREATED", None))
+        resource = make_submission(course_id, work_id, value)
+        if updated:
+            resource["updateTime"] = updated
+        if attachments.get(work_id):
+            resource["assignmentSubmission"] = {
+                "attachments": [{"driveFile": {"id": file_id}} for file_id in attachments[work_id]],
+            }
+        return resource
+
+    def course_submissions(course_id):
+        return [submission(course_id, work["id"]) for work in coursework(course_id)]
+
+    def roster(course_id):
+        return [make_student(course_id, index) for index in range(students)]
+
+    def student_submissions(course_id, work_ids):
+        result = []
+        for work_id in work_ids:
+            for student in roster(course_id):
+                resource = make_submission(course_id, work_id, "TURNED_IN")
+                file_id = f"zip-{work_id}-{student['userId']}"
+                resource.update(id=f"sub-{work_id}-{student['userId']}", userId=student["userId"])
+                resource["assignmentSubmission"] = {"attachments": [
+                    {"driveFile": {"id": file_id, "title": "submission.zip", "alternateLink": f"https://drive.example/{file_id}"}},
+                ]}
+                result.append(resource)
+        return result
+
+    def list_submissions(course_id, work_id, query):
+        if students and "userId" not in query:
+            work_ids = [work["id"] for work in coursework(course_id)] if work_id == "-" else [work_id]
+            return page("studentSubmissions", student_submissions(course_id, work_ids), query)
+        if work_id == "-":
+            return page("studentSubmissions", course_submissions(course_id), query)
+        return 200, {"studentSubmissions": [submission(course_id, work_id)]}, {}
+
+    def page(key, items, query):
+        size = min(int(query.get("pageSize") or page_size), page_size)
+        start = int(query.get("pageToken") or 0)
+        payload = {key: items[start:start + size]}
+        if start + size < len(items):
+            payload["nextPageToken"] = str(start + size)
+        return 200, payload, {}
+
+    def set_state(work_id, value):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        state[work_id] = (value, now.isoformat(timespec="milliseconds").replace("+00:00", "Z"))
+        return 200, {}, {}
+
+    def modify_attachments(match, body):
+        attached = attachments.setdefault(match[2], [])
+        for item in body.get("removeAttachments", []):
+            attached.remove(item["driveFile"]["id"])
+        attached.extend(item["driveFile"]["id"] for item in body.get("addAttachments", []))
+        return 200, submission(match[1], match[2]), {}
+
+    def drive_file(match, body):
+        if body.get("alt") == "media":
+            if match[1].startswith("zip-"):
+                # Deterministic per file, so a download can be checked
+                content = (match[1].encode() * (submission_size // len(match[1]) + 1))[:submission_size]
+            elif match[1] in drive_files:
+                content = drive_files[match[1]] if isinstance(drive_files[match[1]], bytes) else b""
+            else:
+                return 404, {"error": {"code": 404, "message": "File not found"}}, {}
+            return 200, content, {"Content-Type": "application/zip"}
+        if match[1] not in drive_files:
+            return 404, {"error": {"code": 404, "message": "File not found"}}, {}
+        return 200, {"id": match[1], "webViewLink": f"https://drive.example/{match[1]}", "trashed": False}, {}
+
+    def upload_start(match, body):
+        return 200, None, {"Location": f"{server.url}/upload/drive/v3/files/session/{uuid.uuid4().hex}"}
+
+    def upload_finish(match, body):
+        file_id = uuid.uuid4().hex
+        drive_files[file_id] = body
+        return 200, {"id": file_id, "webViewLink": f"https://drive.example/{file_id}"}, {}
+
+    submissions = r"/v1/courses/(\w+)/courseWork/(\w+)/studentSubmissions"
+    server = FakeServer([
+        ("GET", r"/v1/courses", lambda m, b: page("courses", course_list, b)),
+        ("GET", r"/v1/userProfiles/me", lambda m, b: (200, make_profile(), {})),
+        ("GET", r"/v1/courses/(\w+)/courseWork", lambda m, b: page("courseWork", coursework(m[1]), b)),
+        ("GET", r"/v1/courses/(\w+)/students", lambda m, b: page("students", roster(m[1]), b)),
+        ("GET", r"/v1/courses/(\w+)/courseWork/(-|\w+)/studentSubmissions", lambda m, b: list_submissions(m[1], m[2], b)),
+        ("POST", submissions + r"/[\w-]+:modifyAttachments", modify_attachments),
+        ("POST", submissions + r"/[\w-]+:turnIn", lambda m, b: set_state(m[2], "TURNED_IN")),
+        ("POST", submissions + r"/[\w-]+:reclaim", lambda m, b: set_state(m[2], "RECLAIMED_BY_STUDENT")),
+        ("POST", r"/v1/courses/(\w+)/students", lambda m, b: (200, {"courseId": m[1], "userId": "student"}, {})),
+        ("POST", r"/upload/drive/v3/files", upload_start),
+        ("PUT", r"/upload/drive/v3/files/session/\w+", upload_finish),
+        ("GET", r"/files/([\w-]+)", drive_file),
+    ], latency=latency, tls=True, field_masks=True)
+    server.drive_files = drive_files
+    return server
+
+
+def fake_github(latency: float = 0.02) -> FakeServer:
+    """
+    Serves the GitHub REST endpoints used by `git.GitHub`; point GITHUB_API_URL at it.
+    """
+    repos = set()
+
+    def create_repo(match, body):
+        repos.add(body["name"])
+        return 201, {"name": body["name"]}, {}
+
+    def get_repo(match, body):
+        return (200, {"name": match[2]}, {}) if match[2] in repos else (404, {"message": "Not Found"}, {})
+
+    def delete_repo(match, body):
+        repos.discard(match[2])
+        return 204, None, {}
+
+    return FakeServer([
+        ("GET", r"/repos/([\w.-]+)/([\w.-]+)", get_repo),
+        ("DELETE", r"/repos/([\w.-]+)/([\w.-]+)", delete_repo),
+        ("POST", r"/user/repos", create_repo),
+        ("GET", r"/repos/([\w.-]+)/([\w.-]+)/contents/.+", lambda m, b: (404, {"message": "Not Found"}, {})),
+        ("PUT", r"/repos/([\w.-]+)/([\w.-]+)/contents/.+", lambda m, b: (201, {"content": {}}, {})),
+    ], latency=latency)
+
+
+def fake_genai(latency: float = 1.0) -> FakeServer:
+    """
+    Serves `models/*:generateContent` and `:streamGenerateContent` with a
+    schema-valid hint; point PYBUDDY_GEMINI_BASE_URL at it. `latency` stands
+    in for model time.
+    """
+    hint = {
+        "hint_text": "Think about what your loop should do when the list is empty.",
+        "hint_topic": "base case",
+        "concepts": {"base case": "The simplest input your code must handle on its own."},
+    }
+
+    def generate(match, body):
+        return 200, {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": json.dumps(hint)}]},
+                "finishReason": "STOP",
+            }],
+        }, {}
+
+    def stream(match, body):
+        # Server-sent events, the hint's JSON split into a few chunks
+        text = json.dumps(hint)
+        step = len(text) // 4 + 1
+        events = b""
+        for start in range(0, len(text), step):
+            chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": text[start:start + step]}]}}]}
+            if start + step >= len(text):
+                chunk["candidates"][0]["finishReason"] = "STOP"
+            events += b"data: " + json.dumps(chunk).encode() + b"\r\n\r\n"
+        return 200, events, {"Content-Type": "text/event-stream"}
+
+    return FakeServer([
+        ("POST", r"/[\w.]+/models/[\w.-]+:generateContent", generate),
+        ("POST", r"/[\w.]+/models/[\w.-]+:streamGenerateContent", stream),
+    ], latency=latency)
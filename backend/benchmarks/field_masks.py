@@ -0,0 +1,85 @@
+"""
+Payload benchmark for the Classroom partial-response masks.
+
+Builds full Classroom responses shaped like the real API (see benchmarks.fakes),
+applies each mask in google_classroom.RESPONSE_FIELDS the way Google's servers
+do, and reports the JSON bytes and parse time with and without the mask.
+
+Run from the backend directory:
+
+    python -m benchmarks.field_masks --courses 20 --assignments 40
+"""
+import argparse
+import json
+import sys
+import time
+
+from benchmarks.fakes import apply_field_mask, make_course, make_coursework, make_profile, make_submission, parse_field_mask
+from google_classroom import RESPONSE_FIELDS, field_mask
+
+
+def responses(courses: int, assignments: int, description_size: int) -> dict:
+    """
+    Returns {mask name: list of full response bodies one get_gcr_data call would fetch}.
+    """
+    description = ("Q1: Write a function that reverses a string. " * (description_size // 46 + 1))[:description_size]
+    course_list = [make_course(c) for c in range(courses)]
+    coursework = [
+        {"courseWork": [make_coursework(course["id"], a, description) for a in range(assignments)]}
+        for course in course_list
+    ]
+    submissions = [
+        {"studentSubmissions": [make_submission(work["courseId"], work["id"])]}
+        for page in coursework
+        for work in page["courseWork"]
+    ]
+    return {
+        "courses": [{"courses": course_list}],
+        "profile": [make_profile()],
+        "coursework": coursework,
+        "submission_state": submissions,
+        "submission_attachments": submissions[:1],
+    }
+
+
+def measure(bodies: list, repeat: int) -> tuple:
+    """
+    Returns (total JSON bytes, seconds to parse all bodies once).
+    """
+    encoded = [json.dumps(body).encode() for body in bodies]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for data in encoded:
+            json.loads(data)
+    return sum(len(data) for data in encoded), (time.perf_counter() - started) / repeat
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=20)
+    parser.add_argument("--assignments", type=int, default=40)
+    parser.add_argument("--description-size", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20, help="parse passes to average over")
+    args = parser.parse_args()
+
+    print(f"{'mask':<24}{'calls':>7}{'full KB':>10}{'masked KB':>11}{'saved':>8}{'full ms':>10}{'masked ms':>11}")
+    totals = [0, 0, 0.0, 0.0]
+    for name, bodies in responses(args.courses, args.assignments, args.description_size).items():
+        spec = parse_field_mask(field_mask(name))
+        full_bytes, full_time = measure(bodies, args.repeat)
+        masked_bytes, masked_time = measure([apply_field_mask(body, spec) for body in bodies], args.repeat)
+        for i, value in enumerate((full_bytes, masked_bytes, full_time, masked_time)):
+            totals[i] += value
+        print(
+            f"{name:<24}{len(bodies):>7}{full_bytes / 1024:>10.1f}{masked_bytes / 1024:>11.1f}"
+            f"{1 - masked_bytes / full_bytes:>8.0%}{full_time * 1000:>10.2f}{masked_time * 1000:>11.2f}"
+        )
+    print(
+        f"{'total':<24}{'':>7}{totals[0] / 1024:>10.1f}{totals[1] / 1024:>11.1f}"
+        f"{1 - totals[1] / totals[0]:>8.0%}{totals[2] * 1000:>10.2f}{totals[3] * 1000:>11.2f}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Offline load test for the backend.
+
+Starts `main:app` under uvicorn against local fakes for Classroom/Drive, GitHub,
+Gemini and Redis, drives a mix of /get_gcr_data, /generate_hints and
+/submit/github, and reports throughput with p50/p95/p99 latency per route.
+
+Run from the backend directory:
+
+    python -m benchmarks.load_test --duration 30 --concurrency 32
+
+Pass --max-p95 / --min-rps (or --baseline with a previous --output file) to use
+it as a regression gate; the exit code is 1 when a gate fails.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.fernet import Fernet
+
+from benchmarks.fakes import fake_genai, fake_github, fake_google
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def post(url: str, payload: dict, timeout: float = 120) -> dict:
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def start_redis(redis_url: str):
+    """
+    Uses the given Redis, or starts an in-process fakeredis TCP server.
+    """
+    if redis_url:
+        return redis_url, None
+    from fakeredis import TcpFakeServer
+
+    port = free_port()
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0", server
+
+
+def start_backend(port: int, env: dict, workers: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/hint_stats", timeout=1)
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("Backend exited during startup")
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Backend did not start in time")
+
+
+def make_user(index: int) -> dict:
+    token = {
+        "token": f"fake-token-{index}",
+        "refresh_token": "fake-refresh",
+        "client_id": "fake-client",
+        "client_secret": "fake-secret",
+        "expiry": "2099-01-01T00:00:00Z",
+    }
+    return {"username": f"student{index}", "info": json.dumps(token)}
+
+
+def build_operations(base_url: str, users: list) -> dict:
+    def gcr_data():
+        user = random.choice(users)
+        return post(f"{base_url}/get_gcr_data", {"session_id": user["session_id"]})
+
+    def hints():
+        user = random.choice(users)
+        code = f"def solve(items):\n    total = {random.randint(0, 10 ** 6)}\n    for item in items:\n        total += item\n"
+        return post(f"{base_url}/generate_hints", {
+            "username": user["username"],
+            "question_data": "Q1: Return the sum of a list of numbers.",
+            "code_dict": {"q1.py": code},
+        })
+
+    def submit():
+        user = random.choice(users)
+        return post(f"{base_url}/submit/github", {
+            "username": user["username"],
+            "repo_name": f"lab-{random.randint(0, 10 ** 9)}",
+            "course_id": "1000",
+            "assignment_id": "10000000",
+            "code_files": {"q1.py": "print('hello')\n", "q2.py": "print('world')\n"},
+            "session_id": user["session_id"],
+        })
+
+    return {"/get_gcr_data": gcr_data, "/generate_hints": hints, "/submit/github": submit}
+
+
+def run_load(operations: dict, mix: dict, duration: float, concurrency: int) -> dict:
+    routes = list(mix)
+    weights = [mix[route] for route in routes]
+    samples = {route: [] for route in routes}
+    errors = {route: 0 for route in routes}
+    last_error = {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        while time.monotonic() < deadline:
+            route = random.choices(routes, weights)[0]
+            started = time.perf_counter()
+            error = None
+            try:
+                result = operations[route]()
+                if isinstance(result, dict) and result.get("error"):
+                    error = str(result["error"])
+            except Exception as e:
+                error = repr(e)
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples[route].append(elapsed)
+                if error:
+                    errors[route] += 1
+                    last_error[route] = error
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.monotonic() - started
+
+    report = {"duration": wall, "concurrency": concurrency, "routes": {}}
+    total = 0
+    for route in routes:
+        latencies = samples[route]
+        total += len(latencies)
+        report["routes"][route] = {
+            "requests": len(latencies),
+            "errors": errors[route],
+            "rps": len(latencies) / wall,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "last_error": last_error.get(route),
+        }
+    report["total_rps"] = total / wall
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(f"{'route':<18}{'requests':>10}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, stats in report["routes"].items():
+        print(
+            f"{route:<18}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>9.1f}"
+            f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+        )
+    print(f"total throughput: {report['total_rps']:.1f} req/s over {report['duration']:.1f}s")
+
+
+def check_gates(report: dict, args) -> list:
+    failures = []
+    if args.min_rps and report["total_rps"] < args.min_rps:
+        failures.append(f"throughput {report['total_rps']:.1f} req/s < {args.min_rps}")
+    for route, stats in report["routes"].items():
+        if args.max_p95 and stats["p95_ms"] > args.max_p95:
+            failures.append(f"{route} p95 {stats['p95_ms']:.1f} ms > {args.max_p95} ms")
+        if stats["errors"] and not args.allow_errors:
+            failures.append(f"{route} had {stats['errors']} errors, last: {stats['last_error']}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slack = 1 + args.tolerance
+        if report["total_rps"] * slack < baseline["total_rps"]:
+            failures.append(f"throughput regressed: {report['total_rps']:.1f} vs baseline {baseline['total_rps']:.1f} req/s")
+        for route, stats in report["routes"].items():
+            base = baseline["routes"].get(route)
+            if base and stats["p95_ms"] > base["p95_ms"] * slack:
+                failures.append(f"{route} p95 regressed: {stats['p95_ms']:.1f} vs baseline {base['p95_ms']:.1f} ms")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20, help="seconds to drive load for")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent client connections")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--users", type=int, default=50, help="distinct simulated students")
+    parser.add_argument("--mix", default="get_gcr_data=6,generate_hints=3,submit/github=1", help="route=weight,...")
+    parser.add_argument("--courses", type=int, default=5)
+    parser.add_argument("--assignments", type=int, default=10)
+    parser.add_argument("--google-latency", type=float, default=0.02, help="seconds per fake Classroom/Drive call")
+    parser.add_argument("--github-latency", type=float, default=0.02, help="seconds per fake GitHub call")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="seconds per fake generateContent call")
+    parser.add_argument("--redis-url", help="use this Redis instead of an in-process fakeredis server")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression vs baseline (0.2 = 20%%)")
+    parser.add_argument("--max-p95", type=float, help="fail if any route's p95 exceeds this many ms")
+    parser.add_argument("--min-rps", type=float, help="fail if total throughput is below this")
+    parser.add_argument("--allow-errors", action="store_true", help="do not fail on error responses")
+    args = parser.parse_args()
+
+    mix = {}
+    for item in args.mix.split(","):
+        route, weight = item.split("=")
+        mix["/" + route.strip("/")] = float(weight)
+
+    google = fake_google(args.courses, args.assignments, latency=args.google_latency).start()
+    github = fake_github(args.github_latency).start()
+    genai = fake_genai(args.llm_latency).start()
+    redis_url, redis_server = start_redis(args.redis_url)
+
+    port = free_port()
+    backend = start_backend(port, {
+        "PYBUDDY_ENCRYPTION_KEY": Fernet.generate_key().decode(),
+        "PYBUDDY_GOOGLE_API_ENDPOINT": google.url + "/",
+        "HTTPLIB2_CA_CERTS": google.ca_file,
+        "GITHUB_API_URL": github.url,
+        "PYBUDDY_GEMINI_BASE_URL": genai.url,
+        "REDIS_URL": redis_url,
+    }, args.workers)
+    base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        users = [make_user(i) for i in range(args.users)]
+        for user in users:
+            user["session_id"] = post(f"{base_url}/session", {"info": user["info"]})["session_id"]
+            post(f"{base_url}/add_api_key", {"username": user["username"], "api_key": f"fake-gemini-key-{user['username']}"})
+            post(f"{base_url}/add_github", {"username": user["username"], "github_name": user["username"], "github_token": "fake"})
+
+        report = run_load(build_operations(base_url, users), mix, args.duration, args.concurrency)
+    finally:
+        backend.terminate()
+        backend.wait()
+        for fake in (google, github, genai):
+            fake.stop()
+        if redis_server:
+            redis_server.shutdown()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = check_gates(report, args)
+    for failure in failures:
+        print("FAIL:", failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
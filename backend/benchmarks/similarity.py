@@ -0,0 +1,229 @@
+"""
+Benchmark for the submission similarity index.
+
+Writes a fake export (see submission_export) of generated Python submissions,
+a fraction of them edited copies of another submission, then indexes it with
+similarity.ExportSimilarity: first 90% of the submissions, then the rest as an
+incremental update. Reports the time per stage, how many pairs LSH compared
+against all n(n-1)/2, the recall of the planted copies, and an estimate of
+comparing every pair instead. Recall is given for the copies at or above the
+threshold, where estimates near it can fall either side, and for those
+clearly above it (threshold + 0.1).
+
+Run from the backend directory:
+
+    python -m benchmarks.similarity --submissions 1000,10000
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+from similarity import ExportSimilarity, MinHash, SimilarityIndex, python_files, shingles
+from submission_export import SubmissionExport
+
+NAMES = ["total", "count", "items", "result", "value", "data", "numbers", "text", "words", "i", "j", "n", "row", "grid"]
+CALLS = ["len", "sum", "max", "min", "sorted", "abs", "int", "str", "range", "print"]
+OPERATORS = ["+", "-", "*", "//", "%", "==", "<", ">=", "and", "or"]
+
+
+def expression(rng: random.Random, depth: int = 0) -> str:
+    choice = rng.random()
+    if depth > 1 or choice < 0.3:
+        return rng.choice(NAMES) if rng.random() < 0.6 else str(rng.randint(0, 100))
+    if choice < 0.55:
+        return f"{expression(rng, depth + 1)} {rng.choice(OPERATORS)} {expression(rng, depth + 1)}"
+    if choice < 0.75:
+        return f"{rng.choice(CALLS)}({expression(rng, depth + 1)})"
+    if choice < 0.9:
+        return f"{rng.choice(NAMES)}[{expression(rng, depth + 1)}]"
+    return f"[{expression(rng, depth + 1)} for {rng.choice(NAMES)} in {rng.choice(NAMES)}]"
+
+
+def block(rng: random.Random, statements: int, depth: int = 0) -> list:
+    """
+    Returns a list of lines of random but plausible student code.
+    """
+    lines = []
+    indent = "    " * depth
+    for _ in range(statements):
+        choice = rng.random()
+        if depth < 2 and choice < 0.15:
+            lines.append(f"{indent}for {rng.choice(NAMES)} in {rng.choice(['range', 'enumerate', 'sorted'])}({expression(rng)}):")
+            lines += block(rng, rng.randint(1, 3), depth + 1)
+        elif depth < 2 and choice < 0.3:
+            lines.append(f"{indent}if {expression(rng)}:")
+            lines += block(rng, rng.randint(1, 3), depth + 1)
+            if rng.random() < 0.4:
+                lines.append(f"{indent}else:")
+                lines += block(rng, rng.randint(1, 2), depth + 1)
+        elif depth < 2 and choice < 0.35:
+            lines.append(f"{indent}while {expression(rng)}:")
+            lines += block(rng, rng.randint(1, 3), depth + 1)
+        elif choice < 0.7:
+            lines.append(f"{indent}{rng.choice(NAMES)} {rng.choice(['=', '+=', '-='])} {expression(rng)}")
+        elif choice < 0.8:
+            lines.append(f"{indent}{rng.choice(NAMES)}.{rng.choice(['append', 'extend', 'pop', 'insert'])}({expression(rng)})")
+        elif choice < 0.9:
+            lines.append(f"{indent}print({expression(rng)})")
+        else:
+            lines.append(f"{indent}return {expression(rng)}")
+    return lines
+
+
+def program(rng: random.Random) -> list:
+    lines = []
+    for _ in range(rng.randint(2, 4)):
+        lines.append(f"def {rng.choice(['solve', 'helper', 'main', 'count_words', 'parse'])}({', '.join(rng.sample(NAMES, 2))}):")
+        lines += block(rng, rng.randint(4, 8), 1)
+        lines.append("")
+    return lines
+
+
+def edited_copy(rng: random.Random, lines: list) -> list:
+    """
+    A copy with renamed variables, changed literals, and a few lines
+    added, removed or swapped.
+    """
+    renames = dict(zip(NAMES, rng.sample(NAMES, len(NAMES))))
+    copy = [" ".join(renames.get(word, word) for word in line.split(" ")) for line in lines]
+    for _ in range(rng.randint(1, 3)):
+        index = rng.randrange(len(copy))
+        indent = copy[index][:len(copy[index]) - len(copy[index].lstrip())] or "    "
+        action = rng.random()
+        if action < 0.4:
+            copy.insert(index, f"{indent}# {rng.choice(NAMES)} check")
+            copy.insert(index, f"{indent}print({expression(rng)})")
+        elif action < 0.7 and copy[index].strip() and not copy[index].rstrip().endswith(":"):
+            del copy[index]
+        elif index + 1 < len(copy):
+            copy[index], copy[index + 1] = copy[index + 1], copy[index]
+    return copy
+
+
+def write_export(out_dir: str, count: int, copies: float, seed: int) -> tuple:
+    """
+    Writes `count` submission zips and their manifest records, and returns
+    the (original fileId, copy fileId) pairs that were planted.
+    """
+    rng = random.Random(seed)
+    sources = []
+    planted = []
+    for index in range(count):
+        if sources and rng.random() < copies:
+            original = rng.randrange(len(sources))
+            sources.append(edited_copy(rng, sources[original]))
+            planted.append((f"file{original}", f"file{index}"))
+        else:
+            sources.append(program(rng))
+
+    records = []
+    for index, lines in enumerate(sources):
+        path = os.path.join("work", f"student{index}", "submission.zip")
+        os.makedirs(os.path.join(out_dir, os.path.dirname(path)), exist_ok=True)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("solution.py", "\n".join(lines) + "\n")
+        with open(os.path.join(out_dir, path), "wb") as f:
+            f.write(buffer.getvalue())
+        records.append({
+            "courseWorkId": "work", "userId": f"student{index}", "fileId": f"file{index}",
+            "path": path, "status": "downloaded", "bytes": len(buffer.getvalue()),
+        })
+    return records, planted
+
+
+def append_manifest(out_dir: str, records: list) -> None:
+    with open(os.path.join(out_dir, SubmissionExport.MANIFEST), "a", encoding="utf-8") as manifest:
+        for record in records:
+            manifest.write(json.dumps(record) + "\n")
+
+
+def run(count: int, copies: float, threshold: float, seed: int) -> dict:
+    with tempfile.TemporaryDirectory() as out_dir:
+        records, planted = write_export(out_dir, count, copies, seed)
+        first = int(count * 0.9)
+
+        append_manifest(out_dir, records[:first])
+        engine = ExportSimilarity(out_dir, threshold)
+        started = time.perf_counter()
+        engine.update()
+        build = time.perf_counter() - started
+
+        append_manifest(out_dir, records[first:])
+        engine = ExportSimilarity(out_dir, threshold)
+        started = time.perf_counter()
+        pairs = engine.update()
+        incremental = time.perf_counter() - started
+
+        index = engine.indexes["work"]
+        found = {(a["fileId"], b["fileId"]) for a, b, _ in pairs}
+        found |= {(b, a) for a, b in found}
+
+        # Exact Jaccard of the planted pairs, and of a sample of random pairs for the all-pairs estimate
+        hashes = {}
+
+        def exact(a, b):
+            for key in (a, b):
+                if key not in hashes:
+                    hashes[key] = shingles(python_files(os.path.join(out_dir, records[int(key[4:])]["path"])))
+            return len(hashes[a] & hashes[b]) / len(hashes[a] | hashes[b])
+
+        similar_planted = [pair for pair in planted if exact(*pair) >= threshold]
+        clear_planted = [pair for pair in similar_planted if exact(*pair) >= threshold + 0.1]
+        recall = sum(pair in found for pair in similar_planted) / max(1, len(similar_planted))
+        clear_recall = sum(pair in found for pair in clear_planted) / max(1, len(clear_planted))
+        false_positives = sum(exact(a["fileId"], b["fileId"]) < threshold - 0.1 for a, b, _ in pairs)
+
+        rng = random.Random(seed)
+        keys = list(index.signatures)
+        sample = [rng.sample(keys, 2) for _ in range(20000)]
+        started = time.perf_counter()
+        for a, b in sample:
+            MinHash.similarity(index.signatures[a], index.signatures[b])
+        all_pairs = (time.perf_counter() - started) / len(sample) * count * (count - 1) / 2
+
+        return {
+            "submissions": count,
+            "build_s": build,
+            "incremental_s": incremental,
+            "new": engine.get_stats()["new"],
+            "compared": index.get_stats()["candidates"],
+            "all_pairs": count * (count - 1) // 2,
+            "all_pairs_s": all_pairs,
+            "pairs": len(pairs),
+            "planted": len(similar_planted),
+            "recall": recall,
+            "clear_recall": clear_recall,
+            "false_positives": false_positives,
+        }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", default="1000,10000", help="comma-separated corpus sizes")
+    parser.add_argument("--copies", type=float, default=0.05, help="fraction of submissions that copy another")
+    parser.add_argument("--threshold", type=float, default=SimilarityIndex.THRESHOLD)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--min-recall", type=float, default=0.95, help="fail if fewer clear copies are found")
+    args = parser.parse_args()
+
+    print(f"{'subs':>6} {'build s':>8} {'+10% s':>7} {'compared':>9} {'all pairs':>10} {'all pairs s':>11} "
+          f"{'pairs':>6} {'recall':>7} {'+0.1':>7} {'false +':>7}")
+    ok = True
+    for count in (int(n) for n in args.submissions.split(",")):
+        result = run(count, args.copies, args.threshold, args.seed)
+        print(f"{result['submissions']:>6} {result['build_s']:>8.2f} {result['incremental_s']:>7.2f} "
+              f"{result['compared']:>9} {result['all_pairs']:>10} {result['all_pairs_s']:>11.1f} "
+              f"{result['pairs']:>6} {result['recall']:>7.1%} {result['clear_recall']:>7.1%} {result['false_positives']:>7}")
+        ok = ok and result["clear_recall"] >= args.min_recall
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Startup-time benchmark for the backend.
+
+Imports `main` in fresh interpreters with `-X importtime`, reports the median
+import time and the heaviest imports, and fails (exit code 1) when the median
+exceeds the budget or when a library that is meant to be loaded lazily shows up
+at import time.
+
+Run from the backend directory:
+
+    python -m benchmarks.startup --runs 5 --budget-ms 700
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use or by the warm-up hook, never by `import main`
+LAZY_MODULES = [
+    "googleapiclient",
+    "google_auth_oauthlib",
+    "google.genai",
+    "cryptography.fernet",
+    "langchain",
+    "langchain_community",
+    "langsmith",
+    "nltk",
+]
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+PROBE = (
+    "import json, sys; import main; "
+    f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+)
+
+
+def measure() -> tuple:
+    """
+    Returns (total_us, top-level imports as {module: cumulative_us}, eagerly loaded lazy modules).
+    """
+    env = {**os.environ, "PYBUDDY_ENCRYPTION_KEY": os.environ.get("PYBUDDY_ENCRYPTION_KEY", "benchmark")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    total = 0
+    children = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative, depth, module = int(match[2]), len(match[3]), match[4]
+        if module == "main":
+            total = cumulative
+        elif depth == 3:
+            # Direct imports of main are nested one level (two spaces) under it
+            children[module] = cumulative
+    eager = json.loads(result.stdout.strip().splitlines()[-1])
+    return total, children, eager
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to measure")
+    parser.add_argument("--budget-ms", type=float, default=700, help="maximum median import time of main")
+    parser.add_argument("--top", type=int, default=10, help="heaviest imports to list")
+    args = parser.parse_args()
+
+    totals = []
+    children = {}
+    eager = []
+    for _ in range(args.runs):
+        total, run_children, eager = measure()
+        totals.append(total)
+        for module, cumulative in run_children.items():
+            children.setdefault(module, []).append(cumulative)
+
+    median_ms = statistics.median(totals) / 1000
+    print(f"import main: median {median_ms:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    heaviest = sorted(children.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for module, samples in heaviest[:args.top]:
+        print(f"  {statistics.median(samples) / 1000:8.1f} ms  {module}")
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"startup {median_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    if eager:
+        failures.append(f"lazily loaded modules imported at startup: {', '.join(eager)}")
+    for failure in failures:
+        print("FAIL:", failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import asyncio
+import time
+import orjson
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+import metrics
+from profiling import ADMIN_TOKEN_HEADER, PROFILE_HEADER
+
+
+class Channel:
+    """
+    One multiplexed WebSocket connection to the extension.
+
+    The extension keeps the socket open and tags each request with an id, so
+    operations share one connection through the tunnel instead of paying for a
+    new one per fetch, and several can be in flight at once.
+
+    Client messages:
+        {"id": ..., "op": "<operation>", "params": {...}, "profile"?: 1, "admin_token"?: "..."}
+    Server messages:
+        {"id": ..., "type": "progress", "data": {...}}   zero or more per request
+        {"id": ..., "type": "result", "data": {...}, "profile_id"?}
+        {"id": ..., "type": "error", "error": "...", "status"?, "retry_after"?, "profile_id"?}
+        {"type": "event", "event": "<name>", "data": {...}}   pushed, no request id
+
+    "profile" and "admin_token" work like the X-PyBuddy-Profile and
+    X-PyBuddy-Admin-Token headers of the HTTP endpoints.
+    """
+
+    MAX_IN_FLIGHT = 16
+
+    def __init__(self, websocket: WebSocket, handlers: dict, profiler=None) -> None:
+        """
+        Initializes the Channel.
+
+        Args:
+            websocket (WebSocket): The accepted connection
+            handlers (dict): op -> async handler(channel, request_id, params) returning a dict
+            profiler (Profiler): Profiles the operations that ask for it, as for HTTP requests
+        """
+        self.websocket = websocket
+        self.handlers = handlers
+        self.profiler = profiler
+        self.outbox = asyncio.Queue()
+        self.loop = None
+        # Every task the connection owns, cancelled when it closes
+        self.tasks = set()
+        # The client's in-flight requests, limited to MAX_IN_FLIGHT; watchers are not counted
+        self.requests = set()
+        # Per-connection state handlers can use, e.g. the tree cursor being watched
+        self.state = {}
+
+    async def serve(self) -> None:
+        await self.websocket.accept()
+        self.loop = asyncio.get_running_loop()
+        metrics.WEBSOCKET_CONNECTIONS.inc()
+        writer = asyncio.create_task(self._write())
+        try:
+            while True:
+                try:
+                    message = orjson.loads(await self.websocket.receive_text())
+                except orjson.JSONDecodeError:
+                    self.send({"type": "error", "error": "Messages must be JSON"})
+                    continue
+                self._dispatch(message)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in list(self.tasks):
+                task.cancel()
+            writer.cancel()
+            metrics.WEBSOCKET_CONNECTIONS.dec()
+
+    def send(self, message: dict) -> None:
+        """
+        Queues a message for the client. Safe to call from worker threads.
+        """
+        self.loop.call_soon_threadsafe(self.outbox.put_nowait, message)
+
+    def progress(self, request_id, data: dict) -> None:
+        self.send({"id": request_id, "type": "progress", "data": data})
+
+    def push(self, event: str, data: dict) -> None:
+        self.send({"type": "event", "event": event, "data": data})
+
+    def start_background(self, coro) -> asyncio.Task:
+        """
+        Runs a task that lives as long as the connection, e.g. a watcher.
+        It does not count towards MAX_IN_FLIGHT.
+        """
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def _dispatch(self, message) -> None:
+        if not isinstance(message, dict):
+            self.send({"type": "error", "error": "Messages must be JSON objects"})
+            return
+        request_id = message.get("id")
+        op = message.get("op")
+        handler = self.handlers.get(op)
+        if handler is None:
+            self.send({"id": request_id, "type": "error", "error": f"Unknown operation: {op}"})
+            return
+        if len(self.requests) >= self.MAX_IN_FLIGHT:
+            self.send({"id": request_id, "type": "error", "error": "Too many requests in flight", "retry_after": 1})
+            return
+        params = message.get("params") or {}
+        if not isinstance(params, dict):
+            self.send({"id": request_id, "type": "error", "error": "params must be an object", "status": 422})
+            return
+        profile = message.get("profile") and {PROFILE_HEADER: "1", ADMIN_TOKEN_HEADER: str(message.get("admin_token") or "")}
+        task = self.start_background(self._run(request_id, op, handler, params, profile or {}))
+        self.requests.add(task)
+        task.add_done_callback(self.requests.discard)
+
+    async def _run(self, request_id, op: str, handler, params: dict, profile_headers: dict) -> None:
+        started = time.perf_counter()
+        failed = False
+        # Started inside the task, so the profile only sees this operation's spans
+        profile = None
+        if self.profiler is not None and self.profiler.should_profile(profile_headers):
+            profile = self.profiler.start(f"ws:{op}")
+        try:
+            result = await handler(self, request_id, params)
+            if isinstance(result, dict) and result.get("error"):
+                reply = {"id": request_id, "type": "error", **result}
+            else:
+                reply = {"id": request_id, "type": "result", "data": result}
+        except HTTPException as e:
+            reply = {"id": request_id, "type": "error", "error": e.detail, "status": e.status_code}
+        except ValidationError as e:
+            reply = {"id": request_id, "type": "error", "error": str(e), "status": 422}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failed = True
+            print(f"❌ WebSocket operation {op} failed: {e}")
+            reply = {"id": request_id, "type": "error", "error": str(e), "status": 500}
+        finally:
+            if profile is not None:
+                await asyncio.shield(run_in_threadpool(self.profiler.finish, profile))
+            metrics.REQUEST_LATENCY.labels(f"ws:{op}", "WS").observe(time.perf_counter() - started)
+            if failed:
+                metrics.REQUEST_ERRORS.labels(f"ws:{op}", "WS").inc()
+        if profile is not None:
+            reply["profile_id"] = profile.request_id
+        self.send(reply)
+
+    async def _write(self) -> None:
+        # The only task that writes to the socket, so messages keep their order
+        while True:
+            message = await self.outbox.get()
+            try:
+                await self.websocket.send_text(orjson.dumps(message).decode())
+            except Exception:
+                return
@@ -0,0 +1,273 @@
+import math
+import os
+import time
+from contextlib import contextmanager
+from redis import Redis
+from redis.exceptions import RedisError
+
+# Explicit per-call timeouts in seconds, so a slow dependency fails the call
+# (and counts against its breaker) instead of holding a worker indefinitely
+TIMEOUTS = {"classroom": 15, "drive": 60, "github": 15, "gemini": 60}
+
+NAMES = {"classroom": "Google Classroom", "drive": "Google Drive", "github": "GitHub", "gemini": "Gemini"}
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+# Suggested wait after a timeout or 5xx while the breaker is still closed
+FAILURE_RETRY_AFTER = 5
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of calling a dependency whose breaker is open.
+    """
+
+    def __init__(self, dependency: str, retry_after: int):
+        super().__init__(f"{NAMES.get(dependency, dependency)} is not responding, retry in {retry_after} s")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+def is_failure(error: Exception) -> bool:
+    """
+    Tells whether an error means the dependency itself is unhealthy: timeouts,
+    connection errors and 5xx responses count; 4xx responses (bad key, missing
+    file, rate limit on one student's key) do not.
+    """
+    if isinstance(error, CircuitOpen):
+        return False
+    # googleapiclient's HttpError carries the response, google.genai's APIError the code
+    status = getattr(getattr(error, "resp", None), "status", None) or getattr(error, "code", None)
+    if isinstance(status, int):
+        return status >= 500 or status == 408
+    return isinstance(error, OSError) or type(error).__module__.split(".")[0] in ("httplib2", "httpx", "requests")
+
+
+def is_outage(error: Exception) -> bool:
+    """
+    Tells whether an error means a dependency is down, so the work that hit it
+    cannot be completed: its breaker is open, or the call itself failed.
+    """
+    return isinstance(error, CircuitOpen) or is_failure(error)
+
+
+class CallOutcome:
+    """
+    Lets a guarded call report a failure that did not raise, e.g. a 5xx
+    response returned by requests.
+    """
+
+    def __init__(self) -> None:
+        self.failed = False
+
+
+class CircuitBreaker:
+    """
+    Stops calling a dependency that keeps failing, shared by every worker.
+
+    Calls and failures are counted per WINDOW in Redis. When at least
+    MIN_FAILURES calls in a window fail and they are at least FAILURE_RATIO of
+    the calls, the breaker opens for OPEN_FOR seconds and every worker rejects
+    calls at once with CircuitOpen. Afterwards it is half-open: a single probe
+    call is let through, and its outcome closes the breaker or opens it again.
+
+    If Redis is unavailable the breaker stays closed rather than blocking calls.
+    """
+
+    WINDOW = 30
+    MIN_FAILURES = 5
+    FAILURE_RATIO = 0.5
+    OPEN_FOR = 30
+    # How long a worker trusts its last read of the shared state
+    STATE_CACHE_TTL = 1.0
+
+    def __init__(self, dependency: str, redis: Redis = None) -> None:
+        """
+        Initializes the CircuitBreaker.
+
+        Args:
+            dependency (str): The dependency name used by metrics.track, e.g. "classroom"
+            redis (Redis): Client holding the shared state, defaults to REDIS_URL
+        """
+        self.dependency = dependency
+        self.redis = redis or Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+        self.prefix = f"circuit:{dependency}"
+        # (state, seconds until it may change, monotonic time the read expires)
+        self._cached = None
+        # Warn once per outage rather than on every call, e.g. for the CLI tools run without Redis
+        self._redis_down = False
+        self.stats = {"opened": 0, "closed": 0, "rejected": 0, "failures": 0}
+
+    def get_stats(self) -> dict:
+        state, retry_after = self._read_state()
+        return {**self.stats, "state": state, "retry_after": retry_after}
+
+    def retry_after(self) -> int:
+        """
+        Returns 0 if a call may be attempted now, else the seconds until it may.
+        """
+        state, retry_after = self._state()
+        return retry_after if state == OPEN else 0
+
+    @contextmanager
+    def guard(self):
+        """
+        Wraps one call to the dependency:
+
+            with breaker.guard() as outcome:
+                response = call()
+                outcome.failed = response.status_code >= 500
+
+        Raises:
+            CircuitOpen: If the breaker is open, or half-open with a probe already running
+        """
+        probe = self._admit()
+        outcome = CallOutcome()
+        try:
+            yield outcome
+        except Exception as e:
+            self._record(not is_failure(e), probe)
+            raise
+        self._record(not outcome.failed, probe)
+
+    def _admit(self) -> bool:
+        state, retry_after = self._state()
+        if state == CLOSED:
+            return False
+        if state == HALF_OPEN and self._redis(
+            lambda: self.redis.set(f"{self.prefix}:probe", 1, nx=True, ex=math.ceil(TIMEOUTS.get(self.dependency, 30)))
+        ):
+            return True
+        self.stats["rejected"] += 1
+        raise CircuitOpen(self.dependency, max(1, retry_after))
+
+    def _record(self, success: bool, probe: bool) -> None:
+        if not success:
+            self.stats["failures"] += 1
+        if probe:
+            if success:
+                self._close()
+            else:
+                self._open()
+            return
+
+        key = f"{self.prefix}:{int(time.time() // self.WINDOW)}"
+
+        def count():
+            pipe = self.redis.pipeline()
+            pipe.hincrby(key, "calls", 1)
+            pipe.hincrby(key, "failures", 0 if success else 1)
+            pipe.expire(key, self.WINDOW * 2)
+            return pipe.execute()
+
+        counts = self._redis(count)
+        if success or not counts:
+            return
+        calls, failures = counts[0], counts[1]
+        if failures >= self.MIN_FAILURES and failures / calls >= self.FAILURE_RATIO and self._state()[0] == CLOSED:
+            self._open()
+
+    def _open(self) -> None:
+        def trip():
+            pipe = self.redis.pipeline()
+            pipe.set(f"{self.prefix}:open", 1, ex=self.OPEN_FOR)
+            # Outlives the open key, so expiry turns the breaker half-open rather than closed
+            pipe.set(f"{self.prefix}:half_open", 1, ex=24 * 60 * 60)
+            pipe.delete(f"{self.prefix}:probe")
+            pipe.execute()
+
+        self._redis(trip)
+        self.stats["opened"] += 1
+        self._cached = (OPEN, self.OPEN_FOR, time.monotonic() + self.STATE_CACHE_TTL)
+        print(f"🔌 {NAMES.get(self.dependency, self.dependency)} circuit opened for {self.OPEN_FOR}s")
+
+    def _close(self) -> None:
+        self._redis(lambda: self.redis.delete(f"{self.prefix}:half_open", f"{self.prefix}:probe"))
+        self.stats["closed"] += 1
+        self._cached = (CLOSED, 0, time.monotonic() + self.STATE_CACHE_TTL)
+        print(f"🔌 {NAMES.get(self.dependency, self.dependency)} circuit closed")
+
+    def _state(self) -> tuple:
+        if self._cached is not None and time.monotonic() < self._cached[2]:
+            return self._cached[:2]
+        state, retry_after = self._read_state()
+        self._cached = (state, retry_after, time.monotonic() + self.STATE_CACHE_TTL)
+        return state, retry_after
+
+    def _read_state(self) -> tuple:
+        def read():
+            pipe = self.redis.pipeline()
+            pipe.ttl(f"{self.prefix}:open")
+            pipe.exists(f"{self.prefix}:half_open")
+            return pipe.execute()
+
+        result = self._redis(read)
+        if not result:
+            return CLOSED, 0
+        open_ttl, half_open = result
+        if open_ttl > 0:
+            return OPEN, open_ttl
+        if half_open:
+            return HALF_OPEN, 1
+        return CLOSED, 0
+
+    def _redis(self, fn):
+        try:
+            result = fn()
+        except RedisError as e:
+            if not self._redis_down:
+                print(f"⚠️ Circuit breaker for {self.dependency} disabled, Redis unavailable: {e}")
+            self._redis_down = True
+            return None
+        self._redis_down = False
+        return result
+
+
+breakers: dict[str, CircuitBreaker] = {}
+
+
+def breaker(dependency: str) -> CircuitBreaker:
+    if dependency not in breakers:
+        breakers[dependency] = CircuitBreaker(dependency)
+    return breakers[dependency]
+
+
+def guard(dependency: str):
+    """
+    Shorthand for `breaker(dependency).guard()`.
+    """
+    return breaker(dependency).guard()
+
+
+def check(*dependencies: str) -> None:
+    """
+    Fails fast before work that needs all of `dependencies`.
+
+    Raises:
+        CircuitOpen: For the open breaker that stays open longest, if any
+    """
+    waits = {dependency: breaker(dependency).retry_after() for dependency in dependencies}
+    dependency = max(waits, key=waits.get)
+    if waits[dependency]:
+        breaker(dependency).stats["rejected"] += 1
+        raise CircuitOpen(dependency, waits[dependency])
+
+
+def outage(error: Exception, dependency: str) -> CircuitOpen | None:
+    """
+    Returns `error` as a CircuitOpen carrying a retry_after if it is an outage
+    of `dependency` (see is_outage), else None.
+    """
+    if isinstance(error, CircuitOpen):
+        return error
+    if is_failure(error):
+        return CircuitOpen(dependency, max(FAILURE_RETRY_AFTER, breaker(dependency).retry_after()))
+    return None
+
+
+def get_stats() -> dict:
+    return {
+        f"{dependency}_{name}": value
+        for dependency in TIMEOUTS
+        for name, value in breaker(dependency).get_stats().items()
+    }
@@ -3,6 +3,8 @@ import re
 import base64
 from datetime import datetime
 from fastapi import FastAPI, HTTPException, Body
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from pytz import timezone, utc
 from googleapiclient.discovery import build
@@ -12,6 +14,7 @@ from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from typing import Optional
 import io
+import json
 import zipfile
 
 app = FastAPI()
@@ -258,6 +261,47 @@ async def classroom_create_assignment(course_id: str):
 async def classroom_get_assignments(course_id: str):
     return gcr_client.get_assignments(course_id)
 
+# Kept apart from token.json: the export also needs drive.readonly, which
+# the tokens granted for gcr_client's SCOPES do not carry
+EXPORT_TOKEN_PATH = "export_token.json"
+
+@app.post("/classroom/export_login")
+async def classroom_export_login():
+    from submission_export import EXPORT_SCOPES
+
+    try:
+        if not os.path.exists(gcr_client.credentials_path):
+            raise HTTPException(status_code=404, detail="credentials.json not found")
+        flow = InstalledAppFlow.from_client_secrets_file(gcr_client.credentials_path, EXPORT_SCOPES)
+        creds = flow.run_local_server(port=0)
+        with open(EXPORT_TOKEN_PATH, 'w') as token_file:
+            token_file.write(creds.to_json())
+        return {"status": "login_success"}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
+
+@app.post("/classroom/export_submissions")
+async def classroom_export_submissions(course_id: str, assignment_id: str = "-"):
+    """
+    Downloads every student's submission to ./exports and streams the NDJSON
+    manifest records as they complete. Call it again to resume.
+    Needs a prior /classroom/export_login.
+    """
+    from google_classroom import GoogleClassroomClient as ExportClient
+    from submission_export import EXPORT_SCOPES, SubmissionExport
+
+    if not os.path.exists(EXPORT_TOKEN_PATH):
+        raise HTTPException(status_code=401, detail="Not logged in for export, call /classroom/export_login")
+    creds = Credentials.from_authorized_user_file(EXPORT_TOKEN_PATH, EXPORT_SCOPES)
+    if creds.expired and creds.refresh_token:
+        # A blocking token request; keep it off the event loop
+        await run_in_threadpool(creds.refresh, Request())
+    export = SubmissionExport(ExportClient(creds=creds), "exports")
+    records = (json.dumps(record) + "\n" for record in export.run(course_id, assignment_id))
+    return StreamingResponse(records, media_type="application/x-ndjson")
+
 @app.post("/classroom/join_course")
 async def classroom_join_course(course_id: str, enrollment_code: str):
     return gcr_client.join_course_as_student(course_id, enrollment_code)
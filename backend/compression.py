@@ -0,0 +1,153 @@
+import zlib
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it only gzip is offered
+    brotli = None
+
+# Already compressed, or has to reach the client byte for byte
+EXCLUDED_CONTENT_TYPES = ("application/zip", "application/gzip", "image/", "text/event-stream")
+
+# Larger bodies are compressed in the threadpool so they do not stall the event loop
+THREAD_MINIMUM_SIZE = 128 * 1024
+
+stats = {encoding: {"responses": 0, "bytes_in": 0, "bytes_out": 0} for encoding in ("gzip", "br")}
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """
+    Picks "br" or "gzip" from an Accept-Encoding header, preferring brotli.
+    """
+    offered = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip()] = quality
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class Compressor:
+    """
+    Incremental gzip or brotli compressor. `compress` flushes after each chunk
+    so streamed NDJSON lines reach the client as soon as they are produced.
+    """
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int) -> None:
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least `minimum_size` bytes with brotli or gzip,
+    as negotiated through Accept-Encoding, and counts the bytes saved.
+
+    Streaming responses are compressed chunk by chunk regardless of size.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 1, brotli_quality: int = 4) -> None:
+        """
+        Initializes the CompressionMiddleware.
+
+        Args:
+            app: The ASGI app to wrap
+            minimum_size (int): Smaller single-body responses are sent as is
+            gzip_level (int): zlib level; higher levels cost several times the CPU for slightly smaller output
+            brotli_quality (int): Brotli quality; 4 is close to gzip's speed with a better ratio
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = "content-encoding" in headers or any(
+                    content_type.startswith(excluded) for excluded in EXCLUDED_CONTENT_TYPES
+                )
+                if passthrough:
+                    await send(start)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+
+            if len(body) >= THREAD_MINIMUM_SIZE:
+                compressed = await run_in_threadpool(compressor.compress, body, not more_body)
+            else:
+                compressed = compressor.compress(body, final=not more_body)
+            counters = stats[encoding]
+            counters["bytes_in"] += len(body)
+            counters["bytes_out"] += len(compressed)
+            if start is not None:
+                if not more_body:
+                    # A single-body response: its compressed length is known now
+                    MutableHeaders(raw=start["headers"])["Content-Length"] = str(len(compressed))
+                await send(start)
+                start = None
+            if not more_body:
+                counters["responses"] += 1
+            await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def get_stats() -> dict:
+    return {
+        f"{encoding}_{name}": value
+        for encoding, counters in stats.items()
+        for name, value in counters.items()
+    }
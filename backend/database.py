@@ -1,15 +1,17 @@
 import os
 from redis import Redis
 import json
-from cryptography.fernet import Fernet
+from metrics import track
 # from upstash_redis import Redis
 
 class Database:
     
     def __init__(self):
+        from cryptography.fernet import Fernet
+
         # self.redis = Redis.from_env()
 
-        self.redis = Redis(host='localhost', port=6379, db=0)
+        self.redis = Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
         encryption_key = os.environ.get('PYBUDDY_ENCRYPTION_KEY')
         if not encryption_key:
             raise ValueError('Encryption key not set in environment variable PYBUDDY_ENCRYPTION_KEY')
@@ -19,7 +21,7 @@ class Database:
         user_data = self._get_or_create_user(username)
         encrypted_api_key = self.cipher.encrypt(api_key.encode()).decode()
         user_data['api_key'] = encrypted_api_key
-        self.redis.set(username, json.dumps(user_data))
+        self._save_user(username, user_data)
 
     def get_api(self, username: str):
         user_data = self._get_or_create_user(username)
@@ -36,7 +38,7 @@ class Database:
         user_data['github_name'] = github_name
         encrypted_github_token = self.cipher.encrypt(github_token.encode()).decode()
         user_data['github_token'] = encrypted_github_token
-        self.redis.set(username, json.dumps(user_data))
+        self._save_user(username, user_data)
 
     def get_github(self, username: str):
         user_data = self._get_or_create_user(username)
@@ -58,10 +60,44 @@ class Database:
             del user_data['github_name']
         if 'github_token' in user_data:
             del user_data['github_token']
-        self.redis.set(username, json.dumps(user_data))
+        self._save_user(username, user_data)
     
+    def set_session(self, session_id: str, info: str, expiry: float, ttl: int):
+        encrypted_info = self.cipher.encrypt(info.encode()).decode()
+        with track("redis", "set"):
+            self.redis.set(f"session:{session_id}", encrypted_info, ex=ttl)
+            self.redis.zadd("session_expiry", {session_id: expiry})
+
+    def get_session(self, session_id: str):
+        with track("redis", "get"):
+            encrypted_info = self.redis.get(f"session:{session_id}")
+        if encrypted_info:
+            try:
+                return self.cipher.decrypt(encrypted_info).decode()
+            except Exception:
+                return None
+        return None
+
+    def touch_session(self, session_id: str, ttl: int):
+        with track("redis", "expire"):
+            self.redis.expire(f"session:{session_id}", ttl)
+
+    def delete_session(self, session_id: str):
+        with track("redis", "delete"):
+            self.redis.delete(f"session:{session_id}")
+            self.redis.zrem("session_expiry", session_id)
+
+    def get_sessions_expiring_before(self, timestamp: float):
+        with track("redis", "zrangebyscore"):
+            return [session_id.decode() for session_id in self.redis.zrangebyscore("session_expiry", "-inf", timestamp)]
+
+    def _save_user(self, username: str, user_data: dict):
+        with track("redis", "set"):
+            self.redis.set(username, json.dumps(user_data))
+
     def _get_or_create_user(self, username: str):
-        data = self.redis.get(username)
+        with track("redis", "get"):
+            data = self.redis.get(username)
         if data:
             return json.loads(data)
         return {}
@@ -0,0 +1,293 @@
+import json
+import os
+import secrets
+import time
+from datetime import datetime, timezone
+from redis import Redis
+from circuit_breaker import is_outage
+from google_classroom import GoogleClassroomClient
+from metrics import track
+
+EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _parse_time(value: str) -> datetime:
+    # Classroom timestamps are RFC 3339 with a variable number of fractional digits
+    return datetime.fromisoformat(value.replace("Z", "+00:00")) if value else EPOCH
+
+
+class TreeSync:
+    """
+    Keeps a per-user snapshot of the classroom tree in Redis so a refresh only
+    sends what changed since the client's cursor.
+
+    Coursework is listed newest-update-first and read only down to the
+    course's previous high-water updateTime, and the user's submissions for a
+    whole course come back from a single studentSubmissions.list call. A
+    refresh costs a few upstream calls per course instead of one per
+    assignment, and the response carries only the changes.
+
+    Deleted coursework is never listed again. Work the user had a submission
+    for is dropped when that submission disappears; only for courses holding
+    work without one (e.g. a teacher's) are the coursework ids listed as well.
+    """
+
+    SNAPSHOT_TTL = 7 * 24 * 60 * 60
+    # A cursor's snapshot is kept this long once a sync from it has issued the
+    # next one, in case that response never reached the client
+    SUPERSEDED_TTL = 10 * 60
+    # Live cursors per user (e.g. one per open editor); older snapshots are deleted
+    MAX_CURSORS = 4
+    # Most refreshes find no new coursework, so a small first page is enough
+    DELTA_PAGE_SIZE = 10
+
+    def __init__(self, redis: Redis = None) -> None:
+        """
+        Initializes the TreeSync.
+
+        Args:
+            redis (Redis): Client used to store snapshots, defaults to REDIS_URL
+        """
+        self.redis = redis or Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+        self.stats = {"full": 0, "delta": 0, "unchanged": 0, "changes": 0}
+
+    def iter_full(self, gcr: GoogleClassroomClient):
+        """
+        Fetches the whole tree and starts a new cursor.
+
+        Yields one {"courseId", "courseName", "assignments"} record per course as
+        soon as it is fetched, then {"cursor": ...}; or a single {"error": ...}.
+        """
+        course_result = gcr.get_courses()
+        if "error" in course_result:
+            yield course_result
+            return
+
+        snapshot = {}
+        for course in course_result["courses"]:
+            entry = self._fetch_course(gcr, course, None)
+            if entry is None:
+                continue
+            snapshot[course["id"]] = entry
+            record = self._course_record(course["id"], entry)
+            if record["assignments"]:
+                yield record
+
+        self.stats["full"] += 1
+        yield {"cursor": self._save(gcr.get_profile()["id"], snapshot)}
+
+    def sync(self, gcr: GoogleClassroomClient, cursor: str = None) -> dict:
+        """
+        Returns the changes to the tree since `cursor`.
+
+        Args:
+            gcr (GoogleClassroomClient): Client for the signed-in user
+            cursor (str): Cursor from the previous full load or sync, if any
+
+        Returns:
+            dict: {"cursor", "changes": [...]}, or {"cursor", "full": True, "gcr_data": [...]}
+                when the cursor is missing or expired, or {"error": ...}
+        """
+        course_result = gcr.get_courses()
+        if "error" in course_result:
+            return course_result
+
+        user_id = gcr.get_profile()["id"]
+        previous = self._load(user_id, cursor) if cursor else None
+
+        snapshot = {}
+        for course in course_result["courses"]:
+            old = previous.get(course["id"]) if previous else None
+            entry = self._fetch_course(gcr, course, old)
+            if entry is None:
+                if old is not None:
+                    # Keep what the client already has rather than flapping the course away
+                    snapshot[course["id"]] = old
+                continue
+            snapshot[course["id"]] = entry
+
+        if previous is None:
+            self.stats["full"] += 1
+            return {"cursor": self._save(user_id, snapshot), "full": True, "gcr_data": self._tree(snapshot)}
+
+        if snapshot == previous:
+            self.stats["unchanged"] += 1
+            with track("redis", "expire"):
+                pipe = self.redis.pipeline()
+                pipe.expire(self._key(user_id, cursor), self.SNAPSHOT_TTL)
+                pipe.zadd(self._cursors_key(user_id), {cursor: time.time()})
+                pipe.expire(self._cursors_key(user_id), self.SNAPSHOT_TTL)
+                pipe.execute()
+            return {"cursor": cursor, "changes": []}
+
+        changes = self.diff(self._tree(previous), self._tree(snapshot))
+        self.stats["delta"] += 1
+        self.stats["changes"] += len(changes)
+        return {"cursor": self._save(user_id, snapshot, superseded=cursor), "changes": changes}
+
+    @staticmethod
+    def diff(old_tree: list, new_tree: list) -> list:
+        """
+        Compares two trees and returns the operations that turn the old one
+        into the new one:
+
+            {"op": "add_course", "course": {...}}
+            {"op": "remove_course", "courseId": ...}
+            {"op": "rename_course", "courseId": ..., "courseName": ...}
+            {"op": "add_assignment", "courseId": ..., "assignment": {...}}
+            {"op": "update_assignment", "courseId": ..., "assignmentId": ..., "fields": {only the changed fields}}
+            {"op": "remove_assignment", "courseId": ..., "assignmentId": ...}
+        """
+        old_courses = {course["courseId"]: course for course in old_tree}
+        new_courses = {course["courseId"]: course for course in new_tree}
+        changes = [
+            {"op": "remove_course", "courseId": course_id}
+            for course_id in old_courses if course_id not in new_courses
+        ]
+
+        for course_id, course in new_courses.items():
+            old = old_courses.get(course_id)
+            if old is None:
+                changes.append({"op": "add_course", "course": course})
+                continue
+            if old["courseName"] != course["courseName"]:
+                changes.append({"op": "rename_course", "courseId": course_id, "courseName": course["courseName"]})
+
+            old_assignments = {assignment["assignmentId"]: assignment for assignment in old["assignments"]}
+            new_ids = set()
+            for assignment in course["assignments"]:
+                assignment_id = assignment["assignmentId"]
+                new_ids.add(assignment_id)
+                previous = old_assignments.get(assignment_id)
+                if previous is None:
+                    changes.append({"op": "add_assignment", "courseId": course_id, "assignment": assignment})
+                elif previous != assignment:
+                    fields = {key: value for key, value in assignment.items() if previous.get(key) != value}
+                    changes.append({"op": "update_assignment", "courseId": course_id, "assignmentId": assignment_id, "fields": fields})
+            changes.extend(
+                {"op": "remove_assignment", "courseId": course_id, "assignmentId": assignment_id}
+                for assignment_id in old_assignments if assignment_id not in new_ids
+            )
+        return changes
+
+    def get_stats(self) -> dict:
+        return dict(self.stats)
+
+    def save_last(self, owner: str, tree: list) -> None:
+        """
+        Keeps the last full tree loaded for `owner` (a session), served marked
+        stale while Classroom is unavailable.
+        """
+        with track("redis", "set"):
+            self.redis.set(f"gcr_last:{owner}", json.dumps(tree), ex=self.SNAPSHOT_TTL)
+
+    def load_last(self, owner: str) -> list | None:
+        with track("redis", "get"):
+            data = self.redis.get(f"gcr_last:{owner}")
+        return json.loads(data) if data else None
+
+    def _fetch_course(self, gcr: GoogleClassroomClient, course: dict, old: dict | None) -> dict | None:
+        """
+        Builds a course's snapshot entry, reusing the coursework in `old` that
+        has not been updated since.
+        """
+        course_id = course["id"]
+        try:
+            watermark = _parse_time(old["watermark"]) if old else None
+            changed = []
+            # Listed newest-update-first, so stop at the first item the snapshot already has
+            page_size = self.DELTA_PAGE_SIZE if old else 100
+            for work in gcr.iter_coursework(course_id, page_size, order_by="updateTime desc"):
+                if watermark is not None and _parse_time(work.get("updateTime")) <= watermark:
+                    break
+                changed.append(work)
+            submissions = {
+                submission["courseWorkId"]: submission
+                for submission in gcr.iter_course_submissions(course_id)
+            }
+            changed_ids = {work["id"] for work in changed}
+            # Work without a submission gives no sign of being deleted, so check its id is still listed
+            existing = None
+            if old and any(work["id"] not in changed_ids and work["id"] not in old["submissions"] for work in old["work"]):
+                existing = {work["id"] for work in gcr.iter_coursework_ids(course_id)}
+        except Exception as e:
+            if is_outage(e):
+                # Skipping the course would pass a truncated tree off as complete
+                raise
+            print(f"⚠️ Skipping course {course.get('name')} ({course_id}) due to permission error: {e}")
+            return None
+
+        work = list(changed)
+        if old:
+            for old_work in old["work"]:
+                if old_work["id"] in changed_ids:
+                    continue
+                # Deleted coursework is never listed again, but its submission disappears
+                if old_work["id"] in old["submissions"] and old_work["id"] not in submissions:
+                    continue
+                if existing is not None and old_work["id"] not in existing:
+                    continue
+                work.append(old_work)
+
+        newest = changed[0].get("updateTime") if changed else None
+        return {
+            "name": course["name"],
+            "watermark": newest or (old["watermark"] if old else None),
+            "work": work,
+            "submissions": {item["id"]: submissions[item["id"]] for item in work if item["id"] in submissions},
+        }
+
+    def _course_record(self, course_id: str, entry: dict) -> dict:
+        return {
+            "courseId": course_id,
+            "courseName": entry["name"],
+            "assignments": [
+                GoogleClassroomClient.assignment_record(work, entry["submissions"].get(work["id"]))
+                for work in entry["work"]
+            ],
+        }
+
+    def _tree(self, snapshot: dict) -> list:
+        records = (self._course_record(course_id, entry) for course_id, entry in snapshot.items())
+        return [record for record in records if record["assignments"]]
+
+    def _key(self, user_id: str, cursor: str) -> str:
+        return f"gcr_sync:{user_id}:{cursor}"
+
+    def _load(self, user_id: str, cursor: str) -> dict | None:
+        with track("redis", "get"):
+            data = self.redis.get(self._key(user_id, cursor))
+        return json.loads(data) if data else None
+
+    def _cursors_key(self, user_id: str) -> str:
+        # Sorted set of the user's live cursors, scored by when they were last issued or used
+        return f"gcr_sync_cursors:{user_id}"
+
+    def _save(self, user_id: str, snapshot: dict, superseded: str = None) -> str:
+        """
+        Stores a snapshot under a new cursor and returns it.
+
+        The snapshot of `superseded`, the cursor this one replaces, expires
+        after SUPERSEDED_TTL, and beyond MAX_CURSORS per user the least
+        recently used snapshots are deleted, so repeated syncs and full loads
+        do not pile up week-long copies of the tree.
+        """
+        cursor = secrets.token_urlsafe(16)
+        cursors_key = self._cursors_key(user_id)
+        with track("redis", "set"):
+            pipe = self.redis.pipeline()
+            pipe.set(self._key(user_id, cursor), json.dumps(snapshot), ex=self.SNAPSHOT_TTL)
+            if superseded:
+                pipe.expire(self._key(user_id, superseded), self.SUPERSEDED_TTL)
+                pipe.zrem(cursors_key, superseded)
+            pipe.zadd(cursors_key, {cursor: time.time()})
+            pipe.expire(cursors_key, self.SNAPSHOT_TTL)
+            pipe.zrange(cursors_key, 0, -self.MAX_CURSORS - 1)
+            evicted = pipe.execute()[-1]
+        if evicted:
+            with track("redis", "delete"):
+                pipe = self.redis.pipeline()
+                pipe.delete(*(self._key(user_id, old.decode()) for old in evicted))
+                pipe.zrem(cursors_key, *evicted)
+                pipe.execute()
+        return cursor
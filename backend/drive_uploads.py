@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import threading
+from redis import Redis
+from metrics import track
+
+
+def file_hashes(files_dict: dict) -> dict:
+    """
+    Returns {filename: sha256 hex digest of its content}.
+    """
+    return {name: hashlib.sha256(content.encode()).hexdigest() for name, content in files_dict.items()}
+
+
+def archive_hash(files_dict: dict, zip_name: str) -> str:
+    """
+    Hashes a submission archive from its name and per-file hashes rather than
+    from the zip bytes, which change with every write because zip entries
+    carry a timestamp.
+    """
+    digest = hashlib.sha256(zip_name.encode() + b"\0")
+    for name, file_hash in sorted(file_hashes(files_dict).items()):
+        digest.update(name.encode() + b"\0" + file_hash.encode() + b"\0")
+    return digest.hexdigest()
+
+
+class DriveUploadCache:
+    """
+    Remembers, per user, which Drive file holds each submission archive, so
+    resubmitting unchanged files attaches the existing upload instead of
+    zipping and uploading the same bytes again.
+    """
+
+    # Drive files outlive this; an expired entry only costs one re-upload
+    TTL = 90 * 24 * 60 * 60
+
+    def __init__(self, redis: Redis = None) -> None:
+        """
+        Initializes the DriveUploadCache.
+
+        Args:
+            redis (Redis): Client used to store the mappings, defaults to REDIS_URL
+        """
+        self.redis = redis or Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+        # Updated from the threadpool workers that run the submissions
+        self.stats = {"reused": 0, "uploaded": 0, "stale": 0, "bytes_skipped": 0}
+        self._stats_lock = threading.Lock()
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def record_hit(self, files_dict: dict) -> None:
+        """
+        Counts a reused upload and the bytes it did not have to send.
+        """
+        skipped = sum(len(content.encode()) for content in files_dict.values())
+        with self._stats_lock:
+            self.stats["reused"] += 1
+            self.stats["bytes_skipped"] += skipped
+
+    def record_stale(self, user_id: str, digest: str) -> None:
+        """
+        Drops an entry whose Drive file was deleted or trashed since.
+        """
+        with self._stats_lock:
+            self.stats["stale"] += 1
+        self.forget(user_id, digest)
+
+    def get(self, user_id: str, digest: str) -> dict | None:
+        """
+        Returns {"id", "link", "files"} for an archive uploaded before, or None.
+        """
+        with track("redis", "get"):
+            data = self.redis.get(self._key(user_id, digest))
+        return json.loads(data) if data else None
+
+    def put(self, user_id: str, digest: str, file_id: str, link: str, files_dict: dict) -> None:
+        entry = {"id": file_id, "link": link, "files": file_hashes(files_dict)}
+        with track("redis", "set"):
+            self.redis.set(self._key(user_id, digest), json.dumps(entry), ex=self.TTL)
+        with self._stats_lock:
+            self.stats["uploaded"] += 1
+
+    def forget(self, user_id: str, digest: str) -> None:
+        with track("redis", "delete"):
+            self.redis.delete(self._key(user_id, digest))
+
+    def _key(self, user_id: str, digest: str) -> str:
+        return f"drive_upload:{user_id}:{digest}"
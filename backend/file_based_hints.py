@@ -1,14 +1,24 @@
+import hashlib
+import json
 import os
-from pydantic import BaseModel
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
 import pathlib
-import json
 import question_separator_prompt
+from metrics import track
+from circuit_breaker import TIMEOUTS, CircuitOpen, guard
 
 load_dotenv()
 
+# The "hint_text" value of a JSON hint that may still be streaming in
+PARTIAL_HINT_TEXT = re.compile(r'"hint_text"\s*:\s*"((?:[^"\\]|\\.)*)')
+INCOMPLETE_ESCAPE = re.compile(r'\\u[0-9a-fA-F]{0,3}$')
+
 class FileBasedHints:
     """
     A class to handle file-based hint generation using a language model.
@@ -19,14 +29,197 @@ class FileBasedHints:
         hint_topic: str
         concepts: dict[str, str]
 
+    MAX_PARSE_ATTEMPTS = 2
+    MAX_RATE_LIMIT_RETRIES = 3
+    RATE_LIMIT_BACKOFF = 2.0
+    # Clients kept for the most recently used API keys
+    MAX_CLIENTS = 256
+
     def __init__(self) -> None:
         """
         Initializes the FileBasedHints class.
         """
-        self.model = None
-        self.llm = None
+        self.model = "gemini-2.5-flash"
+        # One client per API key, shared across requests so connections are reused.
+        # Keyed by a hash of the key and bounded, least recently used first out
+        self.clients: OrderedDict[str, object] = OrderedDict()
+        self._clients_lock = threading.Lock()
+        # Updated from the threadpool workers that run the hint requests
+        self.parse_stats = {"responses": 0, "failures": 0, "repaired": 0, "retries": 0}
+        self._stats_lock = threading.Lock()
+
+    def get_parse_stats(self) -> dict:
+        """
+        Returns the hint parsing counters along with the parse-failure rate.
+        """
+        with self._stats_lock:
+            stats = dict(self.parse_stats)
+        stats["failure_rate"] = stats["failures"] / stats["responses"] if stats["responses"] else 0.0
+        return stats
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.parse_stats[name] += 1
+
+    def _parse_hint(self, text: str) -> dict | None:
+        """
+        Validates the model response against the Hint schema, applying a cheap
+        local repair for almost-valid JSON before giving up.
+
+        Args:
+            text (str): Raw text returned by the language model
+
+        Returns:
+            dict | None: The validated hint, or None if it could not be parsed
+        """
+        self._count("responses")
+        text = (text or "").strip()
+        try:
+            return self.Hint.model_validate_json(text).model_dump()
+        except ValidationError:
+            pass
+
+        try:
+            hint = self.Hint.model_validate_json(self._repair_json(text)).model_dump()
+            self._count("repaired")
+            return hint
+        except ValidationError:
+            self._count("failures")
+            return None
 
-    def get_general_hints(self, present_code: dict[str, str], question_data: str, api_key: str, topic: str) -> dict:
+    @staticmethod
+    def _repair_json(text: str) -> str:
+        """
+        Fixes the usual near-misses: markdown fences, text around the object
+        and trailing commas.
+
+        Scans from the first "{" to the end of that object, tracking strings,
+        so braces in trailing prose and commas inside the hint text are left
+        alone. Only a comma right before a closing bracket is dropped.
+        """
+        text = re.sub(r"^```(?:json)?|```$", "", text.strip()).strip()
+        start = text.find("{")
+        if start == -1:
+            return text
+        out = []
+        depth = 0
+        in_string = escaped = False
+        for char in text[start:]:
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "{[":
+                depth += 1
+            elif char in "}]":
+                end = len(out)
+                while end and out[end - 1].isspace():
+                    end -= 1
+                if end and out[end - 1] == ",":
+                    del out[end - 1]
+                depth -= 1
+            out.append(char)
+            if depth == 0:
+                break
+        return "".join(out)
+
+    @staticmethod
+    def warm_up() -> None:
+        """
+        Imports the genai client library ahead of the first hint request.
+        """
+        from google import genai  # noqa: F401
+        from google.genai import errors, types  # noqa: F401
+
+    def _get_client(self, api_key: str):
+        # google.genai is slow to import, so it is loaded on first use (or by warm_up())
+        from google import genai
+        from google.genai import types
+
+        key = hashlib.sha256(api_key.encode()).hexdigest()
+        with self._clients_lock:
+            client = self.clients.get(key)
+            if client is not None:
+                self.clients.move_to_end(key)
+                return client
+        base_url = os.environ.get("PYBUDDY_GEMINI_BASE_URL")
+        # HttpOptions takes the timeout in milliseconds
+        http_options = types.HttpOptions(base_url=base_url, timeout=TIMEOUTS["gemini"] * 1000)
+        client = genai.Client(api_key=api_key, http_options=http_options)
+        with self._clients_lock:
+            client = self.clients.setdefault(key, client)
+            self.clients.move_to_end(key)
+            while len(self.clients) > self.MAX_CLIENTS:
+                # Not closed here: a request may still be using it; its connections go with it
+                self.clients.popitem(last=False)
+        return client
+
+    def _generate_content(self, llm, **kwargs):
+        """
+        Calls the model, backing off exponentially (with jitter) when the
+        endpoint answers 429 so a busy key is not hammered further.
+        """
+        from google.genai import errors
+
+        for attempt in range(self.MAX_RATE_LIMIT_RETRIES + 1):
+            try:
+                with guard("gemini"), track("gemini", "generate_content"):
+                    return llm.models.generate_content(**kwargs)
+            except errors.ClientError as e:
+                if e.code != 429 or attempt == self.MAX_RATE_LIMIT_RETRIES:
+                    raise
+                delay = self.RATE_LIMIT_BACKOFF * 2 ** attempt * (1 + random.random() / 2)
+                print(f"Rate limited by the model endpoint, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _generate_content_stream(self, llm, on_token, **kwargs) -> str:
+        """
+        Streams the model's answer, passing each newly generated piece of the
+        hint text to `on_token`, and returns the full response text.
+        """
+        from google.genai import errors
+
+        for attempt in range(self.MAX_RATE_LIMIT_RETRIES + 1):
+            text = ""
+            sent = 0
+            try:
+                with guard("gemini"), track("gemini", "generate_content_stream"):
+                    for chunk in llm.models.generate_content_stream(**kwargs):
+                        text += chunk.text or ""
+                        partial = self._partial_hint_text(text)
+                        if len(partial) > sent:
+                            on_token(partial[sent:])
+                            sent = len(partial)
+                return text
+            except errors.ClientError as e:
+                # A 429 arrives before any token, so retrying cannot repeat tokens
+                if e.code != 429 or text or attempt == self.MAX_RATE_LIMIT_RETRIES:
+                    raise
+                delay = self.RATE_LIMIT_BACKOFF * 2 ** attempt * (1 + random.random() / 2)
+                print(f"Rate limited by the model endpoint, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    @staticmethod
+    def _partial_hint_text(text: str) -> str:
+        """
+        Decodes as much of the "hint_text" value as has been generated so far.
+        """
+        match = PARTIAL_HINT_TEXT.search(text)
+        if not match:
+            return ""
+        # Drop an escape sequence that is still being generated
+        raw = INCOMPLETE_ESCAPE.sub("", match[1])
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError:
+            return ""
+
+    def get_general_hints(self, present_code: dict[str, str], question_data: str, api_key: str, topic: str, on_token=None) -> dict:
         """
         Generates hints for the file using the language model.
 
@@ -35,6 +228,9 @@ class FileBasedHints:
             question_data (str): The problem statement
             api_key (str): API key for the language model
             topic (str): Topic of the question
+            on_token (callable): If given, the hint text is streamed to it piece by piece.
+                It is called with None when a response could not be parsed and is
+                regenerated: the text sent so far is void and the new hint follows.
         """
         try:
             current_code = ""
@@ -103,32 +299,43 @@ GOOD: “It looks like you're only choosing one option for the item. What if we
 == Output ==
 Now return one helpful JSON hint for the student based on the code above.
 """
-            os.environ["GEMINI_API_KEY"] = api_key
-            self.model = "gemini-2.5-flash"
-            self.llm = genai.Client(api_key=os.environ["GEMINI_API_KEY"])
-
-            response = self.llm.models.generate_content(
-                model=self.model,
-                contents=[{
-                    "role": "user",
-                    "parts": [{"text": prompt}]
-                }]
-            )
+            llm = self._get_client(api_key)
+            from google.genai import types
 
-            try:
-                cleaned_text = response.text.strip()
-                if cleaned_text.startswith("```json"):
-                    cleaned_text = cleaned_text.removeprefix("```json").strip()
-                if cleaned_text.endswith("```"):
-                    cleaned_text = cleaned_text.removesuffix("```").strip()
-
-                hint_data = json.loads(cleaned_text)
-                print("Generated hint:", hint_data)
-                return {"hint": hint_data}
-            except json.JSONDecodeError as e:
-                print(f"Failed to parse hint response: {response.text}")
-                return {"error": f"Failed to parse hint response: {str(e)}"}
+            hint_data = None
+            for attempt in range(self.MAX_PARSE_ATTEMPTS):
+                if attempt:
+                    self._count("retries")
+                    if on_token is not None:
+                        on_token(None)
+                request = dict(
+                    model=self.model,
+                    contents=[{
+                        "role": "user",
+                        "parts": [{"text": prompt}]
+                    }],
+                    config=types.GenerateContentConfig(
+                        response_mime_type="application/json",
+                        response_json_schema=self.Hint.model_json_schema(),
+                    )
+                )
+                if on_token is not None:
+                    text = self._generate_content_stream(llm, on_token, **request)
+                else:
+                    text = self._generate_content(llm, **request).text
+                hint_data = self._parse_hint(text)
+                if hint_data is not None:
+                    break
+                print(f"Failed to parse hint response (attempt {attempt + 1}): {text}")
+
+            if hint_data is None:
+                return {"error": "Failed to parse hint response, please try again."}
+
+            print("Generated hint:", hint_data)
+            return {"hint": hint_data}
 
+        except CircuitOpen as e:
+            return {"error": str(e), "retry_after": e.retry_after}
         except Exception as e:
             print(f"Error generating hint: {str(e)}")
             error_str = str(e).lower()
@@ -1,10 +1,15 @@
 from fastapi import FastAPI
 from pydantic import BaseModel
+import os
 import requests
 import base64
+from metrics import track
+from circuit_breaker import TIMEOUTS, guard
 
 app = FastAPI()
 
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+
 # === Request Model ===
 class GitPushRequest(BaseModel):
     github_username: str
@@ -21,16 +26,21 @@ class GitHub:
             "Authorization": f"token {token}",
             "Accept": "application/vnd.github+json"
         }
-           
+
+    def _request(self, method, operation, url, **kwargs):
+        with guard("github") as outcome, track("github", operation):
+            response = requests.request(method, url, headers=self.headers, timeout=TIMEOUTS["github"], **kwargs)
+            outcome.failed = response.status_code >= 500
+            return response
 
     def repo_exists(self, repo_name):
-        url = f"https://api.github.com/repos/{self.username}/{repo_name}"
-        response = requests.get(url, headers=self.headers)
+        url = f"{GITHUB_API_URL}/repos/{self.username}/{repo_name}"
+        response = self._request("GET", "repos.get", url)
         return response.status_code == 200
 
     def delete_repo(self, repo_name):
-        url = f"https://api.github.com/repos/{self.username}/{repo_name}"
-        response = requests.delete(url, headers=self.headers)
+        url = f"{GITHUB_API_URL}/repos/{self.username}/{repo_name}"
+        response = self._request("DELETE", "repos.delete", url)
         return response.status_code == 204
 
     def create_repo(self, repo_name):
@@ -38,20 +48,20 @@ class GitHub:
             if not self.delete_repo(repo_name):
                 return False, "Failed to delete existing repository."
 
-        url = "https://api.github.com/user/repos"
+        url = f"{GITHUB_API_URL}/user/repos"
         data = {"name": repo_name, "private": False}
-        response = requests.post(url, headers=self.headers, json=data)
+        response = self._request("POST", "repos.create", url, json=data)
 
         if response.status_code != 201:
             return False, f"GitHub API Error: {response.status_code} - {response.text}"
         return True, None
 
     def push_file(self, repo_name, file_path, content, commit_message="Add file"):
-        url = f"https://api.github.com/repos/{self.username}/{repo_name}/contents/{file_path}"
+        url = f"{GITHUB_API_URL}/repos/{self.username}/{repo_name}/contents/{file_path}"
         encoded_content = base64.b64encode(content.encode('utf-8')).decode('utf-8')
         
         # Check if file already exists (for SHA)
-        get_resp = requests.get(url, headers=self.headers)
+        get_resp = self._request("GET", "contents.get", url)
         sha = get_resp.json().get('sha') if get_resp.status_code == 200 else None
 
         data = {
@@ -61,5 +71,5 @@ class GitHub:
         if sha:
             data["sha"] = sha
 
-        put_resp = requests.put(url, headers=self.headers, json=data)
+        put_resp = self._request("PUT", "push_file", url, json=data)
         return put_resp.status_code in [200, 201], put_resp.json()
@@ -1,11 +1,45 @@
 from __future__ import print_function
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+import functools
+import hashlib
 import io
+import json
+import os
+import threading
 import zipfile
-from googleapiclient.http import MediaIoBaseUpload
+from collections import OrderedDict
+from metrics import track
+from profiling import span
+from drive_uploads import DriveUploadCache, archive_hash
+from circuit_breaker import TIMEOUTS, CircuitOpen, guard, is_outage
+
+# Lets the Classroom and Drive clients be pointed at a local stand-in, e.g. for benchmarks
+GOOGLE_API_ENDPOINT = os.environ.get("PYBUDDY_GOOGLE_API_ENDPOINT")
+CLIENT_OPTIONS = {"api_endpoint": GOOGLE_API_ENDPOINT} if GOOGLE_API_ENDPOINT else None
+
+# The only Classroom fields PyBuddy reads, per call. They are sent as `fields=`
+# partial-response masks so Google neither sends nor we parse the rest.
+RESPONSE_FIELDS = {
+    "courses": {"courses": ["id", "name", "ownerId"], "nextPageToken": None},
+    "profile": {"id": None, "emailAddress": None},
+    "coursework": {"courseWork": ["id", "title", "description", "dueDate", "dueTime", "maxPoints", "updateTime"], "nextPageToken": None},
+    "coursework_ids": {"courseWork": ["id"], "nextPageToken": None},
+    "submission_state": {"studentSubmissions": ["id", "state", "assignedGrade", "draftGrade"], "nextPageToken": None},
+    "course_submissions": {"studentSubmissions": ["courseWorkId", "state", "assignedGrade", "draftGrade", "updateTime"], "nextPageToken": None},
+    "submission_attachments": {"studentSubmissions": ["id", "state", "assignmentSubmission"]},
+    "students": {"students": ["userId", "profile"], "nextPageToken": None},
+    "student_submissions": {"studentSubmissions": ["id", "courseWorkId", "userId", "state", "late", "assignedGrade", "draftGrade", "updateTime", "assignmentSubmission"], "nextPageToken": None},
+}
+
+
+def field_mask(name: str) -> str:
+    """
+    Renders a RESPONSE_FIELDS entry as a partial-response mask, e.g. "courses(id,name),nextPageToken".
+    """
+    return ",".join(
+        key if fields is None else f"{key}({','.join(fields)})"
+        for key, fields in RESPONSE_FIELDS[name].items()
+    )
+
 
 SCOPES = [
     "https://www.googleapis.com/auth/classroom.courses.readonly",
@@ -16,6 +50,73 @@ SCOPES = [
             "https://www.googleapis.com/auth/classroom.profile.emails"
 ]
 
+# The Google client libraries are slow to import, so they are loaded on first use
+# (or by warm_up() before the worker starts taking traffic).
+
+@functools.lru_cache(maxsize=None)
+def _discovery_doc(name: str, version: str) -> dict:
+    from googleapiclient.discovery_cache import get_static_doc
+    return json.loads(get_static_doc(name, version))
+
+
+def build_service(name: str, version: str, credentials):
+    """
+    Builds an API client from the parsed discovery doc cached in memory,
+    instead of reading and parsing it again on every request. Calls time out
+    after the service's entry in circuit_breaker.TIMEOUTS.
+    """
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build_from_document
+
+    http = httplib2.Http(timeout=TIMEOUTS[name])
+    if credentials is not None:
+        http = AuthorizedHttp(credentials, http=http)
+    return build_from_document(_discovery_doc(name, version), http=http, client_options=CLIENT_OPTIONS)
+
+
+def warm_up():
+    """
+    Imports the Google client libraries and preloads the discovery docs.
+    """
+    from google.oauth2.credentials import Credentials
+    for name, version in (("classroom", "v1"), ("drive", "v3")):
+        build_service(name, version, Credentials(token=None))
+    import googleapiclient.http  # noqa: F401
+
+
+# Profiles of recently seen users, keyed by a hash of their refresh token, so
+# a request's client knows the user id without a userProfiles.get call
+MAX_PROFILES = 1024
+_profiles: OrderedDict[str, dict] = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def _profile_key(creds) -> str | None:
+    refresh_token = getattr(creds, "refresh_token", None)
+    return hashlib.sha256(refresh_token.encode()).hexdigest() if refresh_token else None
+
+
+def _cached_profile(creds) -> dict | None:
+    key = _profile_key(creds)
+    with _profiles_lock:
+        profile = _profiles.get(key) if key else None
+        if profile is not None:
+            _profiles.move_to_end(key)
+    return profile
+
+
+def _remember_profile(creds, profile: dict) -> None:
+    key = _profile_key(creds)
+    if key is None:
+        return
+    with _profiles_lock:
+        _profiles[key] = profile
+        _profiles.move_to_end(key)
+        while len(_profiles) > MAX_PROFILES:
+            _profiles.popitem(last=False)
+
+
 def get_creds():
         import os
         import json
@@ -33,15 +134,18 @@ def get_creds():
            
 
 class GoogleClassroomClient:
-    def __init__(self, info: str):
+    def __init__(self, info: str = None, creds=None):
         
         
+        from google.oauth2.credentials import Credentials
+
         self.SCOPES = SCOPES
+        # Credentials from a server-side session are already parsed and kept fresh
+        self.creds = creds
         # Load token if it exists
-        if info and info.strip():
+        if creds is None and info and info.strip():
             try:
                 # Parse the JSON string into a dictionary
-                import json
                 info_dict = json.loads(info)
                 self.creds = Credentials.from_authorized_user_info(info_dict, self.SCOPES)
                 print("✅ Token loaded.")
@@ -49,42 +153,205 @@ class GoogleClassroomClient:
                 print(f"❌ Invalid token format: {e}")
                 self.creds = None
 
+        self._profile = _cached_profile(self.creds)
+
         try:
-            self.service = build('classroom', 'v1', credentials=self.creds)
+            self.service = build_service('classroom', 'v1', self.creds)
             print("✅ Service built.")
         except Exception as e:
             print(f"❌ Error building service: {e}")
             self.service = None
             
-     
-    def upload_to_drive(self, files_dict: dict, zip_name: str = "submission.zip") -> tuple:
+
+    def _execute(self, request, operation: str, dependency: str = "classroom"):
+        with guard(dependency), track(dependency, operation):
+            return request.execute()
+
+    def _paginate(self, method, operation: str, items_key: str, **kwargs):
+        """
+        Yields every item of a Classroom list call, following nextPageToken
+        until the last page.
+        """
+        page_token = None
+        while True:
+            if page_token:
+                kwargs["pageToken"] = page_token
+            response = self._execute(method(**kwargs), operation)
+            yield from response.get(items_key, [])
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return
+
+    def iter_courses(self, page_size: int = 100):
+        return self._paginate(
+            self.service.courses().list, "courses.list", "courses",
+            pageSize=page_size,
+            courseStates=["ACTIVE"],
+            fields=field_mask("courses"),
+        )
+
+    def iter_coursework(self, course_id: str, page_size: int = 100, order_by: str = None):
+        kwargs = {"orderBy": order_by} if order_by else {}
+        return self._paginate(
+            self.service.courses().courseWork().list, "courseWork.list", "courseWork",
+            courseId=course_id,
+            pageSize=page_size,
+            fields=field_mask("coursework"),
+            **kwargs,
+        )
+
+    def iter_coursework_ids(self, course_id: str):
+        """
+        Yields {"id"} for every coursework in a course, the cheapest way to
+        find out which ones were deleted.
+        """
+        return self._paginate(
+            self.service.courses().courseWork().list, "courseWork.list", "courseWork",
+            courseId=course_id,
+            pageSize=100,
+            fields=field_mask("coursework_ids"),
+        )
+
+    def iter_submissions(self, course_id: str, course_work_id: str, user_id: str = "me"):
+        return self._paginate(
+            self.service.courses().courseWork().studentSubmissions().list, "studentSubmissions.list", "studentSubmissions",
+            courseId=course_id,
+            courseWorkId=course_work_id,
+            userId=user_id,
+            fields=field_mask("submission_state"),
+        )
+
+    def iter_course_submissions(self, course_id: str, user_id: str = "me"):
+        """
+        Yields the user's submissions for every assignment in a course, in one
+        paged call instead of one call per assignment.
+        """
+        return self._paginate(
+            self.service.courses().courseWork().studentSubmissions().list, "studentSubmissions.list", "studentSubmissions",
+            courseId=course_id,
+            courseWorkId="-",
+            userId=user_id,
+            fields=field_mask("course_submissions"),
+        )
+
+    def iter_students(self, course_id: str, page_size: int = 100):
+        return self._paginate(
+            self.service.courses().students().list, "students.list", "students",
+            courseId=course_id,
+            pageSize=page_size,
+            fields=field_mask("students"),
+        )
+
+    def iter_student_submissions(self, course_id: str, course_work_id: str = "-", page_size: int = 100):
+        """
+        Yields every student's submission for an assignment, or for every
+        assignment in the course with "-". Needs a teacher's credentials.
+        """
+        return self._paginate(
+            self.service.courses().courseWork().studentSubmissions().list, "studentSubmissions.list", "studentSubmissions",
+            courseId=course_id,
+            courseWorkId=course_work_id,
+            pageSize=page_size,
+            fields=field_mask("student_submissions"),
+        )
+
+    @staticmethod
+    def assignment_record(work: dict, submission: dict = None) -> dict:
+        """
+        Builds the assignment entry the extension shows from a courseWork
+        resource and the user's submission for it.
+        """
+        # Initialize grade info
+        grade_info = None
+        if submission and submission.get("state") == "RETURNED":
+            grade_info = {
+                "assignedGrade": submission.get("assignedGrade"),
+                "draftGrade": submission.get("draftGrade"),
+                "maxPoints": work.get("maxPoints")
+            }
+        return {
+            "assignmentId": work.get("id", ""),
+            "title": work.get("title", ""),
+            "description": work.get("description", "No description given"),
+            "dueDate": work.get("dueDate", {}),
+            "dueTime": work.get("dueTime", {}),
+            "submissionState": submission.get("state") if submission else "UNKNOWN",
+            "gradeInfo": grade_info
+        }
+
+    def upload_to_drive(self, files_dict: dict, zip_name: str = "submission.zip", uploads: DriveUploadCache = None) -> tuple:
+        """
+        Zips the files and uploads the archive to Drive.
+
+        Args:
+            files_dict (dict): filename -> content
+            zip_name (str): Name of the Drive file
+            uploads (DriveUploadCache): If given, an archive with the same name and
+                content uploaded before is reused instead of uploaded again
+
+        Returns:
+            tuple: (webViewLink, file id), or (None, error message)
+        """
+        from googleapiclient.http import MediaIoBaseUpload
+
         try:
+            drive_service = build_service('drive', 'v3', self.creds)
+            if uploads is not None:
+                # Usually cached from an earlier request, e.g. the tree load
+                user_id = self.get_profile()["id"]
+                digest = archive_hash(files_dict, zip_name)
+                previous = uploads.get(user_id, digest)
+                if previous is not None:
+                    if self._drive_file_exists(drive_service, previous["id"]):
+                        print(f"♻️ {zip_name} is unchanged, reusing Drive file {previous['id']}")
+                        uploads.record_hit(files_dict)
+                        return previous["link"], previous["id"]
+                    # Deleted or trashed since; upload it again
+                    uploads.record_stale(user_id, digest)
+
             # Create in-memory zip
             zip_buffer = io.BytesIO()
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for filename, filedata in files_dict.items():
-                    zip_file.writestr(filename, filedata)
+            with span("zip", "write"):
+                with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                    for filename, filedata in files_dict.items():
+                        zip_file.writestr(filename, filedata)
             zip_buffer.seek(0)
-            drive_service = build('drive', 'v3', credentials=self.creds)
             file_metadata = {'name': zip_name}
             media = MediaIoBaseUpload(zip_buffer, mimetype='application/zip', resumable=True)
-            file = drive_service.files().create(
+            file = self._execute(drive_service.files().create(
                 body=file_metadata,
                 media_body=media,
                 fields='id, webViewLink'
-            ).execute()
+            ), "files.create", "drive")
+            if uploads is not None:
+                uploads.put(user_id, digest, file['id'], file['webViewLink'], files_dict)
             return file['webViewLink'], file['id']
+        except CircuitOpen:
+            # Reported with its retry_after by the caller
+            raise
         except Exception as e:
             return None, f"Drive upload failed: {str(e)}"
+
+    def _drive_file_exists(self, drive_service, file_id: str) -> bool:
+        from googleapiclient.errors import HttpError
+
+        try:
+            file = self._execute(drive_service.files().get(fileId=file_id, fields='id, trashed'), "files.get", "drive")
+        except HttpError as e:
+            if e.resp.status == 404:
+                return False
+            raise
+        return not file.get('trashed', False)
             
     def submit_to_classroom(self, course_id: str, assignment_id: str, file_id: str) -> dict:
         try:
             # Step 1: Get student submission ID
-            submissions = self.service.courses().courseWork().studentSubmissions().list(
+            submissions = self._execute(self.service.courses().courseWork().studentSubmissions().list(
                 courseId=course_id,
                 courseWorkId=assignment_id,
-                userId='me'
-            ).execute()
+                userId='me',
+                fields=field_mask("submission_attachments")
+            ), "studentSubmissions.list")
 
             if 'studentSubmissions' not in submissions or not submissions['studentSubmissions']:
                 return {"success": False, "error": "No submission found for this user."}
@@ -93,75 +360,95 @@ class GoogleClassroomClient:
             submission_id = submission['id']
             print("Using submission_id:", submission_id)
 
+            existing_attachments = submission.get('assignmentSubmission', {}).get('attachments', [])
+            attached_ids = [att.get('driveFile', {}).get('id') for att in existing_attachments]
+            if submission['state'] == 'TURNED_IN' and attached_ids == [file_id]:
+                # A resubmission of unchanged files: the same Drive file is already turned in
+                print("Submission unchanged and already turned in.")
+                return {"success": True, "message": "Submission unchanged, already turned in."}
+
             # If already turned in, unsubmit first
             if submission['state'] == 'TURNED_IN':
                 print("Submission already turned in. Reclaiming (unsubmitting) first...")
-                self.service.courses().courseWork().studentSubmissions().reclaim(
+                self._execute(self.service.courses().courseWork().studentSubmissions().reclaim(
                     courseId=course_id,
                     courseWorkId=assignment_id,
                     id=submission_id
-                ).execute()
+                ), "studentSubmissions.reclaim")
                 print("Submission reclaimed.")
-                # Remove all existing attachments
-                existing_attachments = submission.get('assignmentSubmission', {}).get('attachments', [])
-                if existing_attachments:
+                # Remove all existing attachments, unless it is just this file
+                if existing_attachments and attached_ids != [file_id]:
                     remove_body = {
                         "removeAttachments": [
                             {k: v for k, v in att.items()} for att in existing_attachments
                         ]
                     }
                     print("Removing attachments:", remove_body)
-                    self.service.courses().courseWork().studentSubmissions().modifyAttachments(
+                    self._execute(self.service.courses().courseWork().studentSubmissions().modifyAttachments(
                         courseId=course_id,
                         courseWorkId=assignment_id,
                         id=submission_id,
                         body=remove_body
-                    ).execute()
+                    ), "studentSubmissions.modifyAttachments")
                     print("Existing attachments removed.")
+                    attached_ids = []
 
             # Step 2: Modify attachments (add the link)
-            modify_body = {
-    "addAttachments": [
-        {
-            "driveFile": {
-                "id": file_id  # just the ID of the file, no URL
-            }
-        }
-    ]
-}
-
-
-            result = self.service.courses().courseWork().studentSubmissions().modifyAttachments(
-                courseId=course_id,
-                courseWorkId=assignment_id,
-                id=submission_id,
-                body=modify_body
-            ).execute()
+            if file_id in attached_ids:
+                print("Drive file already attached.")
+            else:
+                modify_body = {
+                    "addAttachments": [
+                        {
+                            "driveFile": {
+                                "id": file_id  # just the ID of the file, no URL
+                            }
+                        }
+                    ]
+                }
+
+                result = self._execute(self.service.courses().courseWork().studentSubmissions().modifyAttachments(
+                    courseId=course_id,
+                    courseWorkId=assignment_id,
+                    id=submission_id,
+                    body=modify_body
+                ), "studentSubmissions.modifyAttachments")
 
-            print("modifyAttachments result:", result)
+                print("modifyAttachments result:", result)
 
             # Step 3: Turn in the submission
-            self.service.courses().courseWork().studentSubmissions().turnIn(
+            self._execute(self.service.courses().courseWork().studentSubmissions().turnIn(
                 courseId=course_id,
                 courseWorkId=assignment_id,
                 id=submission_id
-            ).execute()
+            ), "studentSubmissions.turnIn")
 
             print("✅ Submission turned in successfully.")
             return {"success": True, "message": "Submission turned in successfully."}
 
+        except CircuitOpen:
+            raise
         except Exception as e:
             print("Exception in submit_to_classroom:", repr(e))
             return {"success": False, "error": f"Classroom submission failed: {str(e)}"}
 
             
     def get_gcr_data(self):
+        records = list(self.iter_gcr_data())
+        if records and "error" in records[0]:
+            return records[0]
+        return records
+
+    def iter_gcr_data(self):
+        """
+        Yields one {"courseId", "courseName", "assignments"} record per course as
+        soon as its assignments are fetched, or a single {"error": ...} dict.
+        """
         course_result = self.get_courses()
 
         if "error" in course_result:
-            return course_result
-
-        final_data = []
+            yield course_result
+            return
 
         for course in course_result["courses"]:
             course_id = course["id"]
@@ -170,19 +457,20 @@ class GoogleClassroomClient:
             try:
                 assignments = self.get_assignments(course_id)
             except Exception as e:
+                if is_outage(e):
+                    # Skipping the course would pass a truncated tree off as complete
+                    raise
                 print(f"⚠️ Skipping course {course_name} ({course_id}) due to permission error: {e}")
                 continue  # Skip this course
             
             if not assignments:
                 continue
 
-            final_data.append({
+            yield {
                 "courseId": course_id,
                 "courseName": course_name,
                 "assignments": assignments
-            })
-
-        return final_data
+            }
 
 
     def get_assignments(self, course_id):
@@ -191,44 +479,19 @@ class GoogleClassroomClient:
             return []
 
         try:
-            response = self.service.courses().courseWork().list(courseId=course_id).execute()
-            coursework = response.get("courseWork", [])
             result = []
 
-            for work in coursework:
+            for work in self.iter_coursework(course_id):
                 course_work_id = work["id"]
                 
                 # Fetch student submission
-                submission_response = self.service.courses().courseWork().studentSubmissions().list(
-                    courseId=course_id,
-                    courseWorkId=course_work_id,
-                    userId="me"
-                ).execute()
-
-                submissions = submission_response.get("studentSubmissions", [])
-                submission = submissions[0] if submissions else None
-                
-                # Initialize grade info
-                grade_info = None
-                if submission and submission.get("state") == "RETURNED":
-                    grade_info = {
-                        "assignedGrade": submission.get("assignedGrade"),
-                        "draftGrade": submission.get("draftGrade"),
-                        "maxPoints": work.get("maxPoints")
-                    }
-                # print(grade_info)
-                result.append({
-                    "assignmentId": work.get("id", ""),
-                    "title": work.get("title", ""),
-                    "description": work.get("description", "No description given"),
-                    "dueDate": work.get("dueDate", {}),
-                    "dueTime": work.get("dueTime", {}),
-                    "submissionState": submission.get("state") if submission else "UNKNOWN",
-                    "gradeInfo": grade_info
-                })
+                submission = next(iter(self.iter_submissions(course_id, course_work_id)), None)
+                result.append(self.assignment_record(work, submission))
 
             return result
         except Exception as e:
+            if is_outage(e):
+                raise
             print(f"❌ Failed to fetch assignments for course {course_id}: {e}")
             
             return None
@@ -245,11 +508,11 @@ class GoogleClassroomClient:
             dict: The response from the API (student enrollment details).
         """
         try:
-            student = self.service.courses().students().create(
+            student = self._execute(self.service.courses().students().create(
                 courseId=course_id,
                 enrollmentCode=enrollment_code,
                 body={"userId": "me"}
-            ).execute()
+            ), "students.create")
 
             print(f"✅ Successfully joined course: {student['courseId']}")
             return {"message": "Successfully joined course"}
@@ -261,11 +524,21 @@ class GoogleClassroomClient:
 
 
 
+    def get_profile(self) -> dict:
+        """
+        Returns the signed-in user's profile, fetched once per client and
+        shared with later clients for the same user in this worker.
+        """
+        if self._profile is None:
+            self._profile = self._execute(self.service.userProfiles().get(userId="me", fields=field_mask("profile")), "userProfiles.get")
+            _remember_profile(self.creds, self._profile)
+        return self._profile
+
     def get_user_name(self):
         if not self.service:
             print("❌ Not logged in.")
             return None
-        profile = self.service.userProfiles().get(userId="me").execute()
+        profile = self.get_profile()
         # print("profile", profile)
 
         email = profile.get("emailAddress")
@@ -277,25 +550,19 @@ class GoogleClassroomClient:
 
     
 
-    def get_courses(self, limit=100):
+    def get_courses(self, page_size=100):
         if not self.service:
             print("❌ Not logged in.")
             return {"error": "Not logged in"}
 
-        results = self.service.courses().list(
-            pageSize=limit,
-            courseStates=["ACTIVE"]
-            ).execute()
-        # print("results", results)
-        courses = results.get('courses', [])
+        courses = list(self.iter_courses(page_size))
 
         if not courses:
             print('No courses found.')
             return {"error": "No courses found"}
         else:
             
-            profile = self.service.userProfiles().get(userId="me").execute()
-            current_user_id = profile["id"]
+            current_user_id = self.get_profile()["id"]
 
             courses = [course for course in courses if course.get("ownerId") != current_user_id]
 
@@ -1,15 +1,81 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from responses import ORJSONResponse
+from compression import CompressionMiddleware
+import compression
+import orjson
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+import asyncio
+import os
+import time
 import re
+from contextlib import asynccontextmanager
 from database import Database
 from file_based_hints import FileBasedHints
 from typing import Dict
+import google_classroom
 from google_classroom import GoogleClassroomClient, get_creds
 from git import GitHub
-from models import GenerateHintsRequest, AddApiKeyRequest, AddGithubRequest, DeleteGithubRequest, StartingUpRequest, GitPushRequest, JoinCourseRequest
+from single_flight import SingleFlight
+from admission import AdmissionController, AdmissionRejected
+import metrics
+from profiling import PROFILE_ID_HEADER, SPANS_ONLY_NOTE, Profiler
+from sessions import SessionManager
+from delta_sync import TreeSync
+from speculation import SpeculativeHints, code_hash
+from drive_uploads import DriveUploadCache
+import circuit_breaker
+from circuit_breaker import CircuitOpen
+from channel import Channel
+from starlette.concurrency import run_in_threadpool
+from models import GenerateHintsRequest, AddApiKeyRequest, AddGithubRequest, DeleteGithubRequest, StartingUpRequest, GitPushRequest, JoinCourseRequest, ProfilingToggleRequest, DeltaSyncRequest
 import base64
+import hashlib
 
-app = FastAPI()
+def warm_up():
+    """
+    Loads the heavy client libraries and discovery docs that are imported lazily,
+    so the first real request does not pay for them.
+    """
+    started = time.perf_counter()
+    google_classroom.warm_up()
+    FileBasedHints.warm_up()
+    from cryptography.fernet import Fernet  # noqa: F401
+    print(f"Warm-up done in {time.perf_counter() - started:.2f}s")
+
+
+async def refresh_sessions():
+    """
+    Refreshes session tokens ahead of their expiry, off the request path.
+    """
+    while True:
+        await asyncio.sleep(sessions.REFRESH_INTERVAL)
+        try:
+            refreshed = await run_in_threadpool(sessions.refresh_expiring)
+            if refreshed:
+                print(f"Refreshed {refreshed} session token(s)")
+        except Exception as e:
+            print(f"⚠️ Session refresh failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs before uvicorn starts accepting connections; skip it for quick --reload cycles
+    if not os.environ.get("PYBUDDY_SKIP_WARMUP"):
+        await run_in_threadpool(warm_up)
+    refresher = asyncio.create_task(refresh_sessions())
+    speculators = [asyncio.create_task(speculation.run()) for _ in range(SpeculativeHints.WORKERS)]
+    yield
+    refresher.cancel()
+    for task in speculators:
+        task.cancel()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Compress large responses (the course tree) for clients that accept gzip or brotli
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
 
 # Add CORS middleware
 app.add_middleware(
@@ -21,6 +87,102 @@ app.add_middleware(
 )
 
 hinter = FileBasedHints()
+single_flight = SingleFlight()
+admission = AdmissionController()
+profiler = Profiler()
+sessions = SessionManager()
+tree_sync = TreeSync()
+speculation = SpeculativeHints(admission)
+drive_uploads = DriveUploadCache()
+
+metrics.expose_stats("pybuddy_hints", hinter.get_parse_stats)
+metrics.expose_stats("pybuddy_single_flight", single_flight.get_stats)
+metrics.expose_stats("pybuddy_admission", admission.get_stats)
+metrics.expose_stats("pybuddy_delta_sync", tree_sync.get_stats)
+metrics.expose_stats("pybuddy_compression", compression.get_stats)
+metrics.expose_stats("pybuddy_speculation", speculation.get_stats)
+metrics.expose_stats("pybuddy_drive_uploads", drive_uploads.get_stats)
+metrics.expose_stats("pybuddy_circuit", circuit_breaker.get_stats)
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    if not profiler.should_profile(request.headers):
+        return await call_next(request)
+
+    profile = profiler.start(request.url.path)
+    try:
+        response = await call_next(request)
+    except BaseException:
+        await asyncio.shield(run_in_threadpool(profiler.finish, profile))
+        raise
+    response.headers[PROFILE_ID_HEADER] = profile.request_id
+    body = response.body_iterator
+
+    async def profiled_body():
+        # A streamed endpoint does its work while the body is sent, so finish after it
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            await asyncio.shield(run_in_threadpool(profiler.finish, profile))
+
+    response.body_iterator = profiled_body()
+    return response
+
+
+def require_admin(token: str):
+    admin_token = os.environ.get("PYBUDDY_ADMIN_TOKEN")
+    if not admin_token or token != admin_token:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by the route template once routing has matched, not the raw path
+        matched = request.scope.get("route")
+        label = matched.path if matched else "unmatched"
+        metrics.REQUEST_LATENCY.labels(label, request.method).observe(time.perf_counter() - started)
+        if status >= 500:
+            metrics.REQUEST_ERRORS.labels(label, request.method).inc()
+        metrics.REQUESTS_IN_FLIGHT.dec()
+
+
+def classroom_client(request) -> GoogleClassroomClient:
+    """
+    Builds the Classroom client from the request's session id, falling back to
+    the raw token JSON for older extensions.
+    """
+    if request.session_id:
+        creds = sessions.get_credentials(request.session_id)
+        if creds is None:
+            raise HTTPException(status_code=401, detail="Session expired, please sign in again")
+        return GoogleClassroomClient(creds=creds)
+    return GoogleClassroomClient(info=request.info)
+
+
+def tree_owner(request) -> str:
+    # The session the last known tree is kept for; the raw token is hashed, never stored
+    return request.session_id or hashlib.sha256((request.info or "").encode()).hexdigest()
+
+
+def stale_gcr_data(request, error: CircuitOpen):
+    """
+    Serves the last tree loaded for this session, marked stale, while the
+    Classroom breaker is open.
+    """
+    tree = tree_sync.load_last(tree_owner(request))
+    if tree is None:
+        return {"error": str(error), "retry_after": error.retry_after}
+    return ORJSONResponse({"gcr_data": tree, "stale": True, "retry_after": error.retry_after})
 
 
 def extract_links(text):
@@ -30,36 +192,55 @@ def extract_links(text):
 
 @app.post("/submit/github")
 async def github_submit(req: GitPushRequest):
+    gcr_client = await run_in_threadpool(classroom_client, req)
+    return await run_in_threadpool(submit_assignment, req, gcr_client)
+
+
+def submit_assignment(req: GitPushRequest, gcr_client: GoogleClassroomClient, progress=None) -> dict:
+    """
+    Pushes the code to a new GitHub repo, uploads it to Drive and turns it in
+    on Classroom, reporting each stage to `progress` if given.
+    """
+    report = progress or (lambda stage, **data: None)
+    github = None
     try:
+        circuit_breaker.check("github", "drive", "classroom")
         db = Database()
         github_info = db.get_github(req.username)
         github_name = github_info['github_name']
         github_token = github_info['github_token']
 
         github=GitHub(github_name, github_token)
+        report("creating_repo")
         success, error = github.create_repo(req.repo_name)
         if not success:
             print("Error in creating repo:", error)
             return {"error": error}
 
-        for filename, code in req.code_files.items():
+        for index, (filename, code) in enumerate(req.code_files.items()):
+            report("pushing_file", file=filename, index=index, total=len(req.code_files))
             ok, result = github.push_file(req.repo_name, filename, code, "Initial commit")
             if not ok:
                 return {"error": f"Failed to push {filename}: {result}"}
         
         github_link =f"https://github.com/{github_name}/{req.repo_name}"
-        gcr_client = GoogleClassroomClient(info=req.info)
         print("Uploading to drive")
-        drive_link, file_id = gcr_client.upload_to_drive(req.code_files, req.repo_name)
+        report("uploading_to_drive")
+        drive_link, file_id = gcr_client.upload_to_drive(req.code_files, req.repo_name, uploads=drive_uploads)
         print("Uploaded to drive:", drive_link, file_id)
         if drive_link is None:
             return {"success": False, "error": file_id}
+        report("turning_in")
         data = gcr_client.submit_to_classroom(req.course_id, req.assignment_id, file_id)
         if data["success"] == False:
             github.delete_repo(req.repo_name)
         return data
+    except CircuitOpen as e:
+        # A leftover repo is replaced by the next attempt's create_repo
+        return {"error": str(e), "retry_after": e.retry_after}
     except Exception as e:
-        github.delete_repo(req.repo_name)
+        if github:
+            github.delete_repo(req.repo_name)
         return {"error": str(e)}
 
 @app.post("/add_api_key")
@@ -76,9 +257,9 @@ async def join_course(request: JoinCourseRequest):
     # If course_id is not all digits, convert to base64
     if not course_id.isdigit():
         course_id = base64.b64decode(course_id).decode("utf-8")
-    gcr = GoogleClassroomClient(info=request.info)
+    gcr = await run_in_threadpool(classroom_client, request)
     print("course_id changed", course_id)
-    return gcr.join_course_as_student(course_id, request.enrollment_code)
+    return await run_in_threadpool(gcr.join_course_as_student, course_id, request.enrollment_code)
 
 @app.post("/add_github")
 async def add_github(request: AddGithubRequest):
@@ -94,30 +275,162 @@ async def delete_github(request: DeleteGithubRequest):
     db.delete_github(request.username)
     return {"message": "GitHub credentials deleted successfully"}
 
+def full_gcr_data(gcr: GoogleClassroomClient) -> dict:
+    """
+    Collects tree_sync.iter_full into {"gcr_data": [...], "cursor": ...}, or {"error": ...}.
+    """
+    tree = []
+    for record in tree_sync.iter_full(gcr):
+        if "error" in record:
+            return record
+        if "cursor" in record:
+            return {"gcr_data": tree, "cursor": record["cursor"]}
+        tree.append(record)
+
+
 @app.post("/get_gcr_data")
 async def get_gcr_data(request: StartingUpRequest):
-    # print(request.info)
-    gcr = GoogleClassroomClient(info=request.info)
-    gcr_result = gcr.get_gcr_data()
+    """
+    Returns the whole course tree, with a cursor for /get_gcr_data/delta.
+    Built like the stream from a few calls per course, not one per assignment.
+    """
+    gcr = await run_in_threadpool(classroom_client, request)
+
+    async def fetch():
+        return await run_in_threadpool(full_gcr_data, gcr)
+
+    payload = {"session_id": request.session_id} if request.session_id else {"info": request.info}
+    try:
+        await run_in_threadpool(circuit_breaker.check, "classroom")
+        gcr_result = await single_flight.run("get_gcr_data", "", payload, fetch)
+    except Exception as e:
+        outage = circuit_breaker.outage(e, "classroom")
+        if outage is None:
+            raise
+        return await run_in_threadpool(stale_gcr_data, request, outage)
     
-    if isinstance(gcr_result, dict) and "error" in gcr_result:
+    if "error" in gcr_result:
         print(gcr_result["error"])
         return {"error": gcr_result["error"]}
     
-    return {"gcr_data": gcr_result}
+    await run_in_threadpool(tree_sync.save_last, tree_owner(request), gcr_result["gcr_data"])
+    return ORJSONResponse(gcr_result)
+
+
+@app.post("/get_gcr_data/stream")
+async def stream_gcr_data(request: StartingUpRequest):
+    """
+    Streams the course tree as NDJSON so the extension can render each course as
+    soon as it is fetched: one {"course": ...} line per course, then
+    {"done": true, "cursor": ...} with a cursor for /get_gcr_data/delta.
+    A failure, even after some courses, ends the stream with an {"error": ...} line. While Classroom is
+    unavailable the last tree loaded is streamed instead, ending with
+    {"done": true, "stale": true, "cursor": null, "retry_after": ...}.
+    """
+    gcr = await run_in_threadpool(classroom_client, request)
+
+    def stale(error: CircuitOpen):
+        tree = tree_sync.load_last(tree_owner(request))
+        if tree is None:
+            yield orjson.dumps({"error": str(error), "retry_after": error.retry_after}) + b"\n"
+            return
+        for record in tree:
+            yield orjson.dumps({"course": record}) + b"\n"
+        yield orjson.dumps({"done": True, "courses": len(tree), "cursor": None, "stale": True, "retry_after": error.retry_after}) + b"\n"
+
+    def records():
+        tree = []
+        try:
+            circuit_breaker.check("classroom")
+            for record in tree_sync.iter_full(gcr):
+                if "error" in record:
+                    print(record["error"])
+                    yield orjson.dumps({"error": record["error"]}) + b"\n"
+                    return
+                if "cursor" in record:
+                    tree_sync.save_last(tree_owner(request), tree)
+                    yield orjson.dumps({"done": True, "courses": len(tree), "cursor": record["cursor"]}) + b"\n"
+                    return
+                tree.append(record)
+                yield orjson.dumps({"course": record}) + b"\n"
+        except Exception as e:
+            outage = circuit_breaker.outage(e, "classroom")
+            if outage is None:
+                # The 200 and the first lines are already sent, so the error has to go in the stream
+                print(f"❌ Streaming the classroom tree failed: {e}")
+                metrics.REQUEST_ERRORS.labels("/get_gcr_data/stream", "POST").inc()
+                yield orjson.dumps({"error": str(e)}) + b"\n"
+                return
+            if tree:
+                # Some courses are already out; the client keeps them and sees the error
+                yield orjson.dumps({"error": str(outage), "retry_after": outage.retry_after}) + b"\n"
+            else:
+                yield from stale(outage)
+
+    # Starlette iterates a sync generator in the threadpool, one course at a time
+    return StreamingResponse(records(), media_type="application/x-ndjson")
+
+
+@app.post("/get_gcr_data/delta")
+async def get_gcr_data_delta(request: DeltaSyncRequest):
+    """
+    Returns only the courses and assignments that changed since `cursor`, plus
+    a new cursor. An unknown or expired cursor gets the full tree with "full": true.
+    """
+    result = await gcr_delta(request)
+    if "error" in result:
+        return result
+    return ORJSONResponse(result)
+
+
+async def gcr_delta(request: DeltaSyncRequest) -> dict:
+    gcr = await run_in_threadpool(classroom_client, request)
+
+    async def fetch():
+        return await run_in_threadpool(tree_sync.sync, gcr, request.cursor)
+
+    payload = {"session_id": request.session_id} if request.session_id else {"info": request.info}
+    try:
+        await run_in_threadpool(circuit_breaker.check, "classroom")
+        result = await single_flight.run("get_gcr_data_delta", "", {**payload, "cursor": request.cursor}, fetch)
+    except Exception as e:
+        outage = circuit_breaker.outage(e, "classroom")
+        if outage is None:
+            raise
+        # The client keeps the tree it has; nothing newer can be fetched
+        return {"error": str(outage), "retry_after": outage.retry_after}
+
+    if "error" in result:
+        print(result["error"])
+        return {"error": result["error"]}
+    return result
+
+
+@app.post("/session")
+async def create_session(request: StartingUpRequest):
+    if not request.info:
+        raise HTTPException(status_code=422, detail="info is required")
+    session_id = await run_in_threadpool(sessions.create, request.info)
+    if session_id is None:
+        return {"error": "Invalid token"}
+    return {"session_id": session_id}
 
 
 @app.post("/logout")
 async def logout(request: StartingUpRequest):
-    gcr = GoogleClassroomClient(info=request.info)
-    gcr.logout()
+    if request.session_id:
+        await run_in_threadpool(sessions.delete, request.session_id)
+    else:
+        gcr = await run_in_threadpool(GoogleClassroomClient, info=request.info)
+        gcr.logout()
     return {"message": "Logged out successfully"}
 
 
 @app.post("/get_user_name")
 async def get_user_name(request: StartingUpRequest):
-    gcr = GoogleClassroomClient(info=request.info)
-    return {"user_name": gcr.get_user_name()}
+    gcr = await run_in_threadpool(classroom_client, request)
+    # A Google call; ws_get_user_name goes through here as well
+    return {"user_name": await run_in_threadpool(gcr.get_user_name)}
 
 @app.post("/get_credentials")
 async def get_credentials():
@@ -134,19 +447,252 @@ def transform_concepts_to_array(hint: dict) -> dict:
 
 @app.post("/generate_hints")
 async def generate_hints(request: GenerateHintsRequest):
+    return await hints_for(request)
+
+
+async def hints_for(request: GenerateHintsRequest, on_token=None) -> dict:
     print("---------------------------------------")
     print("request", request)
     code_dict = request.code_dict
     question_data = request.question_data
     db = Database()
-    api_key = db.get_api(request.username)
-    result = hinter.get_general_hints(code_dict, question_data, api_key, request.topic)
+    api_key = await run_in_threadpool(db.get_api, request.username)
+
+    # A hint generated speculatively when this code was saved answers at once
+    result = await speculation.take(request.username, code_hash(code_dict, question_data, request.topic))
+    if result is None:
+        try:
+            # Fail fast rather than queue for a model that is not answering
+            await run_in_threadpool(circuit_breaker.check, "gemini")
+            result = await generate_hint(request, api_key, on_token)
+        except (AdmissionRejected, CircuitOpen) as e:
+            return {"error": str(e), "retry_after": e.retry_after}
     
     if result.get("error"):
-        return {"error": result["error"]}
+        return {key: result[key] for key in ("error", "retry_after") if key in result}
     
     result1 = transform_concepts_to_array(result)
     result1['hint'] = transform_concepts_to_array(result1['hint'])
     # print("---------------------------------------")
     # print("result1", result1)
-    return result1
\ No newline at end of file
+    return result1
+
+async def generate_hint(request: GenerateHintsRequest, api_key: str, on_token=None) -> dict:
+    async def generate():
+        async with admission.admit(request.username, api_key):
+            return await run_in_threadpool(hinter.get_general_hints, request.code_dict, request.question_data, api_key, request.topic, on_token)
+
+    payload = {"code_dict": request.code_dict, "question_data": request.question_data, "topic": request.topic}
+    return await single_flight.run("generate_hints", request.username, payload, generate)
+
+
+@app.post("/hints/speculate")
+async def speculate_hints(request: GenerateHintsRequest):
+    """
+    Queues a low-priority hint for code the student just saved, so a 💡 click
+    on the same code returns it at once. Returns the code_hash and whether the
+    hint was queued, is already ready or pending, or was refused (over_quota, busy).
+    """
+    db = Database()
+    api_key = await run_in_threadpool(db.get_api, request.username)
+    if not api_key:
+        return {"error": "No API key"}
+    digest = code_hash(request.code_dict, request.question_data, request.topic)
+    return await speculation.submit(request.username, api_key, digest, lambda: generate_hint(request, api_key))
+
+
+@app.get("/hint_stats")
+async def hint_stats():
+    return hinter.get_parse_stats()
+
+@app.get("/single_flight_stats")
+async def single_flight_stats():
+    return single_flight.get_stats()
+
+@app.get("/admission_stats")
+async def admission_stats():
+    return admission.get_stats()
+
+@app.get("/delta_sync_stats")
+async def delta_sync_stats():
+    return tree_sync.get_stats()
+
+@app.get("/compression_stats")
+async def compression_stats():
+    return compression.get_stats()
+
+@app.get("/speculation_stats")
+async def speculation_stats():
+    return speculation.get_stats()
+
+@app.get("/drive_upload_stats")
+async def drive_upload_stats():
+    return drive_uploads.get_stats()
+
+@app.get("/circuit_stats")
+async def circuit_stats():
+    return await run_in_threadpool(circuit_breaker.get_stats)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Some collectors (e.g. the circuit breakers) read Redis
+    return Response(await run_in_threadpool(generate_latest), media_type=CONTENT_TYPE_LATEST)
+
+@app.post("/admin/profiling")
+async def toggle_profiling(request: ProfilingToggleRequest, x_pybuddy_admin_token: str = Header(default="")):
+    require_admin(x_pybuddy_admin_token)
+    await run_in_threadpool(profiler.set_toggle, request.enabled, request.duration)
+    return {"message": f"Profiling {'enabled' if request.enabled else 'disabled'}", "note": SPANS_ONLY_NOTE}
+
+@app.get("/admin/profiles/{request_id}")
+async def get_profile(request_id: str, x_pybuddy_admin_token: str = Header(default="")):
+    require_admin(x_pybuddy_admin_token)
+    profile = await run_in_threadpool(profiler.get, request_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {**profile, "note": SPANS_ONLY_NOTE}
+
+
+# How often a connected extension's tree is checked for changes. Classroom can
+# only push through Cloud Pub/Sub, so the backend polls on the socket's behalf:
+# every TREE_WATCH_INTERVAL seconds after a change, doubling up to
+# TREE_WATCH_MAX_INTERVAL while nothing changes or Classroom fails.
+TREE_WATCH_INTERVAL = 5 * 60
+TREE_WATCH_MAX_INTERVAL = 30 * 60
+
+
+async def ws_get_gcr_data(channel: Channel, request_id, params: dict) -> dict:
+    # Each course goes out as progress as soon as it is fetched, like /get_gcr_data/stream
+    request = StartingUpRequest(**params)
+    gcr = await run_in_threadpool(classroom_client, request)
+
+    def load():
+        tree = []
+        try:
+            circuit_breaker.check("classroom")
+            for record in tree_sync.iter_full(gcr):
+                if "error" in record:
+                    return record
+                if "cursor" in record:
+                    tree_sync.save_last(tree_owner(request), tree)
+                    return {**record, "courses": len(tree)}
+                tree.append(record)
+                channel.progress(request_id, {"course": record})
+        except Exception as e:
+            outage = circuit_breaker.outage(e, "classroom")
+            if outage is None:
+                raise
+            stale = None if tree else tree_sync.load_last(tree_owner(request))
+            if stale is None:
+                return {"error": str(outage), "retry_after": outage.retry_after}
+            for record in stale:
+                channel.progress(request_id, {"course": record})
+            return {"cursor": None, "courses": len(stale), "stale": True, "retry_after": outage.retry_after}
+
+    result = await run_in_threadpool(load)
+    if "error" in result:
+        print(result["error"])
+        return {key: result[key] for key in ("error", "retry_after") if key in result}
+    channel.state["tree_cursor"] = result["cursor"]
+    return result
+
+
+async def ws_get_gcr_data_delta(channel: Channel, request_id, params: dict) -> dict:
+    result = await gcr_delta(DeltaSyncRequest(**params))
+    if "cursor" in result:
+        channel.state["tree_cursor"] = result["cursor"]
+    return result
+
+
+async def ws_generate_hints(channel: Channel, request_id, params: dict) -> dict:
+    # The hint text is forwarded token by token while Gemini writes it
+    return await hints_for(
+        GenerateHintsRequest(**params),
+        # None means the streamed text is void and a regenerated hint follows
+        on_token=lambda text: channel.progress(request_id, {"token": text} if text is not None else {"reset": True}),
+    )
+
+
+async def ws_speculate_hints(channel: Channel, request_id, params: dict) -> dict:
+    return await speculate_hints(GenerateHintsRequest(**params))
+
+
+async def ws_submit(channel: Channel, request_id, params: dict) -> dict:
+    request = GitPushRequest(**params)
+    gcr = await run_in_threadpool(classroom_client, request)
+    return await run_in_threadpool(
+        submit_assignment, request, gcr,
+        lambda stage, **data: channel.progress(request_id, {"stage": stage, **data}),
+    )
+
+
+async def ws_join_course(channel: Channel, request_id, params: dict) -> dict:
+    return await join_course(JoinCourseRequest(**params))
+
+
+async def ws_get_user_name(channel: Channel, request_id, params: dict) -> dict:
+    return await get_user_name(StartingUpRequest(**params))
+
+
+async def ws_watch_tree(channel: Channel, request_id, params: dict) -> dict:
+    """
+    Starts pushing "tree_changes" events with the delta since `cursor` whenever
+    the user's classroom tree changes, for as long as the socket is open.
+    Opt-in per socket; checks back off while the tree stays the same.
+    """
+    request = DeltaSyncRequest(**params)
+    # Fails early with 401 if the session is gone
+    await run_in_threadpool(classroom_client, request)
+    channel.state["tree_cursor"] = request.cursor
+    watcher = channel.state.get("tree_watcher")
+    if watcher is not None:
+        watcher.cancel()
+    channel.state["tree_watcher"] = channel.start_background(watch_tree(channel, request))
+    return {"watching": True, "interval": TREE_WATCH_INTERVAL}
+
+
+async def watch_tree(channel: Channel, request: DeltaSyncRequest) -> None:
+    interval = TREE_WATCH_INTERVAL
+    while True:
+        await asyncio.sleep(interval)
+        # Back off unless this check finds a change
+        interval = min(interval * 2, TREE_WATCH_MAX_INTERVAL)
+        cursor = channel.state.get("tree_cursor")
+        try:
+            result = await gcr_delta(request.model_copy(update={"cursor": cursor}))
+        except HTTPException as e:
+            channel.push("session_expired", {"error": e.detail})
+            return
+        except Exception as e:
+            print(f"⚠️ Tree watch failed: {e}")
+            continue
+        if "error" in result:
+            continue
+        # A request on the channel may have moved the cursor while this one ran
+        if channel.state.get("tree_cursor") != cursor:
+            continue
+        channel.state["tree_cursor"] = result["cursor"]
+        if result.get("full") or result["changes"]:
+            channel.push("tree_changes", result)
+            interval = TREE_WATCH_INTERVAL
+
+
+ws_handlers = {
+    "get_gcr_data": ws_get_gcr_data,
+    "get_gcr_data_delta": ws_get_gcr_data_delta,
+    "generate_hints": ws_generate_hints,
+    "speculate_hints": ws_speculate_hints,
+    "submit": ws_submit,
+    "join_course": ws_join_course,
+    "get_user_name": ws_get_user_name,
+    "watch_tree": ws_watch_tree,
+}
+
+
+@app.websocket("/ws")
+async def websocket_channel(websocket: WebSocket):
+    """
+    One long-lived, multiplexed connection for the extension: requests carry
+    the same fields as the HTTP bodies, see channel.Channel for the framing.
+    """
+    await Channel(websocket, ws_handlers, profiler).serve()
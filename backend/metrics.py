@@ -0,0 +1,78 @@
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from profiling import span
+
+REQUEST_LATENCY = Histogram(
+    "pybuddy_request_latency_seconds",
+    "Latency of backend requests per route",
+    ["route", "method"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "pybuddy_requests_in_flight",
+    "Backend requests currently being handled",
+)
+REQUEST_ERRORS = Counter(
+    "pybuddy_request_errors_total",
+    "Backend requests that failed with a server error",
+    ["route", "method"],
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "pybuddy_websocket_connections",
+    "Open WebSocket channels to the extension",
+)
+
+UPSTREAM_LATENCY = Histogram(
+    "pybuddy_upstream_latency_seconds",
+    "Latency of outbound calls per dependency and operation",
+    ["dependency", "operation"],
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "pybuddy_upstream_in_flight",
+    "Outbound calls currently waiting on a dependency",
+    ["dependency"],
+)
+UPSTREAM_ERRORS = Counter(
+    "pybuddy_upstream_errors_total",
+    "Outbound calls that raised an error",
+    ["dependency", "operation"],
+)
+
+
+@contextmanager
+def track(dependency: str, operation: str):
+    """
+    Times an outbound call, e.g. `with track("redis", "get"): ...`.
+    It is also recorded as a span when the request is being profiled.
+    """
+    UPSTREAM_IN_FLIGHT.labels(dependency).inc()
+    started = time.perf_counter()
+    try:
+        with span(dependency, operation):
+            yield
+    except Exception:
+        UPSTREAM_ERRORS.labels(dependency, operation).inc()
+        raise
+    finally:
+        UPSTREAM_LATENCY.labels(dependency, operation).observe(time.perf_counter() - started)
+        UPSTREAM_IN_FLIGHT.labels(dependency).dec()
+
+
+class StatsCollector:
+    """
+    Exposes the numeric values of a `get_stats()` dict as gauges.
+    """
+
+    def __init__(self, prefix: str, get_stats) -> None:
+        self.prefix = prefix
+        self.get_stats = get_stats
+
+    def collect(self):
+        for name, value in self.get_stats().items():
+            if isinstance(value, (int, float)):
+                yield GaugeMetricFamily(f"{self.prefix}_{name}", f"{self.prefix} {name}", value=value)
+
+
+def expose_stats(prefix: str, get_stats) -> None:
+    REGISTRY.register(StatsCollector(prefix, get_stats))
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 from typing import Dict, Optional
 
 class GenerateHintsRequest(BaseModel):
@@ -19,18 +19,35 @@ class AddGithubRequest(BaseModel):
 class DeleteGithubRequest(BaseModel):
     username: str
 
-class StartingUpRequest(BaseModel):
-    info: str
+class SessionAuth(BaseModel):
+    # A session id from POST /session, or the raw token JSON from older extensions
+    info: Optional[str] = None
+    session_id: Optional[str] = None
 
-class GitPushRequest(BaseModel):
+    @model_validator(mode="after")
+    def check_one_credential(self):
+        if bool(self.info) == bool(self.session_id):
+            raise ValueError("Send exactly one of info and session_id")
+        return self
+
+class StartingUpRequest(SessionAuth):
+    pass
+
+class DeltaSyncRequest(StartingUpRequest):
+    cursor: Optional[str] = None
+
+class GitPushRequest(SessionAuth):
     username: str
     repo_name: str
     course_id: str
     assignment_id: str
     code_files: Dict[str, str]
-    info: str
 
-class JoinCourseRequest(BaseModel):
+class JoinCourseRequest(SessionAuth):
     course_id: str = None
     enrollment_code: str = None
-    info: str
+
+
+class ProfilingToggleRequest(BaseModel):
+    enabled: bool
+    duration: int = 600
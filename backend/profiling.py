@@ -0,0 +1,220 @@
+"""
+Opt-in per-request profiling: a span breakdown of the time spent in Google
+calls, Redis, the LLM, zipping, etc., and sampled stacks of the threads
+running those spans.
+
+Only threads inside one of the request's span()s are sampled. CPU a handler
+spends outside every span, on the event loop or in a threadpool, shows up in
+the profile's duration but not in its spans or stacks.
+"""
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from redis import Redis
+
+PROFILE_HEADER = "X-PyBuddy-Profile"
+PROFILE_ID_HEADER = "X-PyBuddy-Profile-Id"
+ADMIN_TOKEN_HEADER = "X-PyBuddy-Admin-Token"
+PROFILE_TTL = 24 * 60 * 60
+TOGGLE_KEY = "profiling:enabled"
+TOGGLE_REFRESH = 5.0
+# Returned with the admin endpoints' responses so nobody reads a missing span as free
+SPANS_ONLY_NOTE = "Only threads inside a span are sampled; handler CPU outside spans is in duration_ms but not in spans or stacks."
+
+current_profile: ContextVar["Profile | None"] = ContextVar("current_profile", default=None)
+
+
+class Profile:
+    """
+    Samples the stacks of the threads serving one request and records a span
+    breakdown of the time spent in Google calls, Redis, the LLM, zipping, etc.
+
+    A thread is only sampled while it runs one of the request's spans, so
+    threadpool threads that go on to serve other requests, and the event loop
+    thread the requests share, do not put other requests' stacks in the profile.
+    """
+
+    SAMPLE_INTERVAL = 0.005
+    MAX_STACK_DEPTH = 64
+    TOP_STACKS = 50
+    # The sampler stops by itself after this long, in case stop() is never called
+    MAX_DURATION = 300
+
+    def __init__(self, route: str) -> None:
+        self.request_id = uuid.uuid4().hex
+        self.route = route
+        self.started = time.time()
+        self.duration = 0.0
+        self.spans = []
+        # thread id -> how many of the request's spans it is inside
+        self.threads = {}
+        self._threads_lock = threading.Lock()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def start(self) -> None:
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self.duration = time.time() - self.started
+        self._stop.set()
+        self._sampler.join()
+
+    def join_thread(self) -> None:
+        thread_id = threading.get_ident()
+        with self._threads_lock:
+            self.threads[thread_id] = self.threads.get(thread_id, 0) + 1
+
+    def leave_thread(self) -> None:
+        thread_id = threading.get_ident()
+        with self._threads_lock:
+            if self.threads.get(thread_id, 0) <= 1:
+                self.threads.pop(thread_id, None)
+            else:
+                self.threads[thread_id] -= 1
+
+    def add_span(self, category: str, name: str, started: float, elapsed: float, error: bool) -> None:
+        self.spans.append({
+            "category": category,
+            "name": name,
+            "start_ms": round((started - self.started) * 1000, 2),
+            "duration_ms": round(elapsed * 1000, 2),
+            "error": error,
+        })
+
+    def _sample(self) -> None:
+        sampler_id = threading.get_ident()
+        deadline = time.monotonic() + self.MAX_DURATION
+        while not self._stop.wait(self.SAMPLE_INTERVAL) and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            with self._threads_lock:
+                threads = list(self.threads)
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                if frame is not None and thread_id != sampler_id:
+                    self.stacks[self._collapse(frame)] += 1
+                    self.samples += 1
+
+    def _collapse(self, frame) -> str:
+        names = []
+        while frame is not None and len(names) < self.MAX_STACK_DEPTH:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def to_dict(self) -> dict:
+        totals = {}
+        for span in self.spans:
+            totals[span["category"]] = round(totals.get(span["category"], 0.0) + span["duration_ms"], 2)
+        return {
+            "request_id": self.request_id,
+            "route": self.route,
+            "started": self.started,
+            "duration_ms": round(self.duration * 1000, 2),
+            "span_totals_ms": totals,
+            "spans": self.spans,
+            "samples": self.samples,
+            "sample_interval_ms": self.SAMPLE_INTERVAL * 1000,
+            # Collapsed stacks, loadable by flamegraph tools
+            "stacks": dict(self.stacks.most_common(self.TOP_STACKS)),
+        }
+
+
+@contextmanager
+def span(category: str, name: str):
+    """
+    Records a span on the active profile; a no-op when the request is not being profiled.
+    """
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    profile.join_thread()
+    started = time.time()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        profile.leave_thread()
+        profile.add_span(category, name, started, time.time() - started, error)
+
+
+class Profiler:
+    """
+    Decides which requests get profiled and stores their profiles in Redis.
+    """
+
+    def __init__(self, redis: Redis = None) -> None:
+        self.redis = redis or Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+        self._toggle = False
+        self._toggle_checked = 0.0
+        self._refreshing = threading.Lock()
+
+    def should_profile(self, headers) -> bool:
+        """
+        Returns whether to profile a request. Called on the event loop, so it
+        never waits on Redis: the cached toggle is answered and, when it is
+        older than TOGGLE_REFRESH, re-read in a background thread.
+        """
+        if headers.get(PROFILE_HEADER):
+            # Each profile costs a sampler thread and a stored record, so only admins can ask for one
+            return self.is_admin(headers.get(ADMIN_TOKEN_HEADER, ""))
+        # The admin toggle lives in Redis so it applies to every worker; poll it sparingly
+        now = time.monotonic()
+        if now - self._toggle_checked > TOGGLE_REFRESH and self._refreshing.acquire(blocking=False):
+            self._toggle_checked = now
+            threading.Thread(target=self._refresh_toggle, daemon=True).start()
+        return self._toggle
+
+    def _refresh_toggle(self) -> None:
+        try:
+            self._toggle = bool(self.redis.exists(TOGGLE_KEY))
+        except Exception as e:
+            print(f"⚠️ Could not read the profiling toggle: {e}")
+            self._toggle = False
+        finally:
+            self._refreshing.release()
+
+    @staticmethod
+    def is_admin(token: str) -> bool:
+        admin_token = os.environ.get("PYBUDDY_ADMIN_TOKEN")
+        return bool(admin_token and token) and hmac.compare_digest(token, admin_token)
+
+    def set_toggle(self, enabled: bool, duration: int) -> None:
+        if enabled:
+            self.redis.set(TOGGLE_KEY, 1, ex=duration)
+        else:
+            self.redis.delete(TOGGLE_KEY)
+        self._toggle = enabled
+        self._toggle_checked = time.monotonic()
+
+    def start(self, route: str) -> Profile:
+        profile = Profile(route)
+        current_profile.set(profile)
+        profile.start()
+        return profile
+
+    def finish(self, profile: Profile) -> None:
+        profile.stop()
+        try:
+            self.redis.set(f"profile:{profile.request_id}", json.dumps(profile.to_dict()), ex=PROFILE_TTL)
+        except Exception as e:
+            print(f"⚠️ Could not store profile {profile.request_id}: {e}")
+
+    def get(self, request_id: str) -> dict | None:
+        data = self.redis.get(f"profile:{request_id}")
+        return json.loads(data) if data else None
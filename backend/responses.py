@@ -0,0 +1,16 @@
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson, several times faster than the standard
+    library on the large course trees.
+
+    Returning one directly from an endpoint also skips FastAPI's
+    jsonable_encoder pass, which is worthwhile for payloads that are already
+    plain JSON types, such as data straight from the Google APIs.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
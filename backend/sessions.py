@@ -0,0 +1,142 @@
+import json
+import secrets
+import time
+from datetime import timezone
+from database import Database
+from google_classroom import SCOPES
+from metrics import track
+
+
+class SessionManager:
+    """
+    Keeps users' Google OAuth credentials server-side behind an opaque session id.
+
+    The extension exchanges its token JSON once for a session id. Credentials are
+    stored encrypted in Redis, cached per worker, and refreshed in the background
+    before they expire so no user request waits on a token refresh.
+    """
+
+    SESSION_TTL = 14 * 24 * 60 * 60
+    REFRESH_MARGIN = 10 * 60
+    REFRESH_INTERVAL = 60
+    CACHE_TTL = 60
+    LOCK_TTL = 60
+
+    def __init__(self) -> None:
+        """
+        Initializes the SessionManager.
+        """
+        self._db = None
+        # session_id -> (Credentials, monotonic time the entry stops being trusted)
+        self.cache = {}
+
+    @property
+    def db(self) -> Database:
+        if self._db is None:
+            self._db = Database()
+        return self._db
+
+    def create(self, info: str) -> str | None:
+        """
+        Exchanges the token JSON for a session id.
+
+        Args:
+            info (str): The OAuth token JSON sent by the extension
+
+        Returns:
+            str | None: The new session id, or None if the token is invalid
+        """
+        from google.auth.exceptions import RefreshError
+        from google.oauth2.credentials import Credentials
+
+        try:
+            creds = Credentials.from_authorized_user_info(json.loads(info), SCOPES)
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"❌ Invalid token format: {e}")
+            return None
+
+        if not creds.valid and creds.refresh_token:
+            # Paid once at sign-in; afterwards the background task keeps it fresh
+            try:
+                self._refresh(creds)
+            except RefreshError as e:
+                # Revoked or expired refresh token: the user has to sign in again
+                print(f"❌ Could not refresh the token: {e}")
+                return None
+
+        session_id = secrets.token_urlsafe(32)
+        self._store(session_id, creds)
+        return session_id
+
+    def get_credentials(self, session_id: str):
+        """
+        Returns the Credentials for a session, or None if it is unknown or expired.
+        """
+        from google.oauth2.credentials import Credentials
+
+        cached = self.cache.get(session_id)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        info = self.db.get_session(session_id)
+        if info is None:
+            self.cache.pop(session_id, None)
+            return None
+
+        creds = Credentials.from_authorized_user_info(json.loads(info), SCOPES)
+        self.cache[session_id] = (creds, time.monotonic() + self.CACHE_TTL)
+        self.db.touch_session(session_id, self.SESSION_TTL)
+        return creds
+
+    def delete(self, session_id: str) -> None:
+        self.cache.pop(session_id, None)
+        self.db.delete_session(session_id)
+
+    def refresh_expiring(self) -> int:
+        """
+        Refreshes every session whose access token expires within REFRESH_MARGIN.
+        Safe to run from several workers at once: each session is refreshed by
+        whichever worker takes its lock.
+
+        Returns:
+            int: Number of sessions refreshed
+        """
+        from google.auth.exceptions import RefreshError
+
+        refreshed = 0
+        for session_id in self.db.get_sessions_expiring_before(time.time() + self.REFRESH_MARGIN):
+            lock_key = f"session:{session_id}:refresh"
+            if not self.db.redis.set(lock_key, 1, nx=True, ex=self.LOCK_TTL):
+                continue
+            try:
+                self.cache.pop(session_id, None)
+                creds = self.get_credentials(session_id)
+                if creds is None or not creds.refresh_token:
+                    self.db.delete_session(session_id)
+                    continue
+                self._refresh(creds)
+                self._store(session_id, creds)
+                refreshed += 1
+            except RefreshError as e:
+                print(f"❌ Token refresh failed, dropping session: {e}")
+                self.delete(session_id)
+            except Exception as e:
+                print(f"⚠️ Could not refresh session: {e}")
+            finally:
+                self.db.redis.delete(lock_key)
+        return refreshed
+
+    def _refresh(self, creds) -> None:
+        from google.auth.transport.requests import Request
+
+        with track("google_oauth", "token.refresh"):
+            creds.refresh(Request())
+
+    def _store(self, session_id: str, creds) -> None:
+        if creds.expiry:
+            # google-auth keeps expiry as naive UTC
+            expiry = creds.expiry.replace(tzinfo=timezone.utc).timestamp()
+        else:
+            expiry = time.time() + self.REFRESH_MARGIN
+        self.db.set_session(session_id, creds.to_json(), expiry, self.SESSION_TTL)
+        self.cache[session_id] = (creds, time.monotonic() + self.CACHE_TTL)
@@ -0,0 +1,386 @@
+"""
+Near-duplicate detection across the submissions of an export (see submission_export).
+
+Run from the backend directory after exporting:
+
+    python similarity.py exports --threshold 0.8
+
+Each downloaded zip is read once; its signature is appended to
+`exports/similarity.ndjson`, so after a later export only the new submissions
+are read and inserted. Pairs are only compared within the same assignment.
+"""
+import argparse
+import hashlib
+import json
+import keyword
+import os
+import re
+import sys
+import zipfile
+from array import array
+
+# Python source split into comments, strings, numbers, names and operators.
+# Whitespace and indentation are skipped, so re-formatting changes nothing.
+TOKEN_RE = re.compile(r"""
+    (?P<comment>\#[^\n]*)
+  | (?P<string>[rRbBuUfF]{0,2}(?:\"\"\"[\s\S]*?\"\"\"|'''[\s\S]*?'''|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'))
+  | (?P<number>(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d+)?[jJ]?)
+  | (?P<name>[^\W\d]\w*)
+  | (?P<op>\*\*=?|//=?|->|:=|<<=?|>>=?|[<>=!]=|[-+*/%&|^@]=?|[()\[\]{}.,:;~<>=])
+""", re.VERBOSE)
+
+# Names that carry meaning; every other identifier is renamed to the same token
+KEPT_NAMES = frozenset(keyword.kwlist) | frozenset({
+    "print", "input", "len", "range", "enumerate", "zip", "map", "filter", "sorted", "reversed",
+    "sum", "min", "max", "abs", "round", "int", "float", "str", "bool", "list", "dict", "set",
+    "tuple", "open", "isinstance", "append", "extend", "pop", "insert", "remove", "split",
+    "join", "strip", "replace", "format", "keys", "values", "items", "get", "self", "super",
+})
+
+SHINGLE_SIZE = 5
+MASK = (1 << 64) - 1
+
+
+def _mix(value: int) -> int:
+    # splitmix64 finalizer: spreads a 64-bit value over all bits
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & MASK
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & MASK
+    return value ^ (value >> 31)
+
+
+_token_ids: dict[str, int] = {}
+
+
+def _token_id(token: str) -> int:
+    # Stable across processes, unlike hash(), because signatures are stored
+    if token not in _token_ids:
+        _token_ids[token] = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+    return _token_ids[token]
+
+
+def normalize(source: str) -> list:
+    """
+    Returns the source's tokens with comments dropped and identifiers,
+    strings and numbers replaced by placeholders, so renaming variables or
+    changing literals does not hide a copy.
+    """
+    tokens = []
+    for match in TOKEN_RE.finditer(source):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        if kind == "name":
+            value = match.group()
+            tokens.append(value if value in KEPT_NAMES else "<id>")
+        elif kind == "string":
+            tokens.append("<str>")
+        elif kind == "number":
+            tokens.append("<num>")
+        else:
+            tokens.append(match.group())
+    return tokens
+
+
+def shingles(files: dict) -> set:
+    """
+    Returns the 64-bit hashes of every run of SHINGLE_SIZE normalized tokens
+    in the given {filename: source} files.
+    """
+    hashes = set()
+    for source in files.values():
+        ids = [_token_id(token) for token in normalize(source)]
+        for start in range(len(ids) - SHINGLE_SIZE + 1):
+            value = 0
+            for token in ids[start:start + SHINGLE_SIZE]:
+                value = (value * 0x100000001B3 + token) & MASK
+            hashes.add(_mix(value))
+    return hashes
+
+
+def python_files(zip_path: str) -> dict:
+    """
+    Returns {filename: source} for the .py files in a submission zip.
+    """
+    files = {}
+    with zipfile.ZipFile(zip_path) as archive:
+        for name in archive.namelist():
+            if name.endswith(".py"):
+                files[name] = archive.read(name).decode("utf-8", errors="replace")
+    return files
+
+
+def _donor_orders(bins: int) -> list:
+    # For each bin, every bin in a fixed pseudo-random order, to borrow from when empty
+    return [sorted(range(bins), key=lambda donor: _mix(index * bins + donor + 1)) for index in range(bins)]
+
+
+class MinHash:
+    """
+    One-permutation MinHash with optimal densification (Shrivastava, 2017).
+
+    Each shingle is hashed once into one of NUM_PERM bins and every bin keeps
+    its minimum, instead of hashing every shingle NUM_PERM times. An empty bin
+    copies the first non-empty bin in its fixed donor order. Two signatures
+    agree in a given position with probability equal to the Jaccard
+    similarity of the shingle sets.
+    """
+
+    NUM_PERM = 128
+    _BITS = NUM_PERM.bit_length() - 1
+    _DONORS = _donor_orders(NUM_PERM)
+
+    @classmethod
+    def signature(cls, hashes: set) -> tuple | None:
+        """
+        Returns the signature of a set of shingle hashes, or None if it is empty.
+        """
+        if not hashes:
+            return None
+        bins = [None] * cls.NUM_PERM
+        mask = cls.NUM_PERM - 1
+        for value in hashes:
+            index = value & mask
+            value >>= cls._BITS
+            current = bins[index]
+            if current is None or value < current:
+                bins[index] = value
+        return tuple(
+            value if value is not None else next(bins[donor] for donor in cls._DONORS[index] if bins[donor] is not None)
+            for index, value in enumerate(bins)
+        )
+
+    @staticmethod
+    def similarity(a: tuple, b: tuple) -> float:
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+    @staticmethod
+    def dumps(signature: tuple) -> str:
+        return array("Q", signature).tobytes().hex()
+
+    @staticmethod
+    def loads(data: str) -> tuple:
+        return tuple(array("Q", bytes.fromhex(data)))
+
+
+class SimilarityIndex:
+    """
+    LSH index over MinHash signatures that finds near-duplicates without
+    comparing every pair.
+
+    A signature is cut into BANDS bands of NUM_PERM / BANDS values. Documents
+    that agree on a whole band share a bucket and become candidates; only
+    candidates are compared, and pairs whose estimated similarity reaches
+    `threshold` are reported. With 16 bands of 8, a pair at 0.8 similarity is
+    a candidate 95% of the time, and a pair at 0.4 about 1% of the time.
+
+    Documents inserted with the same `group` (e.g. the same student) are
+    never reported as a pair.
+    """
+
+    BANDS = 16
+    THRESHOLD = 0.8
+
+    def __init__(self, threshold: float = THRESHOLD) -> None:
+        """
+        Initializes the SimilarityIndex.
+
+        Args:
+            threshold (float): Estimated Jaccard similarity from which a pair is reported
+        """
+        self.threshold = threshold
+        self.rows = MinHash.NUM_PERM // self.BANDS
+        self.signatures: dict = {}
+        self.groups: dict = {}
+        self.buckets = [{} for _ in range(self.BANDS)]
+        self.matches: list = []
+        self.stats = {"documents": 0, "candidates": 0, "matches": 0}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def get_stats(self) -> dict:
+        return dict(self.stats)
+
+    def query(self, signature: tuple, group=None) -> list:
+        """
+        Returns [(key, similarity)] of the indexed documents at or above the
+        threshold, most similar first, leaving out those in `group`.
+        """
+        candidates = set()
+        for band, buckets in zip(self._bands(signature), self.buckets):
+            candidates.update(buckets.get(band, ()))
+        if group is not None:
+            candidates = {key for key in candidates if self.groups.get(key) != group}
+        self.stats["candidates"] += len(candidates)
+        similar = [(key, MinHash.similarity(signature, self.signatures[key])) for key in candidates]
+        return sorted(((key, score) for key, score in similar if score >= self.threshold), key=lambda item: -item[1])
+
+    def insert(self, key, signature: tuple, group=None) -> list:
+        """
+        Adds a document and returns the earlier documents it is similar to,
+        as query() does. Inserting a key again is a no-op.
+        """
+        if key in self.signatures:
+            return []
+        similar = self.query(signature, group)
+        self.signatures[key] = signature
+        if group is not None:
+            self.groups[key] = group
+        for band, buckets in zip(self._bands(signature), self.buckets):
+            buckets.setdefault(band, []).append(key)
+        self.matches.extend((other, key, score) for other, score in similar)
+        self.stats["documents"] += 1
+        self.stats["matches"] += len(similar)
+        return similar
+
+    def remove(self, key) -> None:
+        """
+        Drops a document and the pairs it was part of.
+        """
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        self.groups.pop(key, None)
+        for band, buckets in zip(self._bands(signature), self.buckets):
+            bucket = buckets[band]
+            bucket.remove(key)
+            if not bucket:
+                del buckets[band]
+        self.matches = [match for match in self.matches if key not in match[:2]]
+        self.stats["documents"] -= 1
+        self.stats["matches"] = len(self.matches)
+
+    def pairs(self) -> list:
+        """
+        Returns every (earlier key, later key, similarity) found so far, most similar first.
+        """
+        return sorted(self.matches, key=lambda match: -match[2])
+
+    def _bands(self, signature: tuple):
+        rows = self.rows
+        return (signature[start:start + rows] for start in range(0, len(signature), rows))
+
+
+class ExportSimilarity:
+    """
+    Keeps one SimilarityIndex per assignment for a submission_export
+    directory, persisted as one NDJSON line per submission in SIGNATURES.
+
+    Only a student's latest file per assignment is indexed (by the
+    submission's updateTime, then manifest order), so a resubmission replaces
+    the earlier one, and a student is never paired with themselves.
+    """
+
+    SIGNATURES = "similarity.ndjson"
+    # Fewer shingles than this is boilerplate-sized code that anything resembles
+    MIN_SHINGLES = 20
+
+    def __init__(self, export_dir: str, threshold: float = SimilarityIndex.THRESHOLD) -> None:
+        """
+        Initializes the ExportSimilarity.
+
+        Args:
+            export_dir (str): Directory written by submission_export
+            threshold (float): Estimated Jaccard similarity from which a pair is reported
+        """
+        self.export_dir = export_dir
+        self.threshold = threshold
+        self.indexes: dict[str, SimilarityIndex] = {}
+        # fileId -> manifest record of every indexed submission
+        self.records: dict[str, dict] = {}
+        # (courseWorkId, userId) -> fileId of the student's latest indexed file
+        self.latest: dict[tuple, str] = {}
+        self.stats = {"indexed": 0, "new": 0, "too_short": 0, "unreadable": 0, "superseded": 0}
+
+    def get_stats(self) -> dict:
+        return dict(self.stats)
+
+    def update(self) -> list:
+        """
+        Loads the stored signatures, then reads and inserts the downloaded
+        submissions not indexed yet.
+
+        Returns:
+            list: (record, record, similarity) for every pair at or above the threshold
+        """
+        from submission_export import SubmissionExport
+
+        path = os.path.join(self.export_dir, self.SIGNATURES)
+        seen = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as stored:
+                for line in stored:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    seen.add(entry["fileId"])
+                    if entry["signature"]:
+                        self._insert(entry["record"], MinHash.loads(entry["signature"]))
+
+        with open(os.path.join(self.export_dir, SubmissionExport.MANIFEST), encoding="utf-8") as manifest, \
+                open(path, "a", encoding="utf-8") as stored:
+            for line in manifest:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("status") != "downloaded" or record["fileId"] in seen:
+                    continue
+                seen.add(record["fileId"])
+                try:
+                    hashes = shingles(python_files(os.path.join(self.export_dir, record["path"])))
+                except (OSError, zipfile.BadZipFile) as e:
+                    print(f"⚠️ Skipping {record['path']}: {e}")
+                    self.stats["unreadable"] += 1
+                    continue
+                signature = MinHash.signature(hashes) if len(hashes) >= self.MIN_SHINGLES else None
+                if signature is None:
+                    self.stats["too_short"] += 1
+                else:
+                    self._insert(record, signature)
+                    self.stats["new"] += 1
+                entry = {"fileId": record["fileId"], "record": record, "signature": signature and MinHash.dumps(signature)}
+                stored.write(json.dumps(entry) + "\n")
+
+        return [
+            (self.records[a], self.records[b], score)
+            for index in self.indexes.values()
+            for a, b, score in index.pairs()
+        ]
+
+    def _insert(self, record: dict, signature: tuple) -> None:
+        index = self.indexes.setdefault(record["courseWorkId"], SimilarityIndex(self.threshold))
+        student = (record["courseWorkId"], record.get("userId"))
+        previous = self.latest.get(student)
+        if previous is not None:
+            self.stats["superseded"] += 1
+            if (record.get("updateTime") or "") < (self.records[previous].get("updateTime") or ""):
+                return
+            index.remove(previous)
+            del self.records[previous]
+            self.stats["indexed"] -= 1
+        self.latest[student] = record["fileId"]
+        self.records[record["fileId"]] = record
+        index.insert(record["fileId"], signature, record.get("userId"))
+        self.stats["indexed"] += 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("export_dir", help="directory written by submission_export.py")
+    parser.add_argument("--threshold", type=float, default=SimilarityIndex.THRESHOLD, help="estimated Jaccard similarity to report")
+    args = parser.parse_args()
+
+    engine = ExportSimilarity(args.export_dir, args.threshold)
+    pairs = engine.update()
+    for a, b, score in sorted(pairs, key=lambda pair: (pair[0]["courseWorkId"], -pair[2])):
+        print(f"{score:.2f}  {a['courseWorkId']}  {a.get('email') or a['userId']}  {b.get('email') or b['userId']}")
+    stats = engine.get_stats()
+    print(f"✅ {stats['indexed']} submissions indexed ({stats['new']} new, {stats['too_short']} too short to compare), "
+          f"{len(pairs)} similar pairs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from redis import Redis
+from redis.exceptions import RedisError
+from starlette.concurrency import run_in_threadpool
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical backend calls so they share one upstream execution.
+
+    Callers in the same worker wait on a shared future; callers in other uvicorn
+    workers wait on a Redis lock and pick the leader's result up from a short-lived
+    result key.
+    """
+
+    LOCK_TTL = 120
+    RESULT_TTL = 10
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, redis: Redis = None) -> None:
+        """
+        Initializes the SingleFlight layer.
+
+        Args:
+            redis (Redis): Redis connection shared with the other workers
+        """
+        self.redis = redis or Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+        self.in_flight: dict[str, asyncio.Future] = {}
+        self.stats = {"executed": 0, "coalesced_local": 0, "coalesced_remote": 0}
+
+    @staticmethod
+    def make_key(operation: str, user: str, payload: dict) -> str:
+        """
+        Builds the coalescing key from the operation, the user and a hash of the
+        normalized payload.
+        """
+        normalized = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        digest = hashlib.sha256(normalized.encode()).hexdigest()
+        return f"singleflight:{operation}:{user}:{digest}"
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["in_flight"] = len(self.in_flight)
+        return stats
+
+    async def run(self, operation: str, user: str, payload: dict, fn):
+        """
+        Runs `fn` once for all concurrent callers with the same key.
+
+        Args:
+            operation (str): Name of the backend operation, e.g. "get_gcr_data"
+            user (str): The user the call is made for
+            payload (dict): Request fields that determine the result
+            fn: Coroutine function producing a JSON-serializable result
+
+        Returns:
+            The result of the shared execution
+        """
+        key = self.make_key(operation, user, payload)
+
+        if key in self.in_flight:
+            self.stats["coalesced_local"] += 1
+            leader = self.in_flight[key]
+            try:
+                return await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise
+                # The leader's request was cancelled (e.g. its socket closed), not ours
+                return await self.run(operation, user, payload, fn)
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            result = await self._run_shared(key, fn)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case no one else was waiting
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+
+    async def _run_shared(self, key: str, fn):
+        lock_key = f"{key}:lock"
+        result_key = f"{key}:result"
+        token = uuid.uuid4().hex
+
+        # The Redis client is synchronous, so every call runs off the event loop
+        try:
+            is_leader = await run_in_threadpool(self.redis.set, lock_key, token, nx=True, ex=self.LOCK_TTL)
+        except RedisError as e:
+            print(f"⚠️ Single-flight disabled, Redis unavailable: {e}")
+            return await self._execute(fn)
+
+        if is_leader:
+            await run_in_threadpool(self.redis.delete, result_key)
+            try:
+                result = await self._execute(fn)
+                await run_in_threadpool(self.redis.set, result_key, json.dumps(result), ex=self.RESULT_TTL)
+                return result
+            finally:
+                # Also on cancellation, so remote followers stop waiting and run it themselves
+                await asyncio.shield(run_in_threadpool(self._release, lock_key, token))
+
+        self.stats["coalesced_remote"] += 1
+        deadline = time.monotonic() + self.LOCK_TTL
+        while time.monotonic() < deadline:
+            cached = await run_in_threadpool(self.redis.get, result_key)
+            if cached is not None:
+                return json.loads(cached)
+            if not await run_in_threadpool(self.redis.exists, lock_key):
+                # The leader failed without publishing a result; do the work ourselves
+                break
+            await asyncio.sleep(self.POLL_INTERVAL)
+        return await self._execute(fn)
+
+    def _release(self, lock_key: str, token: str) -> None:
+        if self.redis.get(lock_key) == token.encode():
+            self.redis.delete(lock_key)
+
+    async def _execute(self, fn):
+        self.stats["executed"] += 1
+        return await fn()
@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from redis import Redis
+from starlette.concurrency import run_in_threadpool
+from admission import AdmissionController
+from metrics import track
+
+
+def code_hash(code_dict: dict, question_data: str, topic: str = None) -> str:
+    """
+    Hashes what a hint depends on. The extension computes the same digest
+    (sha256 over each file's name and content in name order, then the question
+    and topic, separated by NUL bytes) to skip saves that changed nothing.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(code_dict):
+        digest.update(name.encode() + b"\0" + code_dict[name].encode() + b"\0")
+    digest.update(question_data.encode() + b"\0" + (topic or "").encode())
+    return digest.hexdigest()
+
+
+class SpeculativeHints:
+    """
+    Generates the next hint in the background when a student saves, so a later
+    💡 click on the same code is answered from Redis instead of waiting on Gemini.
+
+    Speculation is strictly low priority: a job starts only while the admission
+    controller has slots to spare beyond RESERVED_SLOTS and the user's API key
+    is idle, each user has at most one job queued or running (a newer save
+    replaces the queued one), and each user gets HOURLY_QUOTA speculative calls
+    an hour on their own API key.
+
+    The Redis client is synchronous, so every call to it runs in the threadpool.
+    """
+
+    HINT_TTL = 30 * 60
+    # A queued job this old is for code the student has long moved past
+    JOB_TTL = 120
+    HOURLY_QUOTA = 20
+    MAX_QUEUE = 64
+    WORKERS = 2
+    RESERVED_SLOTS = 4
+    IDLE_POLL = 0.5
+
+    def __init__(self, admission: AdmissionController, redis: Redis = None) -> None:
+        """
+        Initializes the SpeculativeHints queue.
+
+        Args:
+            admission (AdmissionController): Controller the interactive hint requests go through
+            redis (Redis): Client used to store hints and quotas, defaults to REDIS_URL
+        """
+        self.admission = admission
+        self.redis = redis or Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+        # user -> (code_hash, api_key, generate, queued_at), served oldest first
+        self.jobs: OrderedDict[str, tuple] = OrderedDict()
+        # user -> code_hash of the job being generated
+        self.running: dict[str, str] = {}
+        # Users whose running job was already answered interactively
+        self.claimed: set[str] = set()
+        self.wakeup = asyncio.Event()
+        self.stats = {
+            "queued": 0, "replaced": 0, "generated": 0, "hits": 0, "misses": 0,
+            "expired": 0, "over_quota": 0, "queue_full": 0, "failed": 0, "discarded": 0,
+        }
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["queue_depth"] = len(self.jobs)
+        stats["running"] = len(self.running)
+        return stats
+
+    async def submit(self, user: str, api_key: str, digest: str, generate) -> dict:
+        """
+        Queues a speculative hint for `digest` unless one is already stored,
+        queued or being generated.
+
+        Args:
+            user (str): The student who saved
+            api_key (str): The API key the hint will be generated with
+            digest (str): code_hash of the saved code
+            generate: Coroutine function producing the hint result, as /generate_hints would
+
+        Returns:
+            dict: {"status": "queued" | "ready" | "pending" | "over_quota" | "busy", "code_hash": ...}
+        """
+        status = await self._submit(user, api_key, digest, generate)
+        return {"status": status, "code_hash": digest}
+
+    async def take(self, user: str, digest: str) -> dict | None:
+        """
+        Returns and removes the stored hint for `digest`, if any. Called on every
+        interactive request, so a queued or running job for the same code is
+        dropped rather than answering a second click with the same hint.
+        """
+        data = await run_in_threadpool(self._getdel, self._key(user, digest))
+        if data is not None:
+            self.stats["hits"] += 1
+            return json.loads(data)
+
+        self.stats["misses"] += 1
+        queued = self.jobs.get(user)
+        if queued and queued[0] == digest:
+            del self.jobs[user]
+        if self.running.get(user) == digest:
+            self.claimed.add(user)
+        return None
+
+    async def run(self) -> None:
+        """
+        Worker loop; the app starts WORKERS of these for its lifetime.
+        """
+        while True:
+            user, digest, generate = await self._next_job()
+            self.running[user] = digest
+            try:
+                await run_in_threadpool(self._count_quota, user)
+                result = await generate()
+                if user in self.claimed:
+                    self.stats["discarded"] += 1
+                elif isinstance(result, dict) and not result.get("error"):
+                    await run_in_threadpool(self._store, user, digest, result)
+                    self.stats["generated"] += 1
+                else:
+                    self.stats["failed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"⚠️ Speculative hint failed: {e}")
+            finally:
+                del self.running[user]
+                self.claimed.discard(user)
+                self.wakeup.set()
+
+    async def _submit(self, user: str, api_key: str, digest: str, generate) -> str:
+        if self._pending(user, digest):
+            return "pending"
+        ready, used = await run_in_threadpool(self._stored_and_used, user, digest)
+        if ready:
+            return "ready"
+        if used >= self.HOURLY_QUOTA:
+            self.stats["over_quota"] += 1
+            return "over_quota"
+
+        # Another save may have queued the same code while Redis was read
+        if self._pending(user, digest):
+            return "pending"
+        queued = self.jobs.get(user)
+        if queued:
+            # Only the latest save matters; keep the user's place in line
+            self.stats["replaced"] += 1
+        elif len(self.jobs) >= self.MAX_QUEUE:
+            self.stats["queue_full"] += 1
+            return "busy"
+        self.jobs[user] = (digest, api_key, generate, time.monotonic())
+        self.stats["queued"] += 1
+        self.wakeup.set()
+        return "queued"
+
+    def _pending(self, user: str, digest: str) -> bool:
+        queued = self.jobs.get(user)
+        return self.running.get(user) == digest or bool(queued and queued[0] == digest)
+
+    def _stored_and_used(self, user: str, digest: str) -> tuple:
+        with track("redis", "exists"):
+            if self.redis.exists(self._key(user, digest)):
+                return True, 0
+        with track("redis", "get"):
+            return False, int(self.redis.get(self._quota_key(user)) or 0)
+
+    def _getdel(self, key: str):
+        with track("redis", "getdel"):
+            return self.redis.getdel(key)
+
+    def _count_quota(self, user: str) -> None:
+        with track("redis", "incr"):
+            pipe = self.redis.pipeline()
+            pipe.incr(self._quota_key(user))
+            pipe.expire(self._quota_key(user), 60 * 60)
+            pipe.execute()
+
+    def _store(self, user: str, digest: str, result: dict) -> None:
+        with track("redis", "set"):
+            self.redis.set(self._key(user, digest), json.dumps(result), ex=self.HINT_TTL)
+
+    async def _next_job(self) -> tuple:
+        while True:
+            job = self._pop_ready()
+            if job is not None:
+                return job
+            self.wakeup.clear()
+            try:
+                # Admission frees slots without telling us, so poll as well
+                await asyncio.wait_for(self.wakeup.wait(), self.IDLE_POLL)
+            except asyncio.TimeoutError:
+                pass
+
+    def _pop_ready(self) -> tuple | None:
+        now = time.monotonic()
+        for user in list(self.jobs):
+            digest, api_key, generate, queued_at = self.jobs[user]
+            if now - queued_at > self.JOB_TTL:
+                del self.jobs[user]
+                self.stats["expired"] += 1
+                continue
+            if user in self.running:
+                continue
+            # Wait for a quiet moment, and never compete with the user's own clicks
+            if self.admission.spare_slots() <= self.RESERVED_SLOTS or self.admission.spare_slots(api_key) < self.admission.max_per_key:
+                continue
+            del self.jobs[user]
+            return user, digest, generate
+        return None
+
+    def _key(self, user: str, digest: str) -> str:
+        return f"speculative_hint:{user}:{digest}"
+
+    def _quota_key(self, user: str) -> str:
+        return f"speculative_hint_quota:{user}:{int(time.time() // 3600)}"
@@ -0,0 +1,307 @@
+"""
+Bulk export of every student's submission for an assignment, for teachers and TAs.
+
+Run from the backend directory with a teacher's authorized-user token granted
+EXPORT_SCOPES, such as the export_token.json written by classroom.py's
+/classroom/export_login (tokens granted only SCOPES cannot read the files):
+
+    python submission_export.py --token export_token.json --course 123 --assignment 456 --out exports
+
+Leave out --assignment to export every assignment in the course. Running the
+same command again after an interruption only downloads what is missing.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from circuit_breaker import CircuitOpen, guard, outage
+from google_classroom import SCOPES, GoogleClassroomClient, build_service
+from metrics import track
+
+# Students' Drive files are shared with the teacher, which drive.file does not cover
+EXPORT_SCOPES = SCOPES + ["https://www.googleapis.com/auth/drive.readonly"]
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", name).strip("._") or "_"
+
+
+class SubmissionExport:
+    """
+    Downloads the Drive attachments of every student's submission to
+    `out_dir/<courseWorkId>/<student>/<file title>` and appends one NDJSON
+    record per attachment to `out_dir/manifest.ndjson`.
+
+    Submissions are read page by page and at most WORKERS downloads run at
+    once, each streamed to disk in CHUNK_SIZE pieces, so memory stays flat
+    however large the course. A file is written under a `.part` name and
+    renamed when complete, and the manifest line is written after that, so a
+    rerun skips every attachment the manifest already lists as downloaded,
+    and only appends records the manifest does not already hold.
+    """
+
+    MANIFEST = "manifest.ndjson"
+    WORKERS = 8
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, client: GoogleClassroomClient, out_dir: str, workers: int = WORKERS) -> None:
+        """
+        Initializes the SubmissionExport.
+
+        Args:
+            client (GoogleClassroomClient): Client signed in as a teacher of the course
+            out_dir (str): Directory the files and the manifest are written to
+            workers (int): Maximum number of concurrent downloads
+        """
+        self.client = client
+        self.out_dir = out_dir
+        self.workers = workers
+        # httplib2 connections are not thread-safe, so each worker builds its own Drive client
+        self._local = threading.local()
+        self.retry_after = None
+        # manifest_key() of every record in the manifest
+        self._written = set()
+        self.stats = {"submissions": 0, "downloaded": 0, "skipped": 0, "failed": 0, "not_downloadable": 0, "bytes": 0}
+
+    def get_stats(self) -> dict:
+        return dict(self.stats)
+
+    def run(self, course_id: str, course_work_id: str = "-"):
+        """
+        Exports the submissions and yields each manifest record as its
+        attachment is done, in completion order.
+
+        Records carry the submission (courseWorkId, submissionId, userId,
+        email, name, state, late, grades, updateTime) and the attachment
+        (type, fileId, title, url, path, bytes), with a status of
+        "downloaded", "skipped" (downloaded by an earlier run), "failed",
+        "not_downloadable" (links, forms, videos) or "no_attachments".
+
+        Stops early if Drive or Classroom stops responding; `retry_after` then
+        says when to run it again.
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        done = self._load_manifest()
+        pool = ThreadPoolExecutor(self.workers)
+        pending = set()
+        try:
+            with open(os.path.join(self.out_dir, self.MANIFEST), "a", encoding="utf-8") as manifest:
+                try:
+                    roster = {student["userId"]: student.get("profile", {}) for student in self.client.iter_students(course_id)}
+                    for submission in self.client.iter_student_submissions(course_id, course_work_id):
+                        self.stats["submissions"] += 1
+                        for record in self._records(course_id, submission, roster.get(submission.get("userId"), {})):
+                            if record["status"] != "pending":
+                                yield self._finish(manifest, record)
+                            elif self._already_downloaded(done.get(record["fileId"])):
+                                previous = done[record["fileId"]]
+                                yield self._finish(manifest, {**record, "path": previous["path"], "bytes": previous["bytes"], "status": "skipped"})
+                            else:
+                                # Bound the backlog so a large course is not queued up in memory
+                                if len(pending) >= self.workers * 2:
+                                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                                    for result in self._results(finished):
+                                        yield self._finish(manifest, result)
+                                pending.add(pool.submit(self._download, record))
+                    while pending:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for record in self._results(finished):
+                            yield self._finish(manifest, record)
+                except Exception as e:
+                    # Listing calls go to Classroom; download failures are caught per file
+                    stopped = outage(e, "classroom")
+                    if stopped is None:
+                        raise
+                    self.retry_after = stopped.retry_after
+                    print(f"⚠️ Export stopped: {stopped}")
+                    # Keep what finished in the meantime; the rest is picked up by the next run
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    for record in self._results(pending, raise_errors=False):
+                        yield self._finish(manifest, record)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _records(self, course_id: str, submission: dict, profile: dict) -> list:
+        email = profile.get("emailAddress")
+        student = _safe_name(email.split("@")[0] if email else submission.get("userId", "unknown"))
+        base = {
+            "courseId": course_id,
+            "courseWorkId": submission.get("courseWorkId"),
+            "submissionId": submission.get("id"),
+            "userId": submission.get("userId"),
+            "email": email,
+            "name": profile.get("name", {}).get("fullName"),
+            "state": submission.get("state"),
+            "late": submission.get("late", False),
+            "assignedGrade": submission.get("assignedGrade"),
+            "draftGrade": submission.get("draftGrade"),
+            "updateTime": submission.get("updateTime"),
+        }
+        attachments = submission.get("assignmentSubmission", {}).get("attachments", [])
+        if not attachments:
+            return [{**base, "status": "no_attachments"}]
+
+        records = []
+        titles = set()
+        for attachment in attachments:
+            kind = next(iter(attachment), None)
+            item = attachment.get(kind) or {}
+            if kind != "driveFile":
+                records.append({
+                    **base, "type": kind, "title": item.get("title"),
+                    "url": item.get("url") or item.get("formUrl") or item.get("alternateLink"),
+                    "status": "not_downloadable",
+                })
+                continue
+            title = _safe_name(item.get("title") or item["id"])
+            if title in titles:
+                title = f"{item['id']}_{title}"
+            titles.add(title)
+            records.append({
+                **base, "type": kind, "fileId": item["id"], "title": item.get("title"),
+                "url": item.get("alternateLink"),
+                "path": os.path.join(_safe_name(base["courseWorkId"] or "unknown"), student, title),
+                "status": "pending",
+            })
+        return records
+
+    def _download(self, record: dict) -> dict:
+        from googleapiclient.http import MediaIoBaseDownload
+
+        path = os.path.join(self.out_dir, record["path"])
+        part = path + ".part"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with guard("drive"), track("drive", "files.get_media"), open(part, "wb") as f:
+                request = self._drive().files().get_media(fileId=record["fileId"])
+                downloader = MediaIoBaseDownload(f, request, chunksize=self.CHUNK_SIZE)
+                complete = False
+                while not complete:
+                    _, complete = downloader.next_chunk(num_retries=2)
+            os.replace(part, path)
+        except CircuitOpen:
+            self._discard(part)
+            raise
+        except Exception as e:
+            # e.g. a Google Doc, which has no bytes to download, or a file the teacher cannot see
+            self._discard(part)
+            print(f"❌ Failed to download {record['fileId']} for {record['userId']}: {e}")
+            return {**record, "status": "failed", "error": str(e)}
+        return {**record, "status": "downloaded", "bytes": os.path.getsize(path)}
+
+    @staticmethod
+    def _results(futures, raise_errors: bool = True):
+        """
+        Yields the records of the downloads that completed, then re-raises
+        the first CircuitOpen among the others, so finished work is never lost.
+        """
+        error = None
+        for future in futures:
+            if future.cancelled():
+                continue
+            if future.exception() is not None:
+                error = error or future.exception()
+                continue
+            yield future.result()
+        if error is not None and raise_errors:
+            raise error
+
+    def _finish(self, manifest, record: dict) -> dict:
+        status = record["status"]
+        self.stats[status] = self.stats.get(status, 0) + 1
+        if status == "downloaded":
+            self.stats["bytes"] += record["bytes"]
+        key = self.manifest_key(record)
+        if status != "skipped" and key not in self._written:
+            self._written.add(key)
+            manifest.write(json.dumps(record) + "\n")
+            manifest.flush()
+        return record
+
+    @staticmethod
+    def manifest_key(record: dict) -> tuple:
+        """
+        Identifies a manifest record: the attachment of a submission at one
+        updateTime, with its status. A regraded submission or a retried
+        download that now succeeds gets a new line; an unchanged one does not.
+        """
+        attachment = record.get("fileId") or record.get("url") or record.get("title")
+        return record.get("submissionId"), record.get("updateTime"), attachment, record["status"]
+
+    def _drive(self):
+        if not hasattr(self._local, "drive"):
+            self._local.drive = build_service("drive", "v3", self.client.creds)
+        return self._local.drive
+
+    def _load_manifest(self) -> dict:
+        """
+        Returns {fileId: record} for the attachments earlier runs downloaded,
+        and notes the key of every record already in the manifest.
+        """
+        done = {}
+        self._written = set()
+        try:
+            with open(os.path.join(self.out_dir, self.MANIFEST), encoding="utf-8") as manifest:
+                for line in manifest:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # The last line of an interrupted run may be cut short
+                        continue
+                    self._written.add(self.manifest_key(record))
+                    if record.get("status") == "downloaded":
+                        done[record["fileId"]] = record
+        except FileNotFoundError:
+            pass
+        return done
+
+    def _already_downloaded(self, record: dict | None) -> bool:
+        if record is None:
+            return False
+        path = os.path.join(self.out_dir, record["path"])
+        return os.path.exists(path) and os.path.getsize(path) == record["bytes"]
+
+    @staticmethod
+    def _discard(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--token", required=True, help="authorized-user token JSON of a teacher of the course")
+    parser.add_argument("--course", required=True, help="course id")
+    parser.add_argument("--assignment", default="-", help="courseWork id, default every assignment")
+    parser.add_argument("--out", default="exports", help="directory for the files and manifest.ndjson")
+    parser.add_argument("--workers", type=int, default=SubmissionExport.WORKERS, help="concurrent downloads")
+    args = parser.parse_args()
+
+    from google.oauth2.credentials import Credentials
+
+    try:
+        # Loaded with EXPORT_SCOPES, as refreshing with SCOPES would drop drive.readonly
+        creds = Credentials.from_authorized_user_file(args.token, EXPORT_SCOPES)
+    except (OSError, ValueError) as e:
+        print(f"❌ {args.token} is not a valid token: {e}")
+        return 1
+    client = GoogleClassroomClient(creds=creds)
+
+    export = SubmissionExport(client, args.out, args.workers)
+    for record in export.run(args.course, args.assignment):
+        if record["status"] == "downloaded":
+            print(f"⬇️ {record['path']} ({record['bytes']} bytes)")
+    stats = export.get_stats()
+    print(f"✅ {stats['submissions']} submissions: {stats['downloaded']} downloaded, {stats['skipped']} already there, "
+          f"{stats['failed']} failed, {stats['bytes']} bytes written to {args.out}")
+    if export.retry_after:
+        print(f"⚠️ Stopped early, run again in {export.retry_after} s to finish")
+    return 1 if export.retry_after or stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
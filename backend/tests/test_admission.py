@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from admission import AdmissionController, AdmissionRejected
+
+
+def test_waiters_are_served_when_a_slot_frees():
+    controller = AdmissionController(max_concurrent=1, max_per_key=1)
+    order = []
+
+    async def call(user):
+        async with controller.admit(user, "key"):
+            order.append(user)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(call(user) for user in ("a", "b", "c")))
+
+    asyncio.run(main())
+    assert sorted(order) == ["a", "b", "c"]
+    assert controller.running == 0 and controller.queue_depth == 0
+
+
+def test_waiter_cancelled_while_slot_is_released():
+    controller = AdmissionController(max_concurrent=1, max_per_key=1)
+
+    async def main():
+        holding = controller.admit("a", "key")
+        await holding.__aenter__()
+
+        async def waiter():
+            async with controller.admit("b", "key"):
+                pass
+
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        assert controller.queue_depth == 1
+
+        # Cancel the waiter and free the slot in the same loop turn,
+        # before the waiter's task gets to clean up after itself
+        waiting.cancel()
+        await holding.__aexit__(None, None, None)
+        await asyncio.gather(waiting, return_exceptions=True)
+
+        assert controller.running == 0
+        assert controller.queue_depth == 0
+        assert not controller.waiting
+        # The slot is usable again
+        async with controller.admit("c", "key"):
+            assert controller.running == 1
+
+    asyncio.run(main())
+
+
+def test_waiting_users_are_served_round_robin():
+    controller = AdmissionController(max_concurrent=1, max_per_key=1)
+    order = []
+
+    async def call(label):
+        async with controller.admit(label[0], "key"):
+            order.append(label)
+            await asyncio.sleep(0)
+
+    async def main():
+        holding = controller.admit("x", "key")
+        await holding.__aenter__()
+        # a queues three requests before b queues two
+        tasks = []
+        for label in ("a1", "a2", "a3", "b1", "b2"):
+            tasks.append(asyncio.create_task(call(label)))
+            await asyncio.sleep(0)
+        assert controller.queue_depth == 5
+        await holding.__aexit__(None, None, None)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["a1", "b1", "a2", "b2", "a3"]
+
+
+def test_full_queue_rejects_with_a_retry_estimate():
+    controller = AdmissionController(max_concurrent=2, max_per_key=2, max_queue=2)
+    controller.service_time_avg = 3.0
+
+    async def main():
+        holders = [controller.admit("x", "key") for _ in range(2)]
+        for holder in holders:
+            await holder.__aenter__()
+        waiting = [asyncio.create_task(controller.admit(user, "key").__aenter__()) for user in ("a", "b")]
+        await asyncio.sleep(0)
+        assert controller.queue_depth == 2
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.admit("c", "key"):
+                pass
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+        return rejected.value
+
+    rejected = asyncio.run(main())
+    # Four requests ahead, two at a time, 3 s each
+    assert rejected.retry_after == 6 and "retry in 6 s" in str(rejected)
+    assert controller.get_stats()["rejected"] == 1
+
+
+def test_retry_after_is_at_least_a_second():
+    controller = AdmissionController(max_concurrent=8)
+    controller.service_time_avg = 0.01
+    assert controller.retry_after() == 1
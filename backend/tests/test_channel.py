@@ -0,0 +1,60 @@
+import asyncio
+import fakeredis
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from channel import Channel
+from profiling import Profiler
+
+
+def make_client(profiler=None, max_in_flight=Channel.MAX_IN_FLIGHT) -> TestClient:
+    async def echo(channel, request_id, params):
+        return params
+
+    async def watch(channel, request_id, params):
+        channel.start_background(asyncio.Event().wait())
+        return {"watching": True}
+
+    async def hang(channel, request_id, params):
+        await asyncio.Event().wait()
+
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        channel = Channel(websocket, {"echo": echo, "watch": watch, "hang": hang}, profiler)
+        channel.MAX_IN_FLIGHT = max_in_flight
+        await channel.serve()
+
+    return TestClient(app)
+
+
+def test_non_object_messages_get_an_error_and_keep_the_socket():
+    with make_client().websocket_connect("/ws") as ws:
+        ws.send_text("[1, 2]")
+        assert ws.receive_json() == {"type": "error", "error": "Messages must be JSON objects"}
+        ws.send_json({"id": 1, "op": "echo", "params": [1]})
+        assert ws.receive_json()["status"] == 422
+        ws.send_json({"id": 2, "op": "echo", "params": {"a": 1}})
+        assert ws.receive_json() == {"id": 2, "type": "result", "data": {"a": 1}}
+
+
+def test_operations_can_be_profiled_with_the_admin_token(monkeypatch):
+    monkeypatch.setenv("PYBUDDY_ADMIN_TOKEN", "secret")
+    profiler = Profiler(fakeredis.FakeRedis())
+    with make_client(profiler).websocket_connect("/ws") as ws:
+        ws.send_json({"id": 1, "op": "echo", "params": {}, "profile": 1})
+        assert "profile_id" not in ws.receive_json()
+        ws.send_json({"id": 2, "op": "echo", "params": {}, "profile": 1, "admin_token": "secret"})
+        reply = ws.receive_json()
+    assert profiler.get(reply["profile_id"])["route"] == "ws:echo"
+
+
+def test_watchers_do_not_count_as_requests_in_flight():
+    with make_client(max_in_flight=1).websocket_connect("/ws") as ws:
+        ws.send_json({"id": 1, "op": "watch"})
+        assert ws.receive_json()["data"] == {"watching": True}
+        ws.send_json({"id": 2, "op": "echo", "params": {"a": 1}})
+        assert ws.receive_json()["type"] == "result"
+        ws.send_json({"id": 3, "op": "hang"})
+        ws.send_json({"id": 4, "op": "echo"})
+        assert ws.receive_json() == {"id": 4, "type": "error", "error": "Too many requests in flight", "retry_after": 1}
@@ -0,0 +1,120 @@
+import fakeredis
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, is_failure, is_outage
+
+
+def make_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("classroom", fakeredis.FakeRedis())
+    # Read the shared state on every call
+    breaker.STATE_CACHE_TTL = 0
+    return breaker
+
+
+def call(breaker: CircuitBreaker, error: Exception = None) -> None:
+    with breaker.guard():
+        if error is not None:
+            raise error
+
+
+def fail(breaker: CircuitBreaker, times: int) -> None:
+    for _ in range(times):
+        with pytest.raises(TimeoutError):
+            call(breaker, TimeoutError("timed out"))
+
+
+def half_open(breaker: CircuitBreaker) -> None:
+    # What the open key expiring looks like
+    breaker.redis.delete(f"{breaker.prefix}:open")
+
+
+def http_error(status: int) -> HttpError:
+    return HttpError(httplib2.Response({"status": status}), b"{}")
+
+
+def test_opens_after_enough_failures_and_rejects_calls():
+    breaker = make_breaker()
+    fail(breaker, CircuitBreaker.MIN_FAILURES - 1)
+    assert breaker._state()[0] == CLOSED
+    fail(breaker, 1)
+    state, retry_after = breaker._state()
+    assert state == OPEN and 0 < retry_after <= CircuitBreaker.OPEN_FOR
+
+    with pytest.raises(CircuitOpen) as rejected:
+        call(breaker)
+    assert rejected.value.retry_after > 0
+    assert breaker.get_stats()["rejected"] == 1 and breaker.get_stats()["opened"] == 1
+
+
+def test_stays_closed_while_failures_are_a_minority():
+    breaker = make_breaker()
+    for _ in range(4 * CircuitBreaker.MIN_FAILURES):
+        call(breaker)
+    fail(breaker, CircuitBreaker.MIN_FAILURES)
+    assert breaker._state()[0] == CLOSED
+
+
+def test_client_errors_do_not_count():
+    breaker = make_breaker()
+    for _ in range(2 * CircuitBreaker.MIN_FAILURES):
+        with pytest.raises(HttpError):
+            call(breaker, http_error(404))
+    assert breaker._state()[0] == CLOSED and breaker.get_stats()["failures"] == 0
+
+
+def test_half_open_lets_one_probe_through_and_success_closes():
+    breaker = make_breaker()
+    breaker._open()
+    half_open(breaker)
+    assert breaker._state()[0] == HALF_OPEN
+
+    with breaker.guard():
+        assert breaker.redis.exists(f"{breaker.prefix}:probe")
+        # Only one probe at a time
+        with pytest.raises(CircuitOpen):
+            call(breaker)
+    assert breaker._state()[0] == CLOSED
+    assert not breaker.redis.exists(f"{breaker.prefix}:probe", f"{breaker.prefix}:half_open")
+    call(breaker)
+
+
+def test_failed_probe_opens_again():
+    breaker = make_breaker()
+    breaker._open()
+    half_open(breaker)
+    fail(breaker, 1)
+    assert breaker._state()[0] == OPEN and breaker.get_stats()["opened"] == 2
+    # The next half-open period gets a fresh probe
+    half_open(breaker)
+    call(breaker)
+    assert breaker._state()[0] == CLOSED
+
+
+def test_stays_closed_without_redis():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    breaker = CircuitBreaker("classroom", fakeredis.FakeRedis(server=server))
+    fail(breaker, 2 * CircuitBreaker.MIN_FAILURES)
+    call(breaker)
+    assert breaker.get_stats()["state"] == CLOSED
+
+
+def test_check_raises_for_the_longest_open_breaker(monkeypatch):
+    classroom, gemini = make_breaker(), make_breaker()
+    monkeypatch.setattr(circuit_breaker, "breakers", {"classroom": classroom, "gemini": gemini})
+    circuit_breaker.check("classroom", "gemini")
+    gemini._open()
+    with pytest.raises(CircuitOpen) as rejected:
+        circuit_breaker.check("classroom", "gemini")
+    assert rejected.value.dependency == "gemini"
+
+
+def test_failure_and_outage_classification():
+    assert is_failure(TimeoutError()) and is_failure(ConnectionResetError())
+    assert is_failure(http_error(503)) and is_failure(http_error(408))
+    assert not is_failure(http_error(404)) and not is_failure(http_error(429))
+    assert not is_failure(ValueError()) and not is_failure(CircuitOpen("classroom", 1))
+    assert is_outage(CircuitOpen("classroom", 1)) and is_outage(TimeoutError())
+    assert not is_outage(http_error(403))
@@ -0,0 +1,97 @@
+import asyncio
+import gzip
+import zlib
+import pytest
+import compression
+from compression import CompressionMiddleware, negotiate
+
+
+def run(chunks, accept_encoding="gzip", content_type="application/json", minimum_size=1024):
+    """
+    Sends `chunks` as one response through the middleware and returns the
+    response headers and the body messages it sent on.
+    """
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(sum(map(len, chunks))).encode()),
+        ]})
+        for index, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": index < len(chunks) - 1})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=minimum_size)(scope, None, send))
+    headers = {name.decode().lower(): value.decode() for name, value in sent[0]["headers"]}
+    return headers, sent[1:]
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("gzip;q=0.5, br;q=0.1", "br"),
+    ("BR", "br"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("", None),
+    ("gzip;q=abc", None),
+])
+def test_negotiate(header, expected):
+    assert negotiate(header) == expected
+
+
+def test_negotiate_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert negotiate("br, gzip") == "gzip"
+    assert negotiate("br") is None
+
+
+def test_small_bodies_pass_through():
+    body = b'{"ok": true}'
+    headers, messages = run([body])
+    assert "content-encoding" not in headers and "vary" not in headers
+    assert headers["content-length"] == str(len(body))
+    assert [message["body"] for message in messages] == [body]
+
+
+def test_identity_and_excluded_types_pass_through():
+    body = b"x" * 4096
+    for accept_encoding, content_type in (("identity", "application/json"), ("gzip", "application/zip")):
+        headers, messages = run([body], accept_encoding, content_type)
+        assert "content-encoding" not in headers
+        assert b"".join(message["body"] for message in messages) == body
+
+
+def test_large_body_is_compressed_with_headers():
+    body = b'{"course": "Python"}\n' * 200
+    headers, messages = run([body])
+    assert headers["content-encoding"] == "gzip" and headers["vary"] == "Accept-Encoding"
+    assert headers["content-length"] == str(len(messages[0]["body"]))
+    assert gzip.decompress(messages[0]["body"]) == body
+
+
+def test_streamed_chunks_are_flushed_one_by_one():
+    lines = [b'{"course": %d}\n' % index for index in range(3)]
+    headers, messages = run(lines)
+    # Streamed below minimum_size, still compressed, and without a length
+    assert headers["content-encoding"] == "gzip" and "content-length" not in headers
+    assert [message["more_body"] for message in messages] == [True, True, False]
+
+    decompressor = zlib.decompressobj(31)
+    # Each line can be decoded as soon as its chunk arrives
+    for line, message in zip(lines, messages):
+        assert decompressor.decompress(message["body"]) == line
+
+
+def test_brotli_stream_decodes_per_chunk():
+    brotli = pytest.importorskip("brotli")
+    lines = [b'{"course": %d}\n' % index for index in range(3)]
+    headers, messages = run(lines, accept_encoding="br, gzip")
+    assert headers["content-encoding"] == "br"
+    decompressor = brotli.Decompressor()
+    for line, message in zip(lines, messages):
+        assert decompressor.process(message["body"]) == line
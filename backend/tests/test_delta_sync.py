@@ -0,0 +1,129 @@
+import fakeredis
+from delta_sync import TreeSync
+
+
+def test_superseded_snapshots_expire_and_old_cursors_are_dropped():
+    redis = fakeredis.FakeRedis()
+    sync = TreeSync(redis)
+    first = sync._save("u", {"c": 1})
+    second = sync._save("u", {"c": 2}, superseded=first)
+    assert 0 < redis.ttl(sync._key("u", first)) <= TreeSync.SUPERSEDED_TTL
+    assert redis.ttl(sync._key("u", second)) > TreeSync.SUPERSEDED_TTL
+
+    # Full loads have no predecessor; only the MAX_CURSORS most recent are kept
+    cursors = [sync._save("u", {"c": n}) for n in range(TreeSync.MAX_CURSORS + 2)]
+    assert [sync._load("u", cursor) is not None for cursor in cursors] == [False, False] + [True] * TreeSync.MAX_CURSORS
+    assert redis.zcard(sync._cursors_key("u")) == TreeSync.MAX_CURSORS
+
+
+def assignment(assignment_id, title="Loops", state="UNKNOWN"):
+    return {
+        "assignmentId": assignment_id, "title": title, "description": "No description given",
+        "dueDate": {}, "dueTime": {}, "submissionState": state, "gradeInfo": None,
+    }
+
+
+def test_diff_reports_course_changes():
+    old = [
+        {"courseId": "c1", "courseName": "Python", "assignments": [assignment("a1")]},
+        {"courseId": "c2", "courseName": "Java", "assignments": [assignment("a2")]},
+    ]
+    new = [
+        {"courseId": "c1", "courseName": "Python 101", "assignments": [assignment("a1")]},
+        {"courseId": "c3", "courseName": "Rust", "assignments": [assignment("a3")]},
+    ]
+    assert TreeSync.diff(old, new) == [
+        {"op": "remove_course", "courseId": "c2"},
+        {"op": "rename_course", "courseId": "c1", "courseName": "Python 101"},
+        {"op": "add_course", "course": new[1]},
+    ]
+
+
+def test_diff_reports_assignment_changes():
+    old = [{"courseId": "c1", "courseName": "Python", "assignments": [assignment("a1"), assignment("a2")]}]
+    new = [{"courseId": "c1", "courseName": "Python", "assignments": [
+        assignment("a1", state="TURNED_IN"), assignment("a3"),
+    ]}]
+    assert TreeSync.diff(old, new) == [
+        {"op": "update_assignment", "courseId": "c1", "assignmentId": "a1", "fields": {"submissionState": "TURNED_IN"}},
+        {"op": "add_assignment", "courseId": "c1", "assignment": assignment("a3")},
+        {"op": "remove_assignment", "courseId": "c1", "assignmentId": "a2"},
+    ]
+    assert TreeSync.diff(new, new) == []
+
+
+class FakeClassroom:
+    """
+    Stands in for GoogleClassroomClient with one course whose coursework and
+    submissions the test edits between syncs.
+    """
+
+    def __init__(self):
+        self.work = {}
+        self.submissions = {}
+        self.listed = 0
+        self.id_listings = 0
+
+    def get_courses(self):
+        return {"courses": [{"id": "c1", "name": "Python"}]}
+
+    def get_profile(self):
+        return {"id": "u"}
+
+    def iter_coursework(self, course_id, page_size=100, order_by=None):
+        for work in sorted(self.work.values(), key=lambda work: work["updateTime"], reverse=True):
+            self.listed += 1
+            yield work
+
+    def iter_coursework_ids(self, course_id):
+        self.id_listings += 1
+        return ({"id": work_id} for work_id in self.work)
+
+    def iter_course_submissions(self, course_id, user_id="me"):
+        return iter(self.submissions.values())
+
+    def add(self, work_id, updated, state=None):
+        self.work[work_id] = {"id": work_id, "title": work_id, "updateTime": f"2024-01-{updated:02d}T10:00:00Z"}
+        if state:
+            self.submissions[work_id] = {"courseWorkId": work_id, "state": state}
+
+
+def test_sync_reads_coursework_down_to_the_watermark():
+    gcr = FakeClassroom()
+    for day in range(1, 6):
+        gcr.add(f"w{day}", day, state="CREATED")
+    sync = TreeSync(fakeredis.FakeRedis())
+    first = sync.sync(gcr)
+    assert first["full"] and len(first["gcr_data"][0]["assignments"]) == 5
+
+    gcr.listed = 0
+    gcr.add("w6", 6, state="CREATED")
+    second = sync.sync(gcr, first["cursor"])
+    assert [change["op"] for change in second["changes"]] == ["add_assignment"]
+    # w6, then w5 which is at the watermark
+    assert gcr.listed == 2
+
+    gcr.listed = 0
+    third = sync.sync(gcr, second["cursor"])
+    assert third == {"cursor": second["cursor"], "changes": []} and gcr.listed == 1
+    assert gcr.id_listings == 0
+
+
+def test_sync_drops_deleted_coursework():
+    gcr = FakeClassroom()
+    gcr.add("submitted", 1, state="TURNED_IN")
+    gcr.add("unsubmitted", 2)
+    gcr.add("kept", 3, state="CREATED")
+    sync = TreeSync(fakeredis.FakeRedis())
+    cursor = sync.sync(gcr)["cursor"]
+
+    for work_id in ("submitted", "unsubmitted"):
+        del gcr.work[work_id]
+        gcr.submissions.pop(work_id, None)
+    result = sync.sync(gcr, cursor)
+    assert sorted(change["assignmentId"] for change in result["changes"]) == ["submitted", "unsubmitted"]
+    assert {change["op"] for change in result["changes"]} == {"remove_assignment"}
+    assert gcr.id_listings == 1
+
+    # With no work lacking a submission left, the ids are not listed again
+    assert sync.sync(gcr, result["cursor"])["changes"] == [] and gcr.id_listings == 1
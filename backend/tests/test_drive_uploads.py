@@ -0,0 +1,114 @@
+import types
+import fakeredis
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+import circuit_breaker
+import google_classroom
+from circuit_breaker import CircuitBreaker
+from drive_uploads import DriveUploadCache, archive_hash
+from google_classroom import GoogleClassroomClient
+
+FILES = {"main.py": "print('hello')\n", "utils.py": "def add(a, b):\n    return a + b\n"}
+
+
+class Call:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeDrive:
+    """
+    Stands in for the Drive files() resource: files.create and files.get.
+    """
+
+    def __init__(self):
+        self.stored = {}
+        self.created = 0
+
+    def files(self):
+        return self
+
+    def create(self, body, media_body, fields):
+        self.created += 1
+        file_id = f"file{self.created}"
+        self.stored[file_id] = {"id": file_id, "trashed": False}
+        return Call({"id": file_id, "webViewLink": f"https://drive/{file_id}"})
+
+    def get(self, fileId, fields):
+        if fileId not in self.stored:
+            return Call(HttpError(httplib2.Response({"status": 404}), b"{}"))
+        return Call(self.stored[fileId])
+
+
+@pytest.fixture
+def drive(monkeypatch):
+    drive = FakeDrive()
+    monkeypatch.setattr(google_classroom, "build_service", lambda name, version, creds: drive)
+    monkeypatch.setattr(google_classroom, "_profiles", google_classroom.OrderedDict())
+    monkeypatch.setattr(circuit_breaker, "breakers", {
+        dependency: CircuitBreaker(dependency, fakeredis.FakeRedis()) for dependency in ("drive", "classroom")
+    })
+    return drive
+
+
+def make_client(refresh_token="r") -> GoogleClassroomClient:
+    client = GoogleClassroomClient(creds=types.SimpleNamespace(refresh_token=refresh_token))
+    client._profile = {"id": "u"}
+    return client
+
+
+def test_unchanged_files_reuse_the_upload(drive):
+    uploads = DriveUploadCache(fakeredis.FakeRedis())
+    client = make_client()
+    first = client.upload_to_drive(FILES, "hw1", uploads=uploads)
+    assert first == ("https://drive/file1", "file1")
+    # A new dict with the same content, in a different order
+    assert client.upload_to_drive(dict(reversed(FILES.items())), "hw1", uploads=uploads) == first
+    assert drive.created == 1
+    stats = uploads.get_stats()
+    assert stats["uploaded"] == 1 and stats["reused"] == 1
+    assert stats["bytes_skipped"] == sum(len(content.encode()) for content in FILES.values())
+
+
+def test_changed_files_or_name_upload_again(drive):
+    uploads = DriveUploadCache(fakeredis.FakeRedis())
+    client = make_client()
+    client.upload_to_drive(FILES, "hw1", uploads=uploads)
+    changed = {**FILES, "main.py": "print('bye')\n"}
+    assert client.upload_to_drive(changed, "hw1", uploads=uploads)[1] == "file2"
+    assert client.upload_to_drive(FILES, "hw2", uploads=uploads)[1] == "file3"
+    assert uploads.get_stats()["reused"] == 0
+    assert archive_hash(FILES, "hw1") != archive_hash(changed, "hw1") != archive_hash(FILES, "hw2")
+
+
+@pytest.mark.parametrize("remove", ["deleted", "trashed"])
+def test_a_file_gone_from_drive_is_uploaded_again(drive, remove):
+    uploads = DriveUploadCache(fakeredis.FakeRedis())
+    client = make_client()
+    client.upload_to_drive(FILES, "hw1", uploads=uploads)
+    if remove == "deleted":
+        del drive.stored["file1"]
+    else:
+        drive.stored["file1"]["trashed"] = True
+
+    assert client.upload_to_drive(FILES, "hw1", uploads=uploads)[1] == "file2"
+    assert uploads.get_stats()["stale"] == 1
+    assert uploads.get("u", archive_hash(FILES, "hw1"))["id"] == "file2"
+    # The new upload is the one reused from now on
+    assert client.upload_to_drive(FILES, "hw1", uploads=uploads)[1] == "file2"
+
+
+def test_later_clients_reuse_the_users_profile(drive):
+    client = GoogleClassroomClient(creds=types.SimpleNamespace(refresh_token="r"))
+    client.service = types.SimpleNamespace(userProfiles=lambda: types.SimpleNamespace(
+        get=lambda userId, fields: Call({"id": "u", "emailAddress": "u@example.com"}),
+    ))
+    assert client.get_profile()["id"] == "u"
+    assert GoogleClassroomClient(creds=types.SimpleNamespace(refresh_token="r"))._profile["id"] == "u"
+    assert GoogleClassroomClient(creds=types.SimpleNamespace(refresh_token="other"))._profile is None
@@ -0,0 +1,63 @@
+import json
+from file_based_hints import FileBasedHints
+
+repair = FileBasedHints._repair_json
+
+
+def test_repair_strips_fences_prose_and_trailing_commas():
+    text = '```json\n{"hint_text": "Loop over it", "lines": [1, 2,],}\n```'
+    assert json.loads(repair(text)) == {"hint_text": "Loop over it", "lines": [1, 2]}
+
+
+def test_repair_leaves_strings_alone():
+    text = '{"hint_text": "Try f(a, ) or {x, }, \\"quoted,]\\"",}'
+    assert json.loads(repair(text)) == {"hint_text": 'Try f(a, ) or {x, }, "quoted,]"'}
+
+
+def test_repair_stops_at_the_end_of_the_first_object():
+    text = 'Here you go: {"hint_text": "Use a dict {}"} Hope that helps {:}'
+    assert json.loads(repair(text)) == {"hint_text": "Use a dict {}"}
+
+
+def test_clients_are_bounded_and_not_keyed_by_the_raw_key():
+    hints = FileBasedHints()
+    hints.MAX_CLIENTS = 2
+    first = hints._get_client("key-1")
+    hints._get_client("key-2")
+    assert hints._get_client("key-1") is first
+    hints._get_client("key-3")
+    assert len(hints.clients) == 2
+    assert "key-1" not in hints.clients
+    # key-2 was the least recently used
+    assert hints._get_client("key-1") is first
+    assert hints._get_client("key-2") is not None and len(hints.clients) == 2
+
+
+class FakeModels:
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def generate_content_stream(self, **kwargs):
+        text = self.responses.pop(0)
+        for start in range(0, len(text), 7):
+            yield type("Chunk", (), {"text": text[start:start + 7]})
+
+
+def test_a_regenerated_hint_resets_the_streamed_text(monkeypatch):
+    import circuit_breaker
+    import fakeredis
+
+    monkeypatch.setattr(circuit_breaker, "breakers", {"gemini": circuit_breaker.CircuitBreaker("gemini", fakeredis.FakeRedis())})
+    good = {"hint_text": "Check the empty list", "hint_topic": "base case", "concepts": {"base case": "x"}}
+    llm = type("Client", (), {"models": FakeModels(['{"hint_text": "Wrong hint', json.dumps(good)])})()
+    hints = FileBasedHints()
+    monkeypatch.setattr(hints, "_get_client", lambda api_key: llm)
+
+    tokens = []
+    result = hints.get_general_hints({"a.py": "x = 1"}, "question", "key", None, tokens.append)
+    assert result == {"hint": good}
+    # What the client shows after the last reset is the final hint
+    reset = len(tokens) - 1 - tokens[::-1].index(None)
+    assert "".join(tokens[reset + 1:]) == good["hint_text"]
+    assert "".join(tokens[:reset]) == "Wrong hint"
+    assert hints.get_parse_stats()["retries"] == 1
@@ -0,0 +1,14 @@
+import pytest
+from pydantic import ValidationError
+from models import GitPushRequest, StartingUpRequest
+
+
+def test_exactly_one_of_info_and_session_id():
+    assert StartingUpRequest(session_id="s").session_id == "s"
+    assert StartingUpRequest(info="{}").info == "{}"
+    with pytest.raises(ValidationError):
+        StartingUpRequest()
+    with pytest.raises(ValidationError):
+        StartingUpRequest(info="{}", session_id="s")
+    with pytest.raises(ValidationError):
+        GitPushRequest(username="u", repo_name="r", course_id="c", assignment_id="a", code_files={})
@@ -0,0 +1,46 @@
+import threading
+import fakeredis
+from profiling import ADMIN_TOKEN_HEADER, PROFILE_HEADER, TOGGLE_KEY, Profile, Profiler, current_profile, span
+
+
+def test_profile_header_needs_the_admin_token(monkeypatch):
+    monkeypatch.setenv("PYBUDDY_ADMIN_TOKEN", "secret")
+    profiler = Profiler(fakeredis.FakeRedis())
+    assert not profiler.should_profile({PROFILE_HEADER: "1"})
+    assert not profiler.should_profile({PROFILE_HEADER: "1", ADMIN_TOKEN_HEADER: "wrong"})
+    assert profiler.should_profile({PROFILE_HEADER: "1", ADMIN_TOKEN_HEADER: "secret"})
+
+
+def test_threads_are_only_sampled_inside_spans():
+    profile = Profile("/test")
+    token = current_profile.set(profile)
+    try:
+        assert profile.threads == {}
+        with span("redis", "get"):
+            with span("redis", "set"):
+                assert profile.threads == {threading.get_ident(): 2}
+            assert profile.threads == {threading.get_ident(): 1}
+        # A reused thread must not stay in the profile after the span
+        assert profile.threads == {}
+        assert [s["name"] for s in profile.spans] == ["set", "get"]
+    finally:
+        current_profile.reset(token)
+
+
+def test_toggle_is_read_in_the_background():
+    release = threading.Event()
+
+    class SlowRedis(fakeredis.FakeRedis):
+        def exists(self, *names):
+            release.wait()
+            return super().exists(*names)
+
+    profiler = Profiler(SlowRedis())
+    profiler.redis.set(TOGGLE_KEY, 1)
+    # Answered from the cache while Redis has not replied
+    assert not profiler.should_profile({})
+    assert not profiler.should_profile({})
+    release.set()
+    with profiler._refreshing:
+        pass
+    assert profiler.should_profile({})
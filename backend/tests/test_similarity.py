@@ -0,0 +1,135 @@
+import json
+import os
+import zipfile
+from similarity import ExportSimilarity, MinHash, SimilarityIndex, shingles
+from submission_export import SubmissionExport
+
+SOLUTION = """
+def count_words(text):
+    counts = {}
+    for word in text.split():
+        word = word.strip(".,!?").lower()
+        if word in counts:
+            counts[word] += 1
+        else:
+            counts[word] = 1
+    return counts
+
+
+def most_common(counts, n):
+    items = sorted(counts.items(), key=lambda item: -item[1])
+    return [word for word, _ in items[:n]]
+
+
+def main():
+    text = input()
+    counts = count_words(text)
+    for word in most_common(counts, 3):
+        print(word, counts[word])
+"""
+
+OTHER = """
+def fibonacci(limit):
+    a, b = 0, 1
+    result = []
+    while a < limit:
+        result.append(a)
+        a, b = b, a + b
+    return result
+
+
+def is_prime(n):
+    if n < 2:
+        return False
+    i = 2
+    while i * i <= n:
+        if n % i == 0:
+            return False
+        i += 1
+    return True
+
+
+print([x for x in fibonacci(100) if is_prime(x)])
+"""
+
+
+def write(export_dir, records):
+    """
+    Writes a zip per (userId, fileId, source, updateTime) and appends their manifest records.
+    """
+    with open(os.path.join(export_dir, SubmissionExport.MANIFEST), "a", encoding="utf-8") as manifest:
+        for user, file_id, source, updated in records:
+            path = os.path.join("work", user, f"{file_id}.zip")
+            os.makedirs(os.path.join(export_dir, "work", user), exist_ok=True)
+            with zipfile.ZipFile(os.path.join(export_dir, path), "w") as archive:
+                archive.writestr("solution.py", source)
+            manifest.write(json.dumps({
+                "courseWorkId": "work", "userId": user, "fileId": file_id, "path": path,
+                "status": "downloaded", "bytes": 1, "updateTime": updated,
+            }) + "\n")
+
+
+def pairs(export_dir):
+    return [(a["userId"], b["userId"]) for a, b, _ in ExportSimilarity(export_dir).update()]
+
+
+def test_a_student_is_never_paired_with_their_own_resubmission(tmp_path):
+    write(tmp_path, [
+        ("alice", "f1", SOLUTION, "2024-01-01T10:00:00Z"),
+        ("alice", "f2", SOLUTION + "\nmain()\n", "2024-01-02T10:00:00Z"),
+    ])
+    engine = ExportSimilarity(tmp_path)
+    assert engine.update() == []
+    # Only the latest file is kept
+    assert list(engine.records) == ["f2"]
+    assert engine.get_stats()["indexed"] == 1
+
+
+def test_a_resubmission_replaces_the_earlier_file_in_pairs(tmp_path):
+    write(tmp_path, [
+        ("alice", "f1", OTHER, "2024-01-01T10:00:00Z"),
+        ("bob", "f2", SOLUTION, "2024-01-01T11:00:00Z"),
+        ("alice", "f3", SOLUTION, "2024-01-02T10:00:00Z"),
+    ])
+    result = ExportSimilarity(tmp_path).update()
+    assert [(a["fileId"], b["fileId"]) for a, b, _ in result] == [("f2", "f3")]
+
+
+def test_an_older_file_does_not_replace_a_newer_one(tmp_path):
+    write(tmp_path, [
+        ("alice", "f2", SOLUTION, "2024-01-02T10:00:00Z"),
+        ("alice", "f1", OTHER, "2024-01-01T10:00:00Z"),
+    ])
+    engine = ExportSimilarity(tmp_path)
+    engine.update()
+    assert list(engine.records) == ["f2"]
+
+
+def test_incremental_update_reads_only_new_submissions(tmp_path):
+    write(tmp_path, [
+        ("alice", "f1", SOLUTION, "2024-01-01T10:00:00Z"),
+        ("bob", "f2", OTHER, "2024-01-01T10:00:00Z"),
+    ])
+    first = ExportSimilarity(tmp_path)
+    assert first.update() == [] and first.get_stats()["new"] == 2
+
+    write(tmp_path, [("carol", "f3", SOLUTION.replace("counts", "totals"), "2024-01-01T12:00:00Z")])
+    second = ExportSimilarity(tmp_path)
+    result = second.update()
+    assert [(a["userId"], b["userId"]) for a, b, _ in result] == [("alice", "carol")]
+    # The first two come from similarity.ndjson, only the third zip is read
+    assert second.get_stats()["new"] == 1 and second.get_stats()["indexed"] == 3
+    assert pairs(tmp_path) == [("alice", "carol")]
+
+
+def test_index_remove_drops_buckets_and_pairs():
+    signature = MinHash.signature(shingles({"a.py": SOLUTION}))
+    index = SimilarityIndex()
+    index.insert("a", signature)
+    assert index.insert("b", signature) == [("a", 1.0)]
+    index.remove("a")
+    assert index.pairs() == [] and len(index) == 1
+    assert index.query(signature) == [("b", 1.0)]
+    assert index.query(signature, group="g") == [("b", 1.0)]
+    index.insert("c", signature, group="g")
+    assert index.query(signature, group="g") == [("b", 1.0)]
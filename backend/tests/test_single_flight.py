@@ -0,0 +1,64 @@
+import asyncio
+import fakeredis
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight(fakeredis.FakeRedis())
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": 1}
+
+    async def main():
+        return await asyncio.gather(*(flight.run("op", "user", {"a": 1}, fetch) for _ in range(5)))
+
+    assert asyncio.run(main()) == [{"value": 1}] * 5
+    assert len(calls) == 1
+    assert flight.get_stats()["coalesced_local"] == 4
+
+
+def test_cancelled_leader_does_not_strand_followers():
+    flight = SingleFlight(fakeredis.FakeRedis())
+    started = []
+
+    async def fetch():
+        started.append(1)
+        await asyncio.sleep(0.2)
+        return {"value": len(started)}
+
+    async def main():
+        leader = asyncio.create_task(flight.run("op", "user", {}, fetch))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(flight.run("op", "user", {}, fetch))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        result = await asyncio.wait_for(follower, 3)
+        assert leader.cancelled()
+        return result
+
+    # The follower runs the call itself once the leader is gone
+    assert asyncio.run(main()) == {"value": 2}
+    assert flight.get_stats()["in_flight"] == 0
+
+
+def test_cancelled_follower_leaves_leader_running():
+    flight = SingleFlight(fakeredis.FakeRedis())
+
+    async def fetch():
+        await asyncio.sleep(0.1)
+        return {"value": 1}
+
+    async def main():
+        leader = asyncio.create_task(flight.run("op", "user", {}, fetch))
+        await asyncio.sleep(0.02)
+        follower = asyncio.create_task(flight.run("op", "user", {}, fetch))
+        await asyncio.sleep(0.02)
+        follower.cancel()
+        return await asyncio.wait_for(leader, 3), follower
+
+    result, follower = asyncio.run(main())
+    assert result == {"value": 1}
+    assert follower.cancelled()
@@ -0,0 +1,79 @@
+import asyncio
+import fakeredis
+from admission import AdmissionController
+from speculation import SpeculativeHints
+
+
+def make_speculation() -> SpeculativeHints:
+    return SpeculativeHints(AdmissionController(max_concurrent=16), fakeredis.FakeRedis())
+
+
+async def hint():
+    return {"hint": {"hint_text": "Check the base case"}}
+
+
+def test_hourly_quota_refuses_further_speculation():
+    speculation = make_speculation()
+    speculation.redis.set(speculation._quota_key("u"), SpeculativeHints.HOURLY_QUOTA)
+
+    result = asyncio.run(speculation.submit("u", "key", "d1", hint))
+    assert result == {"status": "over_quota", "code_hash": "d1"}
+    assert not speculation.jobs and speculation.get_stats()["over_quota"] == 1
+
+
+def test_a_newer_save_replaces_the_queued_job():
+    speculation = make_speculation()
+
+    async def main():
+        assert (await speculation.submit("u", "key", "d1", hint))["status"] == "queued"
+        assert (await speculation.submit("u", "key", "d1", hint))["status"] == "pending"
+        assert (await speculation.submit("u", "key", "d2", hint))["status"] == "queued"
+
+    asyncio.run(main())
+    assert list(speculation.jobs) == ["u"] and speculation.jobs["u"][0] == "d2"
+    assert speculation.get_stats()["replaced"] == 1
+
+
+def test_generated_hint_is_taken_once_and_counts_against_the_quota():
+    speculation = make_speculation()
+
+    async def main():
+        worker = asyncio.create_task(speculation.run())
+        await speculation.submit("u", "key", "d1", hint)
+        while speculation.get_stats()["generated"] == 0:
+            await asyncio.sleep(0.01)
+        assert (await speculation.submit("u", "key", "d1", hint))["status"] == "ready"
+        first, second = await speculation.take("u", "d1"), await speculation.take("u", "d1")
+        worker.cancel()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == {"hint": {"hint_text": "Check the base case"}} and second is None
+    assert int(speculation.redis.get(speculation._quota_key("u"))) == 1
+
+
+def test_a_job_claimed_while_running_is_discarded():
+    speculation = make_speculation()
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_hint():
+        started.set()
+        await release.wait()
+        return await hint()
+
+    async def main():
+        worker = asyncio.create_task(speculation.run())
+        await speculation.submit("u", "key", "d1", slow_hint)
+        await started.wait()
+        # The student clicked before the speculation finished
+        assert await speculation.take("u", "d1") is None
+        release.set()
+        while speculation.running:
+            await asyncio.sleep(0.01)
+        worker.cancel()
+
+    asyncio.run(main())
+    stats = speculation.get_stats()
+    assert stats["discarded"] == 1 and stats["generated"] == 0
+    assert not speculation.redis.exists(speculation._key("u", "d1"))
+    assert not speculation.claimed
@@ -0,0 +1,75 @@
+import json
+import os
+from submission_export import SubmissionExport
+
+
+class FakeClassroom:
+    def __init__(self, submissions):
+        self.submissions = submissions
+
+    def iter_students(self, course_id):
+        return iter([])
+
+    def iter_student_submissions(self, course_id, course_work_id):
+        return iter(self.submissions)
+
+
+def submission(user, attachments, updated="2024-01-01T10:00:00Z"):
+    return {
+        "id": f"s-{user}", "courseWorkId": "w", "userId": user, "state": "TURNED_IN", "updateTime": updated,
+        "assignmentSubmission": {"attachments": attachments},
+    }
+
+
+class Export(SubmissionExport):
+    """
+    Downloads by writing the file id to disk; ids in `failing` fail.
+    """
+
+    failing = set()
+
+    def _download(self, record):
+        if record["fileId"] in self.failing:
+            return {**record, "status": "failed", "error": "forbidden"}
+        path = os.path.join(self.out_dir, record["path"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(record["fileId"])
+        return {**record, "status": "downloaded", "bytes": os.path.getsize(path)}
+
+
+def manifest(out_dir):
+    with open(os.path.join(out_dir, SubmissionExport.MANIFEST), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def run(out_dir, submissions, failing=()):
+    export = Export(FakeClassroom(submissions), str(out_dir), workers=2)
+    export.failing = set(failing)
+    records = list(export.run("c"))
+    return export, records
+
+
+SUBMISSIONS = [
+    submission("alice", [{"driveFile": {"id": "f1", "title": "a.py"}}, {"link": {"url": "https://example.com"}}]),
+    submission("bob", []),
+    submission("carol", [{"driveFile": {"id": "f2", "title": "c.py"}}]),
+]
+
+
+def test_a_rerun_does_not_append_records_the_manifest_holds(tmp_path):
+    run(tmp_path, SUBMISSIONS, failing={"f2"})
+    first = manifest(tmp_path)
+    assert sorted(record["status"] for record in first) == ["downloaded", "failed", "no_attachments", "not_downloadable"]
+
+    export, records = run(tmp_path, SUBMISSIONS, failing={"f2"})
+    assert manifest(tmp_path) == first
+    assert len(records) == 4 and export.get_stats()["skipped"] == 1
+
+
+def test_a_rerun_appends_what_changed(tmp_path):
+    run(tmp_path, SUBMISSIONS, failing={"f2"})
+    regraded = [submission("bob", [], updated="2024-01-02T10:00:00Z")]
+    run(tmp_path, SUBMISSIONS[:1] + regraded + SUBMISSIONS[2:])
+    added = manifest(tmp_path)[4:]
+    assert [(record["userId"], record["status"]) for record in added] == [("bob", "no_attachments"), ("carol", "downloaded")]
@@ -7,7 +7,7 @@ const ChatProvider = require('./chatProvider');
 const QuestionProvider = require('./questionProvider');
 const ClassroomTreeProvider = require('./classroomTreeProvider');
 
-const { handleLoginFlow, handleGenerateHints, handleShowHints, handleGenerateQuestions, handleAddApiKey, backendLogout, fetchGCRData, getUserName, submitAssignmentToGithub, loginWithGoogle, saveGithubCredentialsToBackend, deleteGithubCredentialsFromBackend, joinClassroomToBackend, clearCurrentFileHints } = require('./backendHelpers');
+const { handleLoginFlow, handleGenerateHints, handleShowHints, handleGenerateQuestions, handleAddApiKey, backendLogout, streamGCRData, fetchGCRDelta, getUserName, submitAssignmentToGithub, loginWithGoogle, saveGithubCredentialsToBackend, deleteGithubCredentialsFromBackend, joinClassroomToBackend, speculateHints, requestOverChannel, expireBackendSession, backendChannel, clearCurrentFileHints } = require('./backendHelpers');
 const { openFolderInExplorer } = require('./fileHelpers');
 
 /**
@@ -22,21 +22,88 @@ function transformGCRDataToTree(gcrData) {
         children: [
             {
                 label: 'Assignments',
-                children: (course.assignments || []).map(assignment => ({
-                    label: assignment.title,
-                    description: assignment.description,
-                    assignmentId: assignment.assignmentId,
-                    dueDate: assignment.dueDate,
-                    dueTime: assignment.dueTime,
-                    submissionState: assignment.submissionState,
-                    gradeInfo: assignment.gradeInfo 
-                }))
+                children: (course.assignments || []).map(transformAssignment)
             }
             // You can add Resources/People here if backend provides them
         ]
     }));
 }
 
+function transformAssignment(assignment) {
+    return {
+        label: assignment.title,
+        description: assignment.description,
+        assignmentId: assignment.assignmentId,
+        dueDate: assignment.dueDate,
+        dueTime: assignment.dueTime,
+        submissionState: assignment.submissionState,
+        gradeInfo: assignment.gradeInfo 
+    };
+}
+
+// Quiet time after a save before a hint is generated speculatively
+const SPECULATION_DEBOUNCE_MS = 3000;
+
+// Progress notification text for each stage the backend reports while submitting
+const SUBMIT_STAGE_MESSAGES = {
+    creating_repo: () => 'Creating GitHub repository',
+    pushing_file: update => `Pushing ${update.file} (${update.index + 1}/${update.total})`,
+    uploading_to_drive: () => 'Uploading to Google Drive',
+    turning_in: () => 'Turning in on Classroom'
+};
+
+// Backend field names for the assignment node properties that differ
+const ASSIGNMENT_FIELD_LABELS = { title: 'label' };
+
+/**
+ * Applies the changes returned by /get_gcr_data/delta to the tree in place.
+ * @param {Array} tree
+ * @param {Array} changes
+ */
+function applyGCRChanges(tree, changes) {
+    const findCourse = courseId => tree.find(course => course.courseId === courseId);
+    const assignmentsOf = course => course.children.find(section => section.label === 'Assignments');
+    for (const change of changes) {
+        if (change.op === 'add_course') {
+            const [course] = transformGCRDataToTree([change.course]);
+            setParentReferences([course]);
+            const existing = findCourse(course.courseId);
+            if (existing) {
+                tree.splice(tree.indexOf(existing), 1, course);
+            } else {
+                tree.push(course);
+            }
+            continue;
+        }
+        const course = findCourse(change.courseId);
+        if (!course) {
+            continue;
+        }
+        const section = assignmentsOf(course);
+        if (change.op === 'remove_course') {
+            tree.splice(tree.indexOf(course), 1);
+        } else if (change.op === 'rename_course') {
+            course.label = change.courseName;
+        } else if (change.op === 'add_assignment') {
+            const assignment = transformAssignment(change.assignment);
+            assignment.parent = section;
+            // The same change can arrive both pushed and fetched, so replace rather than duplicate
+            section.children = section.children.filter(child => child.assignmentId !== assignment.assignmentId);
+            // Newly created or edited coursework is listed first
+            section.children.unshift(assignment);
+        } else if (change.op === 'update_assignment') {
+            const assignment = section.children.find(child => child.assignmentId === change.assignmentId);
+            if (assignment) {
+                for (const [field, value] of Object.entries(change.fields)) {
+                    assignment[ASSIGNMENT_FIELD_LABELS[field] || field] = value;
+                }
+            }
+        } else if (change.op === 'remove_assignment') {
+            section.children = section.children.filter(child => child.assignmentId !== change.assignmentId);
+        }
+    }
+}
+
 // Helper to set parent references on all nodes in the tree
 function setParentReferences(tree, parent = null) {
     for (const node of tree) {
@@ -91,6 +158,77 @@ function activate(context) {
     const classroomTreeProvider = new ClassroomTreeProvider();
     vscode.window.registerTreeDataProvider('pybuddy-classroom-tree', classroomTreeProvider);
 
+    // Cursor for /get_gcr_data/delta, from the last full load or sync
+    let gcrCursor = null;
+
+    // Streams the course tree from the backend, rendering each course as it arrives
+    async function loadClassroomTree() {
+        classroomTreeProvider.data = [];
+        classroomTreeProvider.setLoading(true);
+        const result = await streamGCRData(course => {
+            const treeData = transformGCRDataToTree([course]);
+            setParentReferences(treeData);
+            classroomTreeProvider.addCourse(treeData[0]);
+        }, globalTokenJson);
+        gcrCursor = result.cursor;
+        classroomTreeProvider.setLoading(false);
+        watchClassroomTree();
+    }
+
+    // Fetches only what changed since the last load, falling back to a full load
+    async function syncClassroomTree() {
+        const delta = gcrCursor ? await fetchGCRDelta(gcrCursor, globalTokenJson) : null;
+        if (!delta) {
+            await loadClassroomTree();
+            return;
+        }
+        if (delta.unavailable) {
+            // Keep the tree already shown rather than reloading a stale copy
+            vscode.window.showWarningMessage(`Google Classroom is not responding; try refreshing again in ${delta.retry_after} s.`);
+            classroomTreeProvider.setLoading(false);
+            return;
+        }
+        applyClassroomDelta(delta);
+    }
+
+    function applyClassroomDelta(delta) {
+        if (delta.full) {
+            const treeData = transformGCRDataToTree(delta.gcr_data);
+            setParentReferences(treeData);
+            classroomTreeProvider.data = treeData;
+        } else {
+            applyGCRChanges(classroomTreeProvider.data, delta.changes);
+        }
+        gcrCursor = delta.cursor;
+        classroomTreeProvider.setLoading(false);
+    }
+
+    // Asks the backend to push changes to the tree over the WebSocket from now on.
+    // Opt-in, since the backend polls Classroom on the socket's behalf
+    function watchClassroomTree() {
+        if (!gcrCursor || !globalTokenJson) {
+            return;
+        }
+        if (!vscode.workspace.getConfiguration('pybuddy').get('watchClassroom', false)) {
+            return;
+        }
+        requestOverChannel('watch_tree', { cursor: gcrCursor }, globalTokenJson).catch(error => {
+            console.warn('Could not watch the classroom tree:', error.message);
+        });
+    }
+
+    backendChannel.on('tree_changes', applyClassroomDelta);
+    // The watcher stops when the backend session it was started with expires;
+    // restart it, which exchanges the token for a new session first
+    backendChannel.on('session_expired', () => {
+        expireBackendSession();
+        watchClassroomTree();
+    });
+    // A reconnected socket has lost its watcher
+    backendChannel.on('open', watchClassroomTree);
+    backendChannel.connect();
+    context.subscriptions.push({ dispose: () => backendChannel.dispose() });
+
 	context.subscriptions.push(
 		vscode.window.registerWebviewViewProvider('pybuddy-chat', chatProvider),
 		vscode.window.registerWebviewViewProvider('pybuddy-questions', questionProvider)
@@ -130,12 +268,7 @@ function activate(context) {
                     vscode.window.showErrorMessage('Error occurred while creating or opening GoogleClassroomLocal folder');
                 }
             }
-            classroomTreeProvider.setLoading(true);
-            const gcrData = await fetchGCRData(globalTokenJson);
-            const treeData = transformGCRDataToTree(gcrData);
-            setParentReferences(treeData);
-            classroomTreeProvider.setData(treeData);
-            classroomTreeProvider.setLoading(false);
+            await loadClassroomTree();
         })();
     } else {
         classroomTreeProvider.setData([]);
@@ -146,12 +279,7 @@ function activate(context) {
 
 	context.subscriptions.push(
         vscode.commands.registerCommand('pybuddy.refreshGCRData', async () => {
-            classroomTreeProvider.setLoading(true);
-            const gcrData = await fetchGCRData(globalTokenJson);
-            const treeData = transformGCRDataToTree(gcrData);
-            setParentReferences(treeData);
-            classroomTreeProvider.setData(treeData);
-            classroomTreeProvider.setLoading(false);
+            await syncClassroomTree();
             vscode.window.showInformationMessage('Google Classroom data refreshed!');
             
         }),
@@ -201,11 +329,7 @@ function activate(context) {
                 }
             }
             // Fetch GCR data from backend
-            const gcrData = await fetchGCRData(globalTokenJson);
-            const treeData = transformGCRDataToTree(gcrData);
-            setParentReferences(treeData);
-            classroomTreeProvider.setData(treeData);
-            classroomTreeProvider.setLoading(false);
+            await loadClassroomTree();
         } catch (err) {
             vscode.window.showErrorMessage('Google login failed');
             context.globalState.update('pybuddyLoggedIn', false);
@@ -394,12 +518,7 @@ function activate(context) {
                     vscode.window.showErrorMessage("Failed to join course");
                 } else {
                     // Refresh Google Classroom data
-                    classroomTreeProvider.setLoading(true);
-                    const gcrData = await fetchGCRData(globalTokenJson);
-                    const treeData = transformGCRDataToTree(gcrData);
-                    setParentReferences(treeData);
-                    classroomTreeProvider.setData(treeData);
-                    classroomTreeProvider.setLoading(false);
+                    await syncClassroomTree();
                     vscode.window.showInformationMessage('Course joined');
                 }
             });
@@ -672,7 +791,7 @@ function activate(context) {
                     assignment_id: assignmentId,
                     code_files: codeFiles,
                     info: globalTokenJson
-                });
+                }, update => progress.report({ message: SUBMIT_STAGE_MESSAGES[update.stage](update) }));
                 return result;
             });
 
@@ -691,7 +810,7 @@ function activate(context) {
                 } else if (userMessage.toLowerCase().includes('server error')) {
                     userMessage = 'Server error: There was a problem with the server. Please try again later.';
                 }
-                vscode.window.showErrorMessage(`Submission failed`);
+                vscode.window.showErrorMessage(result.retry_after ? `Submission failed: ${result.error}` : `Submission failed`);
                 // Re-enable the submit button on failure
                 if (questionProvider && questionProvider._webviewView) {
                     questionProvider._webviewView.webview.postMessage({ type: 'enableSubmitButton' });
@@ -705,11 +824,7 @@ function activate(context) {
                 if (questionProvider && questionProvider._webviewView) {
                     questionProvider._webviewView.webview.postMessage({ type: 'clearQuestions' });
                 }
-                const gcrData = await fetchGCRData(globalTokenJson);
-                const treeData = transformGCRDataToTree(gcrData);
-                setParentReferences(treeData);
-                classroomTreeProvider.setData(treeData);
-                classroomTreeProvider.setLoading(false);
+                await syncClassroomTree();
                 // Keep submit button disabled on success
             } else {
                 vscode.window.showErrorMessage('Unknown error occurred during submission.');
@@ -770,6 +885,27 @@ function activate(context) {
         }
 	});
 
+    // Generate the next hint in the background once the student pauses saving
+    const speculationTimers = {};
+    context.subscriptions.push(
+        vscode.workspace.onDidSaveTextDocument(document => {
+            if (document.languageId !== 'python') {
+                return;
+            }
+            const filePath = document.uri.fsPath;
+            clearTimeout(speculationTimers[filePath]);
+            speculationTimers[filePath] = setTimeout(() => {
+                delete speculationTimers[filePath];
+                const assignmentFolder = path.basename(path.dirname(filePath));
+                const assignmentNode = findAssignmentNode(classroomTreeProvider.data, assignmentFolder);
+                if (!assignmentNode || !assignmentNode.description || !assignmentNode.description.trim()) {
+                    return;
+                }
+                speculateHints(filePath, assignmentNode.description, context.globalState.get('pybuddy.username', ''));
+            }, SPECULATION_DEBOUNCE_MS);
+        })
+    );
+
     // Register a command to handle assignment selection from the tree and open the corresponding file in the Explorer
     context.subscriptions.push(
         vscode.commands.registerCommand('pybuddy.openAssignmentFile', async (assignmentNode) => {
@@ -0,0 +1,123 @@
+const { EventEmitter } = require('events');
+
+const MAX_RETRY_DELAY = 30000;
+
+/**
+ * One persistent, multiplexed WebSocket connection to the backend.
+ *
+ * Each request is tagged with an id so several can share the socket at once;
+ * the backend answers with zero or more progress messages and then a result or
+ * an error. Messages the backend pushes on its own are emitted as events,
+ * e.g. 'tree_changes' or 'session_expired'. The socket reconnects with backoff
+ * when it drops.
+ */
+class BackendChannel extends EventEmitter {
+    /**
+     * @param {string} url - e.g. 'ws://127.0.0.1:8000/ws'
+     */
+    constructor(url) {
+        super();
+        this.url = url;
+        this.ws = null;
+        this.nextId = 1;
+        this.pending = new Map(); // id -> { resolve, reject, onProgress }
+        this.retryDelay = 1000;
+        this.retryTimer = null;
+        this.disposed = false;
+    }
+
+    get connected() {
+        return this.ws !== null && this.ws.readyState === WebSocket.OPEN;
+    }
+
+    connect() {
+        if (this.disposed || typeof WebSocket === 'undefined') {
+            return;
+        }
+        const ws = new WebSocket(this.url);
+        this.ws = ws;
+        ws.onopen = () => {
+            this.retryDelay = 1000;
+            this.emit('open');
+        };
+        ws.onmessage = (event) => this._handleMessage(event.data);
+        ws.onerror = () => {
+            // Followed by onclose, which reconnects
+        };
+        ws.onclose = () => {
+            if (this.ws !== ws) {
+                return;
+            }
+            this.ws = null;
+            for (const { reject } of this.pending.values()) {
+                reject(new Error('Backend connection closed'));
+            }
+            this.pending.clear();
+            this.emit('close');
+            if (!this.disposed) {
+                this.retryTimer = setTimeout(() => this.connect(), this.retryDelay);
+                this.retryDelay = Math.min(this.retryDelay * 2, MAX_RETRY_DELAY);
+            }
+        };
+    }
+
+    /**
+     * Sends a request over the socket.
+     * @param {string} op - Backend operation, e.g. 'generate_hints'
+     * @param {Object} params - Same fields as the HTTP request body
+     * @param {Function} onProgress - Called with each progress message's data
+     * @returns {Promise<Object>} The result data, or { error, status?, retry_after? }.
+     *     Rejects if the socket is not open or closes before the reply.
+     */
+    request(op, params = {}, onProgress = null) {
+        if (!this.connected) {
+            return Promise.reject(new Error('Backend connection is not open'));
+        }
+        const id = this.nextId++;
+        return new Promise((resolve, reject) => {
+            this.pending.set(id, { resolve, reject, onProgress });
+            this.ws.send(JSON.stringify({ id, op, params }));
+        });
+    }
+
+    dispose() {
+        this.disposed = true;
+        clearTimeout(this.retryTimer);
+        if (this.ws) {
+            this.ws.close();
+        }
+    }
+
+    _handleMessage(raw) {
+        let message;
+        try {
+            message = JSON.parse(raw);
+        } catch (error) {
+            console.warn('Ignoring malformed backend message');
+            return;
+        }
+        if (message.type === 'event') {
+            this.emit(message.event, message.data);
+            return;
+        }
+        const entry = this.pending.get(message.id);
+        if (!entry) {
+            return;
+        }
+        if (message.type === 'progress') {
+            if (entry.onProgress) {
+                entry.onProgress(message.data);
+            }
+            return;
+        }
+        this.pending.delete(message.id);
+        if (message.type === 'result') {
+            entry.resolve(message.data);
+        } else {
+            const { id, type, ...error } = message;
+            entry.resolve(error);
+        }
+    }
+}
+
+module.exports = BackendChannel;
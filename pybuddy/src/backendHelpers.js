@@ -8,9 +8,20 @@ const { google } = require('googleapis');
 const { OAuth2Client } = require('google-auth-library');
 const http = require('http');
 const { URL } = require('url');
+const crypto = require('crypto');
+const BackendChannel = require('./backendChannel');
 
 const backend_url = "http://127.0.0.1:8000";
 
+// Persistent WebSocket to the backend; requests fall back to HTTP while it is down
+const backendChannel = new BackendChannel(`${backend_url.replace(/^http/, 'ws')}/ws`);
+
+// Opaque backend session for the current Google token, so the full token JSON is sent only once
+let backendSession = { tokenJson: null, sessionId: null };
+
+// Hash of the code each assignment folder last had a hint requested or speculated for
+let lastHintHash = {}; // { [folderPath]: codeHash }
+
 // Global hint storage
 let fileHints = {}; // { [filePath]: [hintMessage, ...] }
 let currentFilePath = null;
@@ -29,6 +40,65 @@ function clearCurrentFileHints() {
 
 
 
+// Reads every file in an assignment folder into { [fileName]: content }
+function readCodeDict(folderPath) {
+    const codeDict = {};
+    for (const file of fs.readdirSync(folderPath)) {
+        const fullPath = path.join(folderPath, file);
+        if (fs.statSync(fullPath).isFile()) {
+            codeDict[file] = fs.readFileSync(fullPath, 'utf-8');
+        }
+    }
+    return codeDict;
+}
+
+/**
+ * Hashes what a hint depends on, the same way as the backend's code_hash:
+ * each file's name and content in name order, then the question and topic,
+ * separated by NUL bytes.
+ */
+function hintCodeHash(codeDict, questionData, topic = null) {
+    const hash = crypto.createHash('sha256');
+    for (const name of Object.keys(codeDict).sort()) {
+        hash.update(`${name}\0${codeDict[name]}\0`);
+    }
+    hash.update(`${questionData}\0${topic || ''}`);
+    return hash.digest('hex');
+}
+
+/**
+ * Asks the backend to generate the next hint for a just-saved file in the
+ * background, so a 💡 click on the same code is answered at once. Saves that
+ * changed nothing since the last hint or speculation are skipped.
+ * @param {string} filePath - The saved file
+ * @param {string} description - The assignment's question
+ * @param {string} username
+ */
+async function speculateHints(filePath, description, username) {
+    const folderPath = path.dirname(filePath);
+    const codeDict = readCodeDict(folderPath);
+    const codeHash = hintCodeHash(codeDict, description);
+    if (lastHintHash[folderPath] === codeHash) {
+        return;
+    }
+    lastHintHash[folderPath] = codeHash;
+    const requestBody = { code_dict: codeDict, question_data: description, username, topic: null };
+    try {
+        if (backendChannel.connected) {
+            await backendChannel.request('speculate_hints', requestBody);
+        } else {
+            await fetch(`${backend_url}/hints/speculate`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(requestBody)
+            });
+        }
+    } catch (error) {
+        // Best effort: the click still generates the hint if this is lost
+        console.warn('Could not queue speculative hint:', error.message);
+    }
+}
+
 function handleAddApiKey(context) {
     return async () => {
         const apiKey = await vscode.window.showInputBox({
@@ -69,14 +139,100 @@ function handleAddApiKey(context) {
     }
 }
 
-async function backendLogout(tokenJson = globalTokenJson) {
+/**
+ * Returns the auth fields for a backend request: the session id for this token,
+ * exchanging the token for one if needed, or the raw token if the exchange fails.
+ * @param {string} tokenJson
+ * @returns {Promise<Object>} - { session_id } or { info }
+ */
+async function getAuthFields(tokenJson = globalTokenJson) {
+    if (!tokenJson) {
+        return { info: tokenJson };
+    }
+    if (backendSession.tokenJson === tokenJson && backendSession.sessionId) {
+        return { session_id: backendSession.sessionId };
+    }
     try {
-        const response = await fetch(`${backend_url}/logout`, {
+        const response = await fetch(`${backend_url}/session`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ info: tokenJson })
         });
         const data = await response.json();
+        if (response.ok && data.session_id) {
+            backendSession = { tokenJson, sessionId: data.session_id };
+            return { session_id: data.session_id };
+        }
+    } catch (error) {
+        console.warn('Could not create backend session:', error.message);
+    }
+    return { info: tokenJson };
+}
+
+/**
+ * POSTs to the backend with the session auth fields added to the body,
+ * starting a new session once if the backend reports it expired.
+ * @param {string} endpoint - e.g. '/get_gcr_data'
+ * @param {Object} body
+ * @param {string} tokenJson
+ * @returns {Promise<Response>}
+ */
+async function postWithSession(endpoint, body, tokenJson = globalTokenJson) {
+    let response;
+    for (let attempt = 0; attempt < 2; attempt++) {
+        const auth = await getAuthFields(tokenJson);
+        response = await fetch(`${backend_url}${endpoint}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ...body, ...auth })
+        });
+        if (response.status !== 401 || !auth.session_id) {
+            break;
+        }
+        backendSession = { tokenJson: null, sessionId: null };
+    }
+    return response;
+}
+
+/**
+ * Sends a request over the backend WebSocket with the session auth fields
+ * added, starting a new session once if the backend reports it expired.
+ * @param {string} op - e.g. 'get_gcr_data_delta'
+ * @param {Object} body
+ * @param {string} tokenJson
+ * @param {Function} onProgress - Called with each progress update
+ * @returns {Promise<Object|null>} The reply, or null if the socket is not open.
+ *     Rejects if the socket closes before the reply arrives.
+ */
+async function requestOverChannel(op, body, tokenJson = globalTokenJson, onProgress = null) {
+    if (!backendChannel.connected) {
+        return null;
+    }
+    let reply;
+    for (let attempt = 0; attempt < 2; attempt++) {
+        const auth = await getAuthFields(tokenJson);
+        reply = await backendChannel.request(op, { ...body, ...auth }, onProgress);
+        if (reply.status !== 401 || !auth.session_id) {
+            break;
+        }
+        backendSession = { tokenJson: null, sessionId: null };
+    }
+    return reply;
+}
+
+/**
+ * Forgets the backend session, so the next request exchanges the token for a
+ * new one. Used when the backend pushes 'session_expired'.
+ */
+function expireBackendSession() {
+    backendSession = { tokenJson: null, sessionId: null };
+}
+
+async function backendLogout(tokenJson = globalTokenJson) {
+    try {
+        const response = await postWithSession('/logout', {}, tokenJson);
+        backendSession = { tokenJson: null, sessionId: null };
+        const data = await response.json();
         vscode.window.showInformationMessage(data.message || 'Logged out!');
         // Delete token.json after successful logout
         try {
@@ -153,14 +309,9 @@ function handleGenerateHints(chatProvider, context) {
                     const folderPath = path.dirname(filePath);
 
                     // Read all files in the folder and build codeDict
-                    let codeDict = {};
-                    const files = fs.readdirSync(folderPath);
-                    for (const file of files) {
-                        const fullPath = path.join(folderPath, file);
-                        if (fs.statSync(fullPath).isFile()) {
-                            codeDict[file] = fs.readFileSync(fullPath, 'utf-8');
-                        }
-                    }
+                    const codeDict = readCodeDict(folderPath);
+                    // The save above must not speculate on code this click already covers
+                    lastHintHash[folderPath] = hintCodeHash(codeDict, description || '', topic);
 
                     try {
                         const endpoint = `${backend_url}/generate_hints`;
@@ -172,17 +323,33 @@ function handleGenerateHints(chatProvider, context) {
                             topic: topic === undefined ? null : topic
                         };
                         console.log(requestBody);
-                        const response = await fetch(endpoint, {
-                            method: 'POST',
-                            headers: { 'Content-Type': 'application/json' },
-                            body: JSON.stringify(requestBody)
-                        });
-                        if (!response.ok) {
-                            throw new Error(`Backend returned status ${response.status}`);
+                        let data;
+                        if (backendChannel.connected) {
+                            // Show the hint in the notification as it is being written
+                            let hintText = '';
+                            data = await backendChannel.request('generate_hints', requestBody, update => {
+                                // The backend regenerates a hint it could not parse; start over
+                                hintText = update.reset ? '' : hintText + update.token;
+                                progress.report({ message: hintText });
+                            });
+                        } else {
+                            const response = await fetch(endpoint, {
+                                method: 'POST',
+                                headers: { 'Content-Type': 'application/json' },
+                                body: JSON.stringify(requestBody)
+                            });
+                            if (!response.ok) {
+                                throw new Error(`Backend returned status ${response.status}`);
+                            }
+                            data = await response.json();
                         }
-                        const data = await response.json();
                         console.log(data.hint)
 
+                        if (data.error && data.retry_after) {
+                            // Busy or the model is not responding; the message says when to retry
+                            vscode.window.showWarningMessage(data.error);
+                            return;
+                        }
                         if (data.error) {
                             vscode.window.showErrorMessage("Error: API Key is Invalid. Either enter a valid API key or check if the API key is not expired.");
                         }
@@ -325,15 +492,14 @@ function handleGenerateQuestions(questionProvider) {
  */
 async function fetchGCRData(tokenJson = globalTokenJson) {
     try {
-        const response = await fetch(`${backend_url}/get_gcr_data`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ info: tokenJson })
-        });
+        const response = await postWithSession('/get_gcr_data', {}, tokenJson);
         if (!response.ok) {
             throw new Error(`Backend returned status ${response.status}`);
         }
         const data = await response.json();
+        if (data.stale) {
+            showStaleTreeWarning();
+        }
         return data.gcr_data || [];
     } catch (error) {
         vscode.window.showErrorMessage('Error occurred while fetching Google Classroom data');
@@ -341,18 +507,114 @@ async function fetchGCRData(tokenJson = globalTokenJson) {
     }
 }
 
+/**
+ * Streams Google Classroom data from the backend, calling onCourse for each
+ * course as soon as the backend has fetched it.
+ * @param {Function} onCourse - Called with each course record
+ * @returns {Promise<Object>} { courses, cursor }; cursor is null on error.
+ */
+async function streamGCRData(onCourse, tokenJson = globalTokenJson) {
+    const courses = [];
+    let cursor = null;
+    try {
+        const reply = await requestOverChannel('get_gcr_data', {}, tokenJson, update => {
+            courses.push(update.course);
+            onCourse(update.course);
+        });
+        if (reply) {
+            if (reply.error) {
+                throw new Error(reply.error);
+            }
+            if (reply.stale) {
+                showStaleTreeWarning();
+            }
+            return { courses, cursor: reply.cursor };
+        }
+        const response = await postWithSession('/get_gcr_data/stream', {}, tokenJson);
+        if (!response.ok) {
+            throw new Error(`Backend returned status ${response.status}`);
+        }
+        const decoder = new TextDecoder();
+        let buffered = '';
+        const handleLine = (line) => {
+            if (!line.trim()) {
+                return;
+            }
+            const record = JSON.parse(line);
+            if (record.error) {
+                throw new Error(record.error);
+            }
+            if (record.course) {
+                courses.push(record.course);
+                onCourse(record.course);
+            }
+            if (record.done) {
+                cursor = record.cursor;
+                if (record.stale) {
+                    showStaleTreeWarning();
+                }
+            }
+        };
+        for await (const chunk of response.body) {
+            buffered += decoder.decode(chunk, { stream: true });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            lines.forEach(handleLine);
+        }
+        handleLine(buffered + decoder.decode());
+    } catch (error) {
+        vscode.window.showErrorMessage('Error occurred while fetching Google Classroom data');
+    }
+    return { courses, cursor };
+}
+
+function showStaleTreeWarning() {
+    vscode.window.showWarningMessage('Google Classroom is not responding; showing the courses from your last refresh.');
+}
+
+/**
+ * Fetches the changes to the Google Classroom tree since the given cursor.
+ * @param {string} cursor - Cursor from the last full load or delta
+ * @returns {Promise<Object|null>} { cursor, changes } or { cursor, full, gcr_data };
+ *     { unavailable: true, retry_after } while Classroom is not responding; or null on error.
+ */
+async function fetchGCRDelta(cursor, tokenJson = globalTokenJson) {
+    const toDelta = data => {
+        if (data.error && data.retry_after) {
+            return { unavailable: true, retry_after: data.retry_after };
+        }
+        return data.error ? null : data;
+    };
+    try {
+        const reply = await requestOverChannel('get_gcr_data_delta', { cursor }, tokenJson);
+        if (reply) {
+            return toDelta(reply);
+        }
+        const response = await postWithSession('/get_gcr_data/delta', { cursor }, tokenJson);
+        if (!response.ok) {
+            throw new Error(`Backend returned status ${response.status}`);
+        }
+        return toDelta(await response.json());
+    } catch (error) {
+        return null;
+    }
+}
+
 /**
  * Submits assignment code files to the backend for GitHub push.
  * @param {Object} params - { github_username, github_token, repo_name, course_id, assignment_id, code_files }
+ * @param {Function} onProgress - Called with { stage, ... } as the backend works through the submission
  * @returns {Promise<Object>} - { github_link } or { error }
  */
-async function submitAssignmentToGithub(params) {
+async function submitAssignmentToGithub(params, onProgress = null) {
     try {
-        const response = await fetch(`${backend_url}/submit/github`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(params)
-        });
+        const { info, ...body } = params;
+        // Not retried over HTTP if the socket drops: the submission may already be under way
+        const reply = await requestOverChannel('submit', body, info, onProgress);
+        if (reply) {
+            return reply;
+        }
+        const response = await postWithSession('/submit/github', body, info);
         const data = await response.json();
         if (!response.ok) {
             throw new Error(data.error || `Backend returned status ${response.status}`);
@@ -420,11 +682,12 @@ async function deleteGithubCredentialsFromBackend(username) {
  */
 async function joinClassroomToBackend(params) {
     try {
-        const response = await fetch(`${backend_url}/join_course`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(params)
-        });
+        const { info, ...body } = params;
+        const reply = await requestOverChannel('join_course', body, info);
+        if (reply) {
+            return reply;
+        }
+        const response = await postWithSession('/join_course', body, info);
         const data = await response.json();
         return data;
     } catch (error) {
@@ -435,11 +698,11 @@ async function joinClassroomToBackend(params) {
 // Fetch the username from the backend
 async function getUserName(tokenJson = globalTokenJson) {
     try {
-        const response = await fetch(`${backend_url}/get_user_name`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ info: tokenJson })
-        });
+        const reply = await requestOverChannel('get_user_name', {}, tokenJson);
+        if (reply && !reply.error) {
+            return reply.user_name;
+        }
+        const response = await postWithSession('/get_user_name', {}, tokenJson);
         if (response.ok) {
             const data = await response.json();
             return data.user_name;
@@ -536,11 +799,17 @@ module.exports = {
 	handleGenerateHints,
 	handleGenerateQuestions,
     fetchGCRData,
+    streamGCRData,
+    fetchGCRDelta,
     getUserName,
     submitAssignmentToGithub,
     loginWithGoogle,
     saveGithubCredentialsToBackend,
     deleteGithubCredentialsFromBackend,
     joinClassroomToBackend,
+    speculateHints,
+    requestOverChannel,
+    expireBackendSession,
+    backendChannel,
     clearCurrentFileHints
 };
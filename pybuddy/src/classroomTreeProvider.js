@@ -28,6 +28,11 @@ class ClassroomTreeProvider {
         this.refresh();
     }
 
+    addCourse(course) {
+        this.data.push(course);
+        this.refresh();
+    }
+
     setLoading(isLoading) {
         this.isLoading = isLoading;
         this.refresh();
@@ -38,9 +43,12 @@ class ClassroomTreeProvider {
     }
 
     getChildren(element) {
-        // Loading state: show spinner
+        // Loading state: show the courses received so far, then a spinner
         if (this.isLoading && !element) {
             return [
+                ...this.data.map(course =>
+                    new ClassroomTreeItem(course.label, vscode.TreeItemCollapsibleState.Collapsed, 'course', course)
+                ),
                 new ClassroomTreeItem(
                     'Loading Google Classroom data...',
                     vscode.TreeItemCollapsibleState.None,